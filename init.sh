@@ -3,11 +3,15 @@
 # This script handles:
 # 1. Python virtual environment creation
 # 2. Python dependencies installation
-# 3. C++ tools setup (bwfmetaedit, allolib submodules, VBAP renderer build)
+# 3. C++ tools setup (allolib submodules, VBAP renderer build)
+#
+# usage: ./init.sh [build profile]   (release / relwithdebinfo / native, see src/configCPP.py;
+#                                     default: keep the installed profile, else release)
 
 set -e  # Exit on any error
 
 PROJECT_ROOT="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+BUILD_PROFILE="${1:-}"
 cd "$PROJECT_ROOT"
 
 echo "============================================================"
@@ -39,12 +43,12 @@ fi
 echo ""
 
 # Step 3: Setup C++ tools using Python script
-echo "Step 3: Setting up C++ tools (bwfmetaedit, allolib, VBAP renderer)..."
-if python3 -c "from src.configCPP import setupCppTools; exit(0 if setupCppTools() else 1)"; then
+echo "Step 3: Setting up C++ tools (allolib, VBAP renderer)..."
+if python3 -c "import sys; from src.configCPP import setupCppTools, installedProfile; exit(0 if setupCppTools(profile=sys.argv[1] or installedProfile()) else 1)" "$BUILD_PROFILE"; then
     echo "✓ C++ tools setup complete"
 else
     echo "⚠ Warning: C++ tools setup had issues, but continuing..."
-    echo "  You may need to manually install bwfmetaedit: brew install bwfmetaedit"
+    echo "  You may need to build the renderer manually, see README.md"
 fi
 echo ""
 
@@ -1,5 +1,6 @@
 import tkinter as tk
 from tkinter import filedialog, scrolledtext
+import os
 import threading
 import sys
 import subprocess
@@ -14,12 +15,9 @@ from pathlib import Path
 # add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.analyzeADM.extractMetadata import extractMetaData
-from src.analyzeADM.parser import parseMetadata
-from src.analyzeADM.checkAudioChannels import exportAudioActivity
-from src.packageADM.packageForRender import packageForRender
-from src.createRender import runVBAPRender
 from src.analyzeRender import analyzeRenderOutput
+from src.pipelineContext import PipelineContext
+from src.pipelineGraph import pipelineStages, runStages, printStageTimings, failedStage
 
 
 class PipelineGUI:
@@ -251,33 +249,17 @@ class PipelineGUI:
     def execute_pipeline_core(self, source_file, speaker_layout):
         """Core pipeline without matplotlib"""
         print("Starting sonoPleth pipeline...\n")
+        context = PipelineContext(source_file, speaker_layout)
         
-        print("Checking audio channels for content...")
-        exportAudioActivity(source_file, output_path="processedData/containsAudio.json", threshold_db=-100)
+        # up to date stages are skipped and independent ones run concurrently (see
+        # src/pipelineGraph.py), the analysis stage is left out here and run on the main thread afterwards
+        stages = pipelineStages(context)
+        timings = runStages(stages, context)
+        printStageTimings(timings)
+        if failedStage(timings):
+            raise RuntimeError(f"stage '{failedStage(timings)}' failed")
         
-        print("\nExtracting ADM metadata from WAV file...")
-        extracted_metadata = extractMetaData(source_file, "processedData/currentMetaData.xml")
-        
-        if extracted_metadata:
-            xml_path = extracted_metadata
-            print(f"Using extracted XML metadata at {xml_path}")
-        else:
-            print("Using default XML metadata file")
-            xml_path = "data/POE-ATMOS-FINAL-metadata.xml"
-        
-        print("\nParsing ADM metadata...")
-        parseMetadata(xml_path, ToggleExportJSON=True, TogglePrintSummary=True)
-        
-        print("\nPackaging audio for render...")
-        packageForRender(source_file, "processedData")
-        
-        print("\nRunning VBAP spatial renderer...")
-        runVBAPRender(
-            source_folder="processedData/stageForRender",
-            render_instructions="processedData/stageForRender/renderInstructions.json",
-            speaker_layout=speaker_layout,
-            output_file="processedData/spatial_render.wav"
-        )
+        context.exportDebugFiles()
     
     def run_analysis_on_main_thread(self):
         """Run matplotlib analysis on main thread (required for macOS)"""
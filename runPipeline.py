@@ -1,24 +1,35 @@
-from src.configCPP import setupCppTools
-from src.analyzeADM.extractMetadata import extractMetaData
-from src.analyzeADM.parser import parseMetadata, getGlobalData
-from src.analyzeADM.checkAudioChannels import exportAudioActivity
-from src.packageADM.packageForRender import packageForRender
-from src.createRender import runVBAPRender
-from src.analyzeRender import analyzeRenderOutput
+from src.configCPP import BUILD_PROFILES, ensureCppTools
+from src.pipelineGraph import STAGE_NAMES
 from pathlib import Path
-import subprocess
-import sys
+import argparse
+import os
 
 
 # Current pipeline:
 # 0. Check initialization - if not initialized, prompt to run ./init.sh
-# 1. Setup C++ tools - install bwfmetaedit, initialize git submodules (allolib), build VBAP renderer (only if needed)
-# 2. Extract ADM metadata from source WAV using bwfmetaedit
-# 3. Parse ADM metadata into internal data structure (optionally export JSON for analysis)
+# 1. Check C++ tools - stat the toolchain manifest written by the last full setup; only when
+#    something changed (or with --verify-tools) initialize submodules / rebuild the renderer
+# 2. Extract ADM metadata (axml/chna chunks) from source WAV (skipped on a metadata cache hit)
+# 3. Parse ADM metadata into internal data structure (optionally export JSON for analysis, skipped on a cache hit)
 # 4. Analyze audio channels for content (generate containsAudio.json)
-# 5. Run packageForRender - split stems and create spatial instructions JSON
+# 5. Run packageForRender - create spatial instructions (binary) and the source channel map
+#    (stems are not split, the renderer reads the needed channels straight from the source WAV)
 # 6. Run VBAP renderer - create multichannel spatial render
 # 7. Analyze render output - create PDF with dB analysis of each channel in final render
+#
+# stages hand their results to each other in memory through a PipelineContext,
+# the JSON dumps in processedData are written once at the end (exportDebugJSON)
+#
+# steps 2-7 run as a stage graph (src/pipelineGraph.py): stages whose inputs, parameters
+# and upstream stages are unchanged since the last run are skipped and their results
+# loaded from processedData. --from-stage / --to-stage run a slice (e.g. only render +
+# analysis after changing the speaker layout), --force reruns the slice regardless.
+# independent stages run concurrently - the activity scan overlaps with the metadata
+# extraction and parse - and the stage timings at the end show the overlap
+#
+# the stage modules are imported inside run_pipeline, after the tool check, and the heavy
+# libraries only where they are used (lxml on a metadata cache miss, soundfile for stems /
+# segment stitching, matplotlib for the analysis PDF) - batch jobs start working sooner
 
 
 def check_initialization():
@@ -44,13 +55,13 @@ def check_initialization():
     print("\nThis will:")
     print("  1. Create Python virtual environment")
     print("  2. Install Python dependencies")
-    print("  3. Setup C++ tools (bwfmetaedit, allolib, VBAP renderer)")
+    print("  3. Setup C++ tools (allolib, VBAP renderer)")
     print("\nAfter initialization, run the pipeline again.")
     print("="*80 + "\n")
     return False
 
 
-def run_pipeline(sourceADMFile, sourceSpeakerLayout, createRenderAnalysis=True):
+def run_pipeline(sourceADMFile, sourceSpeakerLayout, createRenderAnalysis=True, exportDebugJSON=True, incrementalRender=False, renderWorkers=1, renderThreads=1, buildProfile=None, verifyTools=False, fromStage=None, toStage=None, forceStages=False):
     """
     Run the complete ADM to spatial audio pipeline
     
@@ -58,80 +69,97 @@ def run_pipeline(sourceADMFile, sourceSpeakerLayout, createRenderAnalysis=True):
         sourceADMFile: path to source ADM WAV file
         sourceSpeakerLayout: path to speaker layout JSON
         createRenderAnalysis: whether to create render analysis PDF
+        exportDebugJSON: write containsAudio / metadata / instruction JSON to processedData at the end
+        incrementalRender: cache each source's contribution and only re-render sources whose audio or
+            trajectory changed since the last render (off by default: costs a digest pass over the
+            master and cache space on disk, pays off when re-rendering mix revisions)
+        renderWorkers: render the timeline in this many segments concurrently (default 1: segments cost a
+            re-read in stitching and, with incrementalRender, cache keys tied to the segment boundaries)
+        renderThreads: mix threads inside each renderer process (renderer --threads)
+        buildProfile: renderer build profile (src/configCPP.py BUILD_PROFILES), default: the one it was last built with
+        verifyTools: run the full C++ tools setup instead of trusting the toolchain manifest
+        fromStage: only load the results of the stages before this one (see pipelineGraph.STAGE_NAMES)
+        toStage: stop after this stage
+        forceStages: rerun the stages from fromStage to toStage even if they are up to date
+    
+    Returns:
+        PipelineContext with the results of every stage (False if setup or a stage failed)
     """
     # Step 0: Check if project has been initialized
     if not check_initialization():
         return False
     
-    # Step 1: Setup C++ tools and dependencies (only runs if needed - idempotent)
+    # Step 1: Check C++ tools and dependencies (full setup only if something changed - idempotent)
     # Note: If you encounter dependency errors, delete .init_complete and re-run ./init.sh
-    print("\n" + "="*80)
-    print("STEP 1: Verifying C++ tools and dependencies")
-    print("="*80)
-    if not setupCppTools():
+    if not ensureCppTools(profile=buildProfile, verify=verifyTools):
         print("\n✗ Error: C++ tools setup failed")
         print("\nTry re-initializing:")
         print("  rm .init_complete && ./init.sh")
         return False
     
-    processedDataDir = "processedData"
-    finalOutputRenderFile = "processedData/spatial_render.wav"
-    finalOutputRenderAnalysisPDF = "processedData/spatial_render_analysis.pdf"
-
-    print("\nChecking audio channels for content...")
-    exportAudioActivity(sourceADMFile, output_path="processedData/containsAudio.json", threshold_db=-100)
-
-    print("Extracting ADM metadata from WAV file...")
-    extractedMetadata = extractMetaData(sourceADMFile, "processedData/currentMetaData.xml")
-
-    if extractedMetadata:
-        xmlPath = extractedMetadata
-        print(f"Using extracted XML metadata at {xmlPath}")
-    else:
-        print("Using default XML metadata file")
-        xmlPath = "data/POE-ATMOS-FINAL-metadata.xml"
-
-    print("Parsing ADM metadata...")
-    reformattedMetadata = parseMetadata(xmlPath, ToggleExportJSON=True, TogglePrintSummary=True) 
-
-    print("\nPackaging audio for render...")
-    packageForRender(sourceADMFile, processedDataDir)
-
-    print("\nRunning VBAP spatial renderer...")
-    runVBAPRender(
-        source_folder="processedData/stageForRender",
-        render_instructions="processedData/stageForRender/renderInstructions.json",
-        speaker_layout=sourceSpeakerLayout,
-        output_file=finalOutputRenderFile
+    from src.pipelineContext import PipelineContext
+    from src.pipelineGraph import pipelineStages, runStages, printStageTimings, failedStage
+    
+    context = PipelineContext(sourceADMFile, sourceSpeakerLayout)
+    stages = pipelineStages(
+        context,
+        incrementalRender=incrementalRender,
+        renderWorkers=renderWorkers,
+        renderThreads=renderThreads,
+        analysisPDF=os.path.join(context.processedDir, "spatial_render_analysis.pdf") if createRenderAnalysis else None
     )
+    try:
+        timings = runStages(stages, context, fromStage=fromStage, toStage=toStage, force=forceStages)
+    except (ValueError, RuntimeError) as e:
+        print(f"\n✗ Error: {e}")
+        return False
+    printStageTimings(timings)
+    if failedStage(timings):
+        print(f"\n✗ Error: stage '{failedStage(timings)}' failed")
+        return False
 
-    if createRenderAnalysis:
-        print("\nAnalyzing rendered spatial audio...")
-        analyzeRenderOutput(
-            render_file=finalOutputRenderFile,
-            output_pdf=finalOutputRenderAnalysisPDF
-        )
+    if exportDebugJSON:
+        context.exportDebugFiles()
 
     print("\nDone")
+    return context
 
 
 if __name__ == "__main__":
     # CLI mode - parse arguments
-    if len(sys.argv) >= 2:
-        sourceADMFile = sys.argv[1]
-        sourceSpeakerLayout = sys.argv[2] if len(sys.argv) >= 3 else "vbapRender/allosphere_layout.json"
-        createRenderAnalysis = True if len(sys.argv) < 4 else sys.argv[3].lower() in ['true', '1', 'yes']
-        
-        run_pipeline(sourceADMFile, sourceSpeakerLayout, createRenderAnalysis)
-    
-    else:
+    parser = argparse.ArgumentParser(
+        description="Render an ADM BWF / BW64 master to the speaker layout with VBAP",
+        usage="python runPipeline.py <sourceADMFile> [sourceSpeakerLayout] [createAnalysis] [--verify-tools] "
+              "[--from-stage STAGE] [--to-stage STAGE] [--force] [--incremental] [--workers N] [--threads N] [--build-profile PROFILE]"
+    )
+    parser.add_argument("sourceADMFile", nargs="?", default=None)
+    parser.add_argument("sourceSpeakerLayout", nargs="?", default="vbapRender/allosphere_layout.json")
+    parser.add_argument("createAnalysis", nargs="?", default="true",
+                        help="true / false: write the render analysis PDF")
+    parser.add_argument("--verify-tools", action="store_true",
+                        help="run the full C++ tools check / build instead of trusting the toolchain manifest")
+    parser.add_argument("--build-profile", choices=list(BUILD_PROFILES),
+                        help="renderer build profile, rebuilt if it differs (default: keep the installed one)")
+    parser.add_argument("--from-stage", choices=STAGE_NAMES,
+                        help="load the results of the earlier stages and run from this one")
+    parser.add_argument("--to-stage", choices=STAGE_NAMES, help="stop after this stage")
+    parser.add_argument("--force", action="store_true",
+                        help="rerun the selected stages even if their inputs are unchanged")
+    parser.add_argument("--incremental", action="store_true",
+                        help="reuse cached per-source contributions of unchanged sources when rendering")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="render the timeline in N segments on concurrent renderer processes")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="mix threads per renderer process (output may differ from 1 thread in the last bits)")
+    args = parser.parse_args()
+
+    if args.sourceADMFile is None:
         # default mode
-        print("Usage: python runPipeline.py <sourceADMFile> [sourceSpeakerLayout] [createAnalysis]")
+        parser.print_usage()
         print("\nRunning with default configuration...")
-        
-        sourceADMFile = "sourceData/POE-ATMOS-FINAL.wav"
-        sourceSpeakerLayout = "vbapRender/allosphere_layout.json"
-        createRenderAnalysis = True
-        
-        run_pipeline(sourceADMFile, sourceSpeakerLayout, createRenderAnalysis)
+        args.sourceADMFile = "sourceData/POE-ATMOS-FINAL.wav"
 
+    createRenderAnalysis = args.createAnalysis.lower() in ['true', '1', 'yes']
+    run_pipeline(args.sourceADMFile, args.sourceSpeakerLayout, createRenderAnalysis, verifyTools=args.verify_tools,
+                 incrementalRender=args.incremental, renderWorkers=args.workers, renderThreads=args.threads,
+                 buildProfile=args.build_profile, fromStage=args.from_stage, toStage=args.to_stage, forceStages=args.force)
@@ -1,22 +1,30 @@
 import json
 import os
+import numpy as np
+from src.analyzeADM.trajectoryStore import TrajectoryStore, formatTimecode
 
 def loadObjectData(input_path):
+    """Load object trajectories as a TrajectoryStore from objectData.npz (or a legacy objectData.json)."""
 
     if not os.path.exists(input_path):
         raise FileNotFoundError(f"No object data file found at {input_path}")
     
+    if input_path.endswith(".npz"):
+        return TrajectoryStore.load(input_path)
+    
     with open(input_path, 'r') as f:
         objects_dict = json.load(f)
 
-    return objects_dict
+    return TrajectoryStore.fromObjectDict(objects_dict)
 
 
-def summarizeMetadataChanges(objectsDict):
+def summarizeMetadataChanges(objectStore):
     """Summarize metadata changes over time for each object."""
+    if not isinstance(objectStore, TrajectoryStore):
+        objectStore = TrajectoryStore.fromObjectDict(objectStore)
     summary = {}
     
-    for obj_name, blocks in objectsDict.items():
+    for obj_name, blocks in objectStore.items():
         changes = {
             "total_blocks": len(blocks),
             "time_range": None,
@@ -25,47 +33,43 @@ def summarizeMetadataChanges(objectsDict):
             "width_changes": False
         }
         
-        if blocks:
+        if len(blocks):
             # Calculate time range
-            start_time = blocks[0]['rtime']
-            end_time = blocks[-1]['rtime']
-            changes["time_range"] = (start_time, end_time)
+            changes["time_range"] = (formatTimecode(blocks['start'][0]), formatTimecode(blocks['start'][-1]))
+            
+            # Track position changes - rows whose position differs from the previous block
+            positions = np.round(np.stack([blocks['x'], blocks['y'], blocks['z']], axis=1).astype(np.float64), 6)
+            moved = np.flatnonzero(np.any(positions[1:] != positions[:-1], axis=1)) + 1
+            for i in moved:
+                changes["position_changes"].append({
+                    "time": formatTimecode(blocks['start'][i]),
+                    "from": tuple(positions[i - 1].tolist()),
+                    "to": tuple(positions[i].tolist())
+                })
             
-            # Track position changes
-            prev_position = None
-            prev_width = None
-            for block in blocks:
-                current_position = (block['x'], block['y'], block['z'])
-                current_width = block.get('width', None)
-                
-                if prev_position and current_position != prev_position:
-                    changes["position_changes"].append({
-                        "time": block['rtime'],
-                        "from": prev_position,
-                        "to": current_position
-                    })
-                
-                if prev_width is not None and current_width != prev_width:
-                    changes["width_changes"] = True
-                
-                prev_position = current_position
-                prev_width = current_width
+            # absent widths are NaN and count as equal to each other
+            widths = blocks['width']
+            width_differs = (widths[1:] != widths[:-1]) & ~(np.isnan(widths[1:]) & np.isnan(widths[:-1]))
+            changes["width_changes"] = bool(np.any(width_differs))
             
             # Check if Z-coordinate changes
-            z_values = {block['z'] for block in blocks}
-            changes["z_changes"] = len(z_values) > 1
+            changes["z_changes"] = bool(np.any(blocks['z'] != blocks['z'][0]))
         
         summary[obj_name] = changes
     
     return summary
 
 
-def printSummary(objectDataPath = "data/objectData.json",  togglePositionChanges=False):
-    objectDict = loadObjectData(objectDataPath)
-    summary = summarizeMetadataChanges(objectDict)
-    """Summarize metadata changes. second arg toggles detailed position changes"""
-    print(f"\nFound 10 fixed channels and {len(objectDict)} audio objects:")
-    # for obj_name, blocks in objectDict.items():
+def printSummary(objectDataPath = "processedData/objectData.npz",  togglePositionChanges=False, objectStore=None):
+    """Summarize metadata changes. second arg toggles detailed position changes
+    
+    objectStore (already parsed trajectories) is used instead of loading objectDataPath when given
+    """
+    if objectStore is None:
+        objectStore = loadObjectData(objectDataPath)
+    summary = summarizeMetadataChanges(objectStore)
+    print(f"\nFound 10 fixed channels and {len(objectStore)} audio objects:")
+    # for obj_name, blocks in objectStore.items():
     #     print(f"  - {obj_name}: {len(blocks)} position blocks")
     for obj_name, changes in summary.items():
         print(f"\nObject: {obj_name}")
@@ -77,5 +81,3 @@ def printSummary(objectDataPath = "data/objectData.json",  togglePositionChanges
             print(f"  Position Changes:")
             for change in changes["position_changes"]:
                 print(f"    - At {change['time']}: {change['from']} -> {change['to']}")
-
-
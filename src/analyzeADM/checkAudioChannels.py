@@ -1,63 +1,207 @@
 import os
 import json
 import numpy as np
-import soundfile as sf
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from src.bw64Reader import BW64Reader
 
 def channelHasAudio(file_path, threshold_db=-100, chunk_size=48000, printChannelUpdate=True):
     """Check which channels of an audio file contain audio above a threshold (in dBFS).
     
-    Uses chunked processing for speed - samples audio in chunks rather than loading entire file.
-    Prints progress and total time taken.
+    Samples up to num_samples probe windows spread across the file. Each window is read
+    once for all channels and reduced with a single vectorized RMS/peak pass. Channels
+    drop out of the reduction as soon as they cross the threshold, and the scan stops
+    once every channel is active.
+    Prints progress and total time taken; bytes read and wall time are in the result.
     """
-    info = sf.info(file_path)
-    sr = info.samplerate
-    channels = info.channels
-    total_frames = info.frames
-    
-    num_samples = 30 #fine tuning for speed vs accuracy. not sure about ideal value
-    skip = max(1, total_frames // (chunk_size * num_samples))
-    
-    active_data = []
     start_time = time.time()
     
-    print(f"Scanning {channels} channels in '{file_path}'...")
-    
-    for channelIndex in range(channels):
-        max_rms_db = -np.inf
-
+    with BW64Reader(file_path) as reader:
+        sr = reader.sample_rate
+        channels = reader.channels
+        total_frames = reader.frames
+        
+        num_samples = 30 #fine tuning for speed vs accuracy. not sure about ideal value
+        skip = max(1, total_frames // (chunk_size * num_samples))
+        
+        max_rms_db = np.full(channels, -np.inf)
+        max_peak_db = np.full(channels, -np.inf)
+        pending = np.arange(channels)  # channels that have not crossed the threshold yet
+        bytes_read = 0
+        
+        print(f"Scanning {channels} channels in '{file_path}'...")
+        
         for chunkIndex in range(num_samples):
             start_frame = chunkIndex * skip * chunk_size
-            if start_frame >= total_frames:
+            if start_frame >= total_frames or pending.size == 0:
                 break
             
             frames_to_read = min(chunk_size, total_frames - start_frame)
-            chunk = sf.read(file_path, start=start_frame, frames=frames_to_read, always_2d=True)
-            channel_data = chunk[0][:, channelIndex]
-            rms = np.sqrt(np.mean(channel_data ** 2))
+            # only the channels still below the threshold are converted to float
+            channel_data = reader.read(start_frame, start_frame + frames_to_read, channels=pending)
+            bytes_read += frames_to_read * reader.block_align
+            
+            rms = np.sqrt(np.mean(np.square(channel_data), axis=0, dtype=np.float64))
+            peak = np.max(np.abs(channel_data), axis=0)
             rms_db = 20 * np.log10(rms + 1e-10)
-            if rms_db > max_rms_db:
-                max_rms_db = rms_db
-            if max_rms_db > threshold_db:
-                break
-        
-        active = max_rms_db > threshold_db
+            peak_db = 20 * np.log10(peak.astype(np.float64) + 1e-10)
+            
+            max_rms_db[pending] = np.maximum(max_rms_db[pending], rms_db)
+            max_peak_db[pending] = np.maximum(max_peak_db[pending], peak_db)
+            pending = pending[max_rms_db[pending] <= threshold_db]
+    
+    active_data = []
+    for channelIndex in range(channels):
+        active = max_rms_db[channelIndex] > threshold_db
         active_data.append({
             "channel_index": channelIndex,
-            "rms_db": round(float(max_rms_db), 2),
+            "rms_db": round(float(max_rms_db[channelIndex]), 2),
+            "peak_db": round(float(max_peak_db[channelIndex]), 2),
             "contains_audio": bool(active)
         })
         if printChannelUpdate:
-            print(f"  Channel {channelIndex+1}/{channels} scanned (rms_db={round(float(max_rms_db),2)}, contains_audio={active})")
+            print(f"  Channel {channelIndex+1}/{channels} scanned (rms_db={round(float(max_rms_db[channelIndex]),2)}, contains_audio={active})")
+    
+    elapsed = time.time() - start_time
+    print(f"Scan complete: {channels} channels processed in {elapsed:.2f} seconds ({bytes_read / (1024 * 1024):.1f} MB read).")
+    
+    return {
+        "sample_rate": sr,
+        "threshold_db": threshold_db,
+        "channels": active_data,
+        "bytes_read": int(bytes_read),
+        "elapsed_seconds": round(elapsed, 2)
+    }
+
+def _reduceActivityBlock(block, hop_frames):
+    """Per-hop RMS and peak for one (frames, channels) block, shape (hops, channels)."""
+    frames, channels = block.shape
+    num_hops = -(-frames // hop_frames)
+    pad = num_hops * hop_frames - frames
+    if pad:
+        # only the final block of the file can end in a partial hop
+        block = np.concatenate([block, np.zeros((pad, channels), dtype=block.dtype)])
+    hops = block.reshape(num_hops, hop_frames, channels)
+    
+    counts = np.full(num_hops, hop_frames, dtype=np.float64)
+    counts[-1] -= pad
+    rms = np.sqrt(np.sum(np.square(hops), axis=1, dtype=np.float64) / counts[:, None])
+    peak = np.max(np.abs(hops), axis=1)
+    return rms, peak
+
+
+def channelActivityTimeline(file_path, threshold_db=-100, hop_seconds=0.5, block_seconds=10.0, max_workers=4, printChannelUpdate=True):
+    """Scan the entire file and build a per-channel activity timeline.
+    
+    Unlike channelHasAudio this covers every frame, so short cues are never missed.
+    The file is streamed block by block from the memory-mapped reader in bounded memory (at most 2 * max_workers
+    blocks in flight) and the per-block RMS/peak reductions run on a thread pool,
+    so the scan is limited by disk read speed. Each hop of hop_seconds is marked
+    active when its RMS is above threshold_db.
+    
+    Returns:
+    --------
+    tuple
+        (result, timeline) - result has the same layout as channelHasAudio plus the hop
+        size, timeline is a bool array of shape (channels, hops)
+    """
+    start_time = time.time()
+    with BW64Reader(file_path) as reader:
+        sr = reader.sample_rate
+        channels = reader.channels
+        total_frames = reader.frames
+    
+        hop_frames = max(1, int(round(hop_seconds * sr)))
+        hops_per_block = max(1, int(block_seconds * sr) // hop_frames)
+        blocksize = hop_frames * hops_per_block  # blocks always hold whole hops
+        max_pending = 2 * max_workers
+    
+        print(f"Scanning {channels} channels in '{file_path}' (full coverage, {hop_seconds}s hop)...")
+    
+        rms_parts = []
+        peak_parts = []
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending = deque()
+            for block in reader.blocks(blocksize):
+                pending.append(pool.submit(_reduceActivityBlock, block, hop_frames))
+                if len(pending) >= max_pending:
+                    rms, peak = pending.popleft().result()
+                    rms_parts.append(rms)
+                    peak_parts.append(peak)
+            while pending:
+                rms, peak = pending.popleft().result()
+                rms_parts.append(rms)
+                peak_parts.append(peak)
+    
+    rms = np.concatenate(rms_parts) if rms_parts else np.zeros((0, channels))
+    peak = np.concatenate(peak_parts) if peak_parts else np.zeros((0, channels))
+    rms_db = 20 * np.log10(rms + 1e-10)
+    peak_db = 20 * np.log10(peak.astype(np.float64) + 1e-10)
+    timeline = np.ascontiguousarray((rms_db > threshold_db).T)
+    
+    max_rms_db = rms_db.max(axis=0) if len(rms_db) else np.full(channels, -np.inf)
+    max_peak_db = peak_db.max(axis=0) if len(peak_db) else np.full(channels, -np.inf)
+    
+    active_data = []
+    for channelIndex in range(channels):
+        active = bool(timeline[channelIndex].any())
+        active_data.append({
+            "channel_index": channelIndex,
+            "rms_db": round(float(max_rms_db[channelIndex]), 2),
+            "peak_db": round(float(max_peak_db[channelIndex]), 2),
+            "contains_audio": active,
+            "active_seconds": round(float(timeline[channelIndex].sum() * hop_frames / sr), 2)
+        })
+        if printChannelUpdate:
+            print(f"  Channel {channelIndex+1}/{channels} scanned (rms_db={round(float(max_rms_db[channelIndex]),2)}, contains_audio={active})")
     
+    bytes_read = total_frames * reader.block_align
     elapsed = time.time() - start_time
-    print(f"Scan complete: {channels} channels processed in {elapsed:.2f} seconds.")
+    print(f"Scan complete: {channels} channels processed in {elapsed:.2f} seconds "
+          f"({bytes_read / (1024 * 1024) / max(elapsed, 1e-9):.1f} MB/s).")
     
-    return {"sample_rate": sr, "threshold_db": threshold_db, "channels": active_data, "elapsed_seconds": round(elapsed, 2)}
+    result = {
+        "sample_rate": sr,
+        "threshold_db": threshold_db,
+        "channels": active_data,
+        "hop_seconds": hop_frames / sr,
+        "bytes_read": int(bytes_read),
+        "elapsed_seconds": round(elapsed, 2)
+    }
+    return result, timeline
+
+
+def activityIntervals(channel_timeline, hop_seconds):
+    """Convert one channel's activity timeline into (start, end) second pairs of active audio.
+    
+    Returns:
+    --------
+    np.ndarray
+        float array of shape (intervals, 2)
+    """
+    padded = np.concatenate(([False], np.asarray(channel_timeline, dtype=bool), [False]))
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    return edges.reshape(-1, 2) * hop_seconds
+
+
+def timelinePath(output_path="processedData/containsAudio.json"):
+    """Path of the .npy activity timeline sidecar stored next to containsAudio.json."""
+    return os.path.splitext(output_path)[0] + "Timeline.npy"
+
+
+def loadActivityTimeline(output_path="processedData/containsAudio.json"):
+    """Load the (channels, hops) activity timeline saved by exportAudioActivity, or None."""
+    path = timelinePath(output_path)
+    if not os.path.exists(path):
+        print(f"Warning: {path} not found")
+        return None
+    return np.load(path)
+
 
 def deleteContainsAudioJSON(output_path="processedData/containsAudio.json"):
     """
-    Delete the containsAudio.json file if it exists.
+    Delete the containsAudio.json file and its timeline sidecar if they exist.
     """
     file_path = os.path.abspath(output_path)
     if os.path.exists(file_path):
@@ -68,14 +212,68 @@ def deleteContainsAudioJSON(output_path="processedData/containsAudio.json"):
             print(f"Warning: Could not delete {file_path}: {e}")
     else:
         print(f"No file to delete at: {file_path}")
+    
+    sidecar_path = os.path.abspath(timelinePath(output_path))
+    if os.path.exists(sidecar_path):
+        try:
+            os.remove(sidecar_path)
+            print(f"Deleted: {sidecar_path}")
+        except Exception as e:
+            print(f"Warning: Could not delete {sidecar_path}: {e}")
+
+def mapEmptyChannels(data):
+    """Map which channels contain audio based on containsAudio data.
+    
+    Args:
+        data (dict): Loaded processed data containing containsAudio info
+    
+    Returns:
+        dict: Mapping of channel index -> contains_audio (True/False)
+    """
+    channel_audio_map = {}
+    contains_audio_info = data.get('containsAudio', {})
+    for channel_info in contains_audio_info.get('channels', []):
+        channel_index = channel_info.get('channel_index')
+        contains_audio = channel_info.get('contains_audio', False)
+        channel_audio_map[channel_index] = contains_audio
+    return channel_audio_map
 
-def exportAudioActivity(file_path, output_path="processedData/containsAudio.json", threshold_db=-100):
-    """Process a file and save per-channel activity info as JSON."""
+
+def saveAudioActivity(result, output_path="processedData/containsAudio.json", timeline=None):
+    """Write activity results as JSON, plus the timeline as a .npy sidecar when there is one."""
     deleteContainsAudioJSON(output_path)
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    result = channelHasAudio(file_path, threshold_db)
+    if timeline is not None:
+        np.save(timelinePath(output_path), timeline)
+        result["timeline_path"] = os.path.basename(timelinePath(output_path))
+        print(f"Saved activity timeline ({timeline.shape[1]} hops) to {timelinePath(output_path)}")
     with open(output_path, "w") as f:
         json.dump(result, f, indent=4)
     print(f"Saved channel activity to {output_path}")
 
 
+def exportAudioActivity(file_path, output_path="processedData/containsAudio.json", threshold_db=-100, full_scan=False, hop_seconds=0.5, context=None):
+    """Process a file and save per-channel activity info as JSON.
+    
+    With full_scan the whole file is scanned and the per-channel activity timeline is
+    saved as a .npy sidecar next to the JSON (see timelinePath); otherwise only the
+    probe windows of channelHasAudio are checked.
+    
+    With a PipelineContext the results are stored in context.containsAudio /
+    context.activityTimeline and nothing is written.
+    
+    Returns:
+        dict: containsAudio results
+    """
+    timeline = None
+    if full_scan:
+        result, timeline = channelActivityTimeline(file_path, threshold_db, hop_seconds=hop_seconds)
+    else:
+        result = channelHasAudio(file_path, threshold_db)
+    
+    if context is not None:
+        context.containsAudio = result
+        context.activityTimeline = timeline
+    else:
+        saveAudioActivity(result, output_path, timeline)
+    return result
@@ -1,27 +1,118 @@
-import subprocess
 import os
+import struct
+from src.bw64Reader import readChunkTable, parseFmtChunk, WAVE_FORMAT_IEEE_FLOAT
 
-def extractMetaData(wavPath, outXmlPath):
-    print("Extracting ADM metadata from WAV file...")
-    """Run bwfmetaedit on a .wav file and export its ADM XML."""
-    cmd = [
-        "bwfmetaedit",
-        f"--out-xml={outXmlPath}",
-        wavPath 
-    ]
+# reads the ADM chunks straight out of the WAV - replaces the bwfmetaedit subprocess
+#
+# axml: the ADM XML document (ebuCoreMain), handed to the parser as bytes
+# chna: track UID -> track/pack format references, 40 bytes per entry
+# fmt : sample format, used to fill the <Technical> fields bwfmetaedit used to add
+# only these chunks are read, the multi-GB data chunk is skipped with a seek
+
+
+def parseChnaChunk(payload):
+    """Decode a chna chunk into a list of dicts (trackIndex, UID, trackRef, packRef)."""
+    num_tracks, num_uids = struct.unpack("<HH", payload[:4])
+    entries = []
+    for i in range(num_uids):
+        entry = payload[4 + 40 * i:44 + 40 * i]
+        if len(entry) < 40:
+            break
+        track_index, uid, track_ref, pack_ref = struct.unpack("<H12s14s11s", entry[:39])
+        if track_index == 0:
+            continue  # unused slot
+        entries.append({
+            "trackIndex": track_index,
+            "UID": uid.decode("ascii", "replace").rstrip("\x00"),
+            "trackRef": track_ref.decode("ascii", "replace").rstrip("\x00"),
+            "packRef": pack_ref.decode("ascii", "replace").rstrip("\x00"),
+        })
+    return entries
+
+
+def technicalFromFmt(wavPath, riff_id, fmt, data_size):
+    """Build the <Technical> style global data (same keys as bwfmetaedit) from the fmt chunk."""
+    frames = data_size // fmt["block_align"] if fmt["block_align"] else 0
+    seconds = frames / fmt["sample_rate"] if fmt["sample_rate"] else 0.0
+    hours, remainder = divmod(seconds, 3600)
+    minutes, secs = divmod(remainder, 60)
+    return {
+        "FileSize": str(os.path.getsize(wavPath)),
+        "Format": "Wave" if riff_id == b"RIFF" else f"Wave ({riff_id.decode()})",
+        "CodecID": "3" if fmt["format"] == WAVE_FORMAT_IEEE_FLOAT else "1",
+        "Channels": str(fmt["channels"]),
+        "SampleRate": str(fmt["sample_rate"]),
+        "BitRate": str(fmt["byte_rate"] * 8),
+        "BitPerSample": str(fmt["bits_per_sample"]),
+        "Duration": f"{int(hours):02d}:{int(minutes):02d}:{secs:06.3f}",
+    }
+
+
+def readADMChunks(wavPath):
+    """Read the axml, chna and fmt chunks of a BW64/RF64/WAV file without touching the audio data.
+
+    Returns:
+    --------
+    dict
+        'axml' (bytes or None), 'chna' (list of track entries), 'technical' (dict of <Technical> fields)
+    """
+    riff_id, chunks = readChunkTable(wavPath)
+    by_id = {}
+    for chunk in chunks:
+        by_id.setdefault(chunk["id"], chunk)
 
-    try:
-        subprocess.run(cmd, check=True)
-        print(f"Exported ADM metadata to {outXmlPath }")
-    except subprocess.CalledProcessError as e:
-        print(f" ERROR running bwfmetaedit: {e}")
-    except FileNotFoundError:
-        print(" ERROR bwfmetaedit NOT found!")
-        print(" Install with: brew install bwfmetaedit")
-        print(" Or download from: https://mediaarea.net/BWFMetaEdit")
-        print(" Alternatively, run: from src.configCPP import installBwfmetaedit; installBwfmetaedit()")
+    def readPayload(chunk_id):
+        chunk = by_id.get(chunk_id)
+        if chunk is None:
+            return None
+        with open(wavPath, "rb") as f:
+            f.seek(chunk["offset"])
+            return f.read(chunk["size"])
 
-    return outXmlPath
+    fmt_payload = readPayload(b"fmt ")
+    if fmt_payload is None:
+        raise ValueError(f"No fmt chunk found in {wavPath}")
+    fmt = parseFmtChunk(fmt_payload)
+    data_size = by_id[b"data"]["size"] if b"data" in by_id else 0
+
+    chna_payload = readPayload(b"chna")
+    axml = readPayload(b"axml")
+    if axml is not None:
+        axml = axml.rstrip(b"\x00")  # some writers pad the XML with NULs
+
+    return {
+        "axml": axml,
+        "chna": parseChnaChunk(chna_payload) if chna_payload else [],
+        "technical": technicalFromFmt(wavPath, riff_id, fmt, data_size),
+    }
+
+
+def extractMetaData(wavPath, outXmlPath=None):
+    """Read the ADM XML (axml chunk) and related chunks from a .wav file in memory.
+
+    Parameters:
+    -----------
+    wavPath : str
+        Path to the ADM BWF / BW64 file
+    outXmlPath : str, optional
+        Also write the ADM XML here (debugging only, the pipeline parses the bytes directly)
+
+    Returns:
+    --------
+    dict
+        see readADMChunks - 'axml' holds the XML bytes
+    """
+    print("Extracting ADM metadata from WAV file...")
+    adm = readADMChunks(wavPath)
 
+    if adm["axml"] is None:
+        raise ValueError(f"No axml (ADM XML) chunk found in {wavPath}")
+    print(f"Read ADM metadata: {len(adm['axml']) / 1024:.1f} KB axml, {len(adm['chna'])} chna tracks")
 
+    if outXmlPath:
+        os.makedirs(os.path.dirname(outXmlPath) or ".", exist_ok=True)
+        with open(outXmlPath, "wb") as f:
+            f.write(adm["axml"])
+        print(f"Exported ADM metadata to {outXmlPath}")
 
+    return adm
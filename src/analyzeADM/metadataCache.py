@@ -0,0 +1,181 @@
+import hashlib
+import io
+import json
+import os
+import numpy as np
+
+from src.bw64Reader import readChunkTable
+from src.analyzeADM.extractMetadata import extractMetaData
+from src.analyzeADM.parser import parseADMStream, writeParsedMetadata, checkParsedMetadata
+from src.analyzeADM.trajectoryStore import TrajectoryStore
+
+# persistent cache of parsed ADM metadata, keyed by a fingerprint of the source WAV
+#
+# the fingerprint covers file size, mtime, the first 64 KB (RIFF header, fmt, bext...)
+# and the full axml / chna chunks - never the audio data - so it costs a few ms.
+# each entry is one compressed .npz with the trajectory arrays plus the DirectSpeakers
+# and <Technical> dicts as JSON strings. least recently used entries are evicted once
+# the cache grows beyond max_bytes (hits refresh the entry's mtime).
+
+DEFAULT_CACHE_DIR = "processedData/cache/metadata"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# bump when the parser output changes so stale entries are not reused
+CACHE_FORMAT_VERSION = 2
+
+HEADER_BYTES = 64 * 1024
+HASHED_CHUNKS = (b"axml", b"chna")
+
+
+def fingerprintADMFile(wavPath):
+    """Fast content fingerprint of an ADM WAV (hex string) - does not read the data chunk."""
+    stat = os.stat(wavPath)
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"v{CACHE_FORMAT_VERSION}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+
+    with open(wavPath, "rb") as f:
+        h.update(f.read(HEADER_BYTES))
+
+        try:
+            _, chunks = readChunkTable(wavPath)
+        except ValueError:
+            chunks = []  # not RIFF - size, mtime and header still identify the file
+        for chunk in chunks:
+            if chunk["id"] not in HASHED_CHUNKS:
+                continue
+            h.update(chunk["id"])
+            f.seek(chunk["offset"])
+            remaining = chunk["size"]
+            while remaining > 0:
+                piece = f.read(min(remaining, 1024 * 1024))
+                if not piece:
+                    break
+                h.update(piece)
+                remaining -= len(piece)
+
+    return h.hexdigest()
+
+
+def _entryPath(cache_dir, key):
+    return os.path.join(cache_dir, f"{key}.npz")
+
+
+def loadCachedMetadata(wavPath, cache_dir=DEFAULT_CACHE_DIR, key=None):
+    """Return (TrajectoryStore, directSpeakers, globalData) for wavPath from the cache, or None on a miss."""
+    key = key or fingerprintADMFile(wavPath)
+    path = _entryPath(cache_dir, key)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            objectStore = TrajectoryStore.fromArrays(data)
+            directSpeakers = json.loads(str(data["directSpeakers"]))
+            globalData = json.loads(str(data["globalData"]))
+    except Exception as e:
+        print(f"Warning: Ignoring unreadable metadata cache entry {path}: {e}")
+        return None
+
+    os.utime(path)  # mark as recently used
+    return objectStore, directSpeakers, globalData
+
+
+def saveCachedMetadata(wavPath, objectStore, directSpeakers, globalData, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, key=None):
+    """Store parsed metadata for wavPath and evict old entries beyond max_bytes. Returns the cache key."""
+    key = key or fingerprintADMFile(wavPath)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        **objectStore.toArrays(),
+        directSpeakers=np.array(json.dumps(directSpeakers)),
+        globalData=np.array(json.dumps(globalData))
+    )
+
+    # write then rename so an interrupted run never leaves a truncated entry
+    path = _entryPath(cache_dir, key)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(buffer.getbuffer())
+    os.replace(tmp_path, path)
+
+    pruneMetadataCache(cache_dir, max_bytes)
+    return key
+
+
+def pruneMetadataCache(cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+    """Delete least recently used entries until the cache is at most max_bytes. Returns bytes freed."""
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".npz"):
+            stat = os.stat(os.path.join(cache_dir, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+    entries.sort()
+
+    total = sum(size for _, size, _ in entries)
+    freed = 0
+    for _, size, name in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+            total -= size
+            freed += size
+            print(f"Evicted metadata cache entry: {name}")
+        except Exception as e:
+            print(f"Warning: Could not evict {name}: {e}")
+    return freed
+
+
+def loadADMMetadata(wavPath, xmlOutPath=None, ToggleExportJSON=True, TogglePrintSummary=True, cache_dir=DEFAULT_CACHE_DIR, useCache=True, context=None):
+    """Extract and parse the ADM metadata of wavPath, going through the cache when possible.
+
+    On a miss the axml chunk is read straight from the WAV and parsed in memory (xmlOutPath
+    optionally keeps a copy of the XML for debugging). <Technical> globals come from the
+    fmt chunk unless the XML carries its own section. On a hit, extraction and parsing are
+    skipped entirely and the cached metadata is written to processedData as if it had just
+    been parsed.
+
+    With a PipelineContext the metadata is stored in context.objectData / directSpeakerData /
+    globalData instead of being written to processedData (see PipelineContext.exportDebugFiles).
+
+    Returns:
+    --------
+    tuple
+        (TrajectoryStore, directSpeakers, globalData)
+    """
+    key = fingerprintADMFile(wavPath) if useCache else None
+    cached = loadCachedMetadata(wavPath, cache_dir, key=key) if useCache else None
+
+    if cached is not None:
+        print(f"Using cached ADM metadata ({key[:12]}) for {wavPath}")
+        objectStore, directSpeakers, globalData = cached
+    else:
+        adm = extractMetaData(wavPath, xmlOutPath)
+        print("Parsing ADM metadata...")
+        objectStore, directSpeakers, globalData = parseADMStream(adm["axml"])
+        if not globalData:
+            globalData = adm["technical"]
+
+    if context is not None:
+        checkParsedMetadata(directSpeakers, globalData, sourceName=wavPath)
+        context.objectData = objectStore
+        context.directSpeakerData = directSpeakers
+        context.globalData = globalData
+        print(f"Parsed {len(objectStore)} objects ({objectStore.numBlocks} blocks) and "
+              f"{len(directSpeakers)} DirectSpeakers")
+        if TogglePrintSummary:
+            from src.analyzeADM.analyzeMetadata import printSummary
+            printSummary(objectStore=objectStore, togglePositionChanges=False)
+    else:
+        writeParsedMetadata(objectStore, directSpeakers, globalData, ToggleExportJSON, TogglePrintSummary, sourceName=wavPath)
+
+    if useCache and cached is None:
+        saveCachedMetadata(wavPath, objectStore, directSpeakers, globalData, cache_dir, key=key)
+        print(f"Cached parsed ADM metadata ({key[:12]}) in {cache_dir}")
+
+    return objectStore, directSpeakers, globalData
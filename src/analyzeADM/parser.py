@@ -1,6 +1,10 @@
+import io
 import json
-from lxml import etree
 import os
+from src.analyzeADM.trajectoryStore import TrajectoryBuilder, TrajectoryStore, parseTimecodeToSeconds
+
+# lxml is imported by the functions that parse XML, so metadata cache hits
+# (and the check / write helpers) never load it
 
 # heavy usage of claude sonnet (in copilot) for dealing with ebu formatting 
 
@@ -31,6 +35,7 @@ def extractObjectPositions(xml_path):
     """
     # Updated namespace for ebuCore_2016
     ns = {"ebu": "urn:ebu:metadata-schema:ebuCore_2016"}
+    from lxml import etree
     tree = etree.parse(xml_path)
     
     objects = {}
@@ -115,15 +120,11 @@ def loadObjectData(inputPath="processedData/objectData.json"):
 
 
 
-def parseTimecodeToSeconds(timecode):
-    """Convert timecode string (HH:MM:SS.SSSSS) to seconds."""
-    hours, minutes, seconds = timecode.split(':')
-    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
-
-
 def getPositionAtTime(blocks, time_seconds):
     """
     returns dict of Position data at the specified time, or None if not found
+    linear scan over block dicts - for repeated or grid queries use
+    TrajectoryStore.positionAt / positionsOnGrid, which are O(log n) per lookup
     """
     for block in blocks:
         start_time = parseTimecodeToSeconds(block['rtime'])
@@ -137,6 +138,7 @@ def getPositionAtTime(blocks, time_seconds):
 
 def getGlobalData(xmlPath, outputPath="processedData/globalData.json"):
     """Extract all fields from the XML file's <Technical> section and save to JSON."""
+    from lxml import etree
     tree = etree.parse(xmlPath)
     technicalData = tree.find(".//Technical")
 
@@ -160,6 +162,7 @@ def getGlobalData(xmlPath, outputPath="processedData/globalData.json"):
 def getDirectSpeakerData(xmlPath, outputPath="processedData/directSpeakerData.json"):
     """Extract all DirectSpeaker channel data from the XML file and save to JSON."""
     ns = {"ebu": "urn:ebu:metadata-schema:ebuCore_2016"}
+    from lxml import etree
     tree = etree.parse(xmlPath)
     
     direct_speakers = {}
@@ -221,21 +224,202 @@ def getDirectSpeakerData(xmlPath, outputPath="processedData/directSpeakerData.js
     return direct_speakers
 
 
-def parseMetadata(xmlPath, ToggleExportJSON = True, TogglePrintSummary = True):
-    """CALLS OTHER FUNCTIONS - parses metadata from XML file, optionally exports to JSON and prints summary"""
-    objectsDict = extractObjectPositions(xmlPath)
+EBU_NS = "urn:ebu:metadata-schema:ebuCore_2016"
 
-    getGlobalData(xmlPath, outputPath="processedData/globalData.json")
-    print("Extracted global technical metadata")
+def _ebuTag(name):
+    return f"{{{EBU_NS}}}{name}"
+
+# top-level ADM elements that are cleared as soon as they close so memory stays flat
+_ADM_CLEARED_TAGS = [_ebuTag(name) for name in (
+    "audioProgramme", "audioContent", "audioObject", "audioPackFormat",
+    "audioStreamFormat", "audioTrackFormat", "audioTrackUID"
+)]
+
+
+def _clearElement(elem):
+    """Free a processed element and the already-processed siblings before it."""
+    elem.clear()
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
+
+
+def _readPositions(block, data):
+    for pos in block.iter(_ebuTag("position")):
+        coord = pos.attrib.get("coordinate", "")
+        value = float(pos.text) if pos.text else 0.0
+        
+        if coord == "X":
+            data['x'] = value
+        elif coord == "Y":
+            data['y'] = value
+        elif coord == "Z":
+            data['z'] = value
+
+
+def _findFirst(block, name):
+    return next(block.iter(_ebuTag(name)), None)
 
-    getDirectSpeakerData(xmlPath, outputPath="processedData/directSpeakerData.json")
+
+def parseADMStream(xmlPath):
+    """Parse objects, DirectSpeakers and <Technical> globals in a single streaming pass.
+    
+    Same content as extractObjectPositions, getDirectSpeakerData and getGlobalData combined,
+    but the document is read once with iterparse and every audioBlockFormat /
+    audioChannelFormat is cleared as soon as it has been read, so memory stays roughly
+    constant even for feature-length ADM with hundreds of thousands of blocks.
+    Object blocks go straight into a columnar TrajectoryStore. Nothing is written to disk.
+    xmlPath can also be the XML itself as bytes (e.g. the axml chunk from extractMetaData).
+    
+    Returns:
+    --------
+    tuple
+        (TrajectoryStore, directSpeakersDict, globalDataDict)
+    """
+    objects = TrajectoryBuilder()
+    direct_speakers = {}
+    global_data = {}
+    
+    channel_tag = _ebuTag("audioChannelFormat")
+    block_tag = _ebuTag("audioBlockFormat")
+    
+    channel = None  # attributes of the audioChannelFormat currently open
+    speaker_data = None
+    
+    source = io.BytesIO(xmlPath) if isinstance(xmlPath, (bytes, bytearray)) else xmlPath
+    from lxml import etree
+    context = etree.iterparse(
+        source,
+        events=("start", "end"),
+        tag=[channel_tag, block_tag, "Technical"] + _ADM_CLEARED_TAGS,
+        huge_tree=True
+    )
+    for event, elem in context:
+        tag = elem.tag
+        
+        if event == "start":
+            if tag == channel_tag:
+                channel = dict(elem.attrib)
+                speaker_data = None
+            continue
+        
+        if tag == block_tag and channel is not None:
+            type_definition = channel.get("typeDefinition")
+            
+            if type_definition == "Objects":
+                position_data = {'x': 0.0, 'y': 0.0, 'z': 0.0}
+                _readPositions(elem, position_data)
+                
+                cartesian = _findFirst(elem, "cartesian")
+                if cartesian is not None:
+                    cartesian = int(cartesian.text) if cartesian.text else 1
+                extents = {}
+                for key in ("width", "depth", "height"):
+                    child = _findFirst(elem, key)
+                    extents[key] = float(child.text) if child is not None and child.text else None
+                
+                objects.addBlock(
+                    parseTimecodeToSeconds(elem.attrib.get("rtime", "00:00:00.00000")),
+                    parseTimecodeToSeconds(elem.attrib.get("duration", "00:00:00.00000")),
+                    position_data['x'], position_data['y'], position_data['z'],
+                    extents['width'], extents['height'], extents['depth'],
+                    cartesian
+                )
+            
+            elif type_definition == "DirectSpeakers" and speaker_data is None:
+                # only the first block of a DirectSpeakers channel is used
+                speaker_data = {
+                    'channelID': channel.get("audioChannelFormatID", ""),
+                    'channelName': channel.get("audioChannelFormatName", "Unnamed"),
+                    'blockID': elem.attrib.get("audioBlockFormatID", ""),
+                    'x': 0.0,
+                    'y': 0.0,
+                    'z': 0.0,
+                    'speakerLabel': '',
+                    'cartesian': 1 # 1 = cartesian, 0 = spherical
+                }
+                speaker_label = _findFirst(elem, "speakerLabel")
+                if speaker_label is not None and speaker_label.text:
+                    speaker_data['speakerLabel'] = speaker_label.text.strip()
+                cartesian = _findFirst(elem, "cartesian")
+                if cartesian is not None and cartesian.text:
+                    speaker_data['cartesian'] = int(cartesian.text)
+                _readPositions(elem, speaker_data)
+            
+            _clearElement(elem)
+        
+        elif tag == channel_tag:
+            name = channel.get("audioChannelFormatName", "Unnamed")
+            if channel.get("typeDefinition") == "Objects":
+                objects.endObject(name, channel.get("audioChannelFormatID", ""))
+            elif speaker_data is not None:
+                direct_speakers[name] = speaker_data
+            channel = None
+            _clearElement(elem)
+        
+        elif tag == "Technical":
+            if not global_data:
+                for child in elem:
+                    text = child.text.strip() if child.text else ""
+                    global_data[child.tag.strip()] = text
+            _clearElement(elem)
+        
+        else:
+            _clearElement(elem)
+    
+    del context
+    return objects.build(), direct_speakers, global_data
+
+
+def _saveJSON(data, outputPath):
+    os.makedirs(os.path.dirname(outputPath), exist_ok=True)
+    
+    with open(outputPath, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def checkParsedMetadata(directSpeakers, globalData, sourceName = "ADM metadata"):
+    """Raise ValueError if the <Technical> section or the DirectSpeaker channels are missing."""
+    if not globalData:
+        raise ValueError(f"No <Technical> section found in {sourceName}")
+    if not directSpeakers:
+        raise ValueError(f"No DirectSpeaker channels found in {sourceName}")
+
+
+def writeParsedMetadata(objectStore, directSpeakers, globalData, ToggleExportJSON = True, TogglePrintSummary = True, sourceName = "ADM metadata"):
+    """Write parsed metadata to processedData for the packaging stage, optionally export object JSON and print summary.
+    
+    globalData.json, directSpeakerData.json and the object trajectories (objectData.npz)
+    are always written since standalone packaging reads them; objectData.json is a debug export.
+    """
+    checkParsedMetadata(directSpeakers, globalData, sourceName)
+    _saveJSON(globalData, "processedData/globalData.json")
+    print("Saved technical metadata to processedData/globalData.json")
+    print("Extracted global technical metadata")
+    
+    _saveJSON(directSpeakers, "processedData/directSpeakerData.json")
+    print("Saved DirectSpeaker data to processedData/directSpeakerData.json")
     print("Extracted DirectSpeaker channel metadata")
 
+    objectStore.save("processedData/objectData.npz")
+    print(f"Saved object trajectories to processedData/objectData.npz "
+          f"({len(objectStore)} objects, {objectStore.numBlocks} blocks, {objectStore.nbytes / 1024:.1f} KB)")
     if ToggleExportJSON:
-        saveObjectData(objectsDict, outputPath="processedData/objectData.json")
+        saveObjectData(objectStore.toObjectDict(), outputPath="processedData/objectData.json")
     if TogglePrintSummary:
         from src.analyzeADM.analyzeMetadata import printSummary
-        printSummary(objectDataPath="processedData/objectData.json", togglePositionChanges=False)
-    
+        printSummary(objectStore=objectStore, togglePositionChanges=False)
+
 
-    return objectsDict
\ No newline at end of file
+def parseMetadata(xmlPath, ToggleExportJSON = True, TogglePrintSummary = True):
+    """Parses metadata from XML file in one streaming pass and writes it out with writeParsedMetadata.
+    
+    Returns:
+    --------
+    TrajectoryStore
+        object trajectories
+    """
+    objectStore, directSpeakers, globalData = parseADMStream(xmlPath)
+    writeParsedMetadata(objectStore, directSpeakers, globalData, ToggleExportJSON, TogglePrintSummary, sourceName=xmlPath)
+    return objectStore
@@ -0,0 +1,289 @@
+import numpy as np
+from array import array
+
+# columnar storage for ADM object trajectories
+#
+# all audioBlockFormat entries of all objects live in one structured array,
+# object i owns blocks[offsets[i]:offsets[i+1]]. times are float64 seconds
+# (no timecode strings), positions and extents float32.
+# absent width/height/depth are NaN, absent cartesian flag is -1
+# ~41 bytes per block instead of a python dict of strings and floats per block
+
+TRAJECTORY_DTYPE = np.dtype([
+    ("start", "<f8"),
+    ("duration", "<f8"),
+    ("x", "<f4"),
+    ("y", "<f4"),
+    ("z", "<f4"),
+    ("width", "<f4"),
+    ("height", "<f4"),
+    ("depth", "<f4"),
+    ("cartesian", "i1"),
+])
+
+
+def parseTimecodeToSeconds(timecode):
+    """Convert timecode string (HH:MM:SS.SSSSS) to seconds."""
+    hours, minutes, seconds = timecode.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def formatTimecode(seconds):
+    """Convert seconds back to an ADM timecode string (HH:MM:SS.SSSSS)."""
+    hours, remainder = divmod(round(float(seconds), 5), 3600)
+    minutes, secs = divmod(remainder, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{secs:08.5f}"
+
+
+def _optionalFloat(value):
+    return np.nan if value is None else value
+
+
+class TrajectoryStore:
+    """Per-object block arrays for ADM objects, backed by one concatenated structured array.
+
+    Behaves like the old objects dict for reading: store[name], store.items(), len(store),
+    `name in store`. Each value is a structured view with TRAJECTORY_DTYPE fields.
+    """
+
+    __slots__ = ("names", "channelIDs", "offsets", "blocks", "_nameIndex", "_starts", "_ends", "_positions")
+
+    def __init__(self, names, channelIDs, offsets, blocks):
+        self.names = list(names)
+        self.channelIDs = list(channelIDs)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.blocks = np.asarray(blocks, dtype=TRAJECTORY_DTYPE)
+        self._nameIndex = {name: i for i, name in enumerate(self.names)}
+        self._starts = None  # time index, built on the first query
+        self._ends = None
+        self._positions = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._nameIndex
+
+    def __getitem__(self, name):
+        return self.object(name)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def keys(self):
+        return list(self.names)
+
+    def items(self):
+        for i, name in enumerate(self.names):
+            yield name, self.blocks[self.offsets[i]:self.offsets[i + 1]]
+
+    def object(self, name):
+        """Structured view of one object's blocks (no copy)."""
+        i = self._nameIndex[name]
+        return self.blocks[self.offsets[i]:self.offsets[i + 1]]
+
+    @property
+    def numBlocks(self):
+        return len(self.blocks)
+
+    @property
+    def nbytes(self):
+        return self.blocks.nbytes + self.offsets.nbytes
+
+    # queries
+    #
+    # the index holds start / end times and xyz of every block, sorted by time
+    # within each object (same offsets as blocks). lookups are np.searchsorted
+    # over one object's segment, so O(log n) instead of a linear scan with
+    # timecode parsing per block
+
+    def _buildIndex(self):
+        object_ids = np.repeat(np.arange(len(self.names)), np.diff(self.offsets))
+        order = np.lexsort((self.blocks['start'], object_ids))
+        sorted_blocks = self.blocks[order]
+        self._starts = sorted_blocks['start']
+        self._ends = sorted_blocks['start'] + sorted_blocks['duration']
+        self._positions = np.stack([sorted_blocks['x'], sorted_blocks['y'], sorted_blocks['z']], axis=1)
+
+    def _lookup(self, index, times, interpolate):
+        """Positions (len(times), 3) for one object, NaN where no block covers the time."""
+        if self._starts is None:
+            self._buildIndex()
+        lo, hi = self.offsets[index], self.offsets[index + 1]
+        starts = self._starts[lo:hi]
+        ends = self._ends[lo:hi]
+        positions = self._positions[lo:hi]
+        
+        out = np.full((len(times), 3), np.nan, dtype=np.float32)
+        if hi == lo:
+            return out
+        
+        k = np.searchsorted(starts, times, side='right') - 1
+        covered = (k >= 0) & (times < ends[np.maximum(k, 0)])
+        k_covered = k[covered]
+        out[covered] = positions[k_covered]
+        
+        if interpolate and len(starts) > 1:
+            # linear between consecutive block starts, the last block holds its position
+            nxt = np.minimum(k_covered + 1, len(starts) - 1)
+            span = starts[nxt] - starts[k_covered]
+            has_next = (nxt != k_covered) & (span > 0)
+            u = np.zeros(len(k_covered))
+            u[has_next] = (times[covered][has_next] - starts[k_covered][has_next]) / span[has_next]
+            u = np.clip(u, 0.0, 1.0).astype(np.float32)[:, None]
+            out[covered] = (1 - u) * positions[k_covered] + u * positions[nxt]
+        return out
+
+    def positionAt(self, name, time_seconds, interpolate=False):
+        """Position (x, y, z) of one object at time_seconds, or None when no block covers it.
+        
+        A block covers [start, start + duration). With interpolate, the position is
+        blended linearly towards the next block's position.
+        """
+        out = self._lookup(self._nameIndex[name], np.array([time_seconds], dtype=np.float64), interpolate)
+        if np.isnan(out[0, 0]):
+            return None
+        return out[0]
+
+    def positionsOnGrid(self, times, names=None, interpolate=False):
+        """Positions of several objects on a time grid.
+        
+        Parameters:
+        -----------
+        times : array-like
+            Times in seconds, shape (T,)
+        names : list, optional
+            Objects to sample (default: all, in store order)
+        interpolate : bool
+            Blend linearly between consecutive blocks
+        
+        Returns:
+        --------
+        np.ndarray
+            float32 array of shape (T, N, 3), NaN where an object has no block at that time
+        """
+        times = np.asarray(times, dtype=np.float64)
+        names = self.names if names is None else names
+        out = np.empty((len(times), len(names), 3), dtype=np.float32)
+        for j, name in enumerate(names):
+            out[:, j, :] = self._lookup(self._nameIndex[name], times, interpolate)
+        return out
+
+    @classmethod
+    def fromObjectDict(cls, objectsDict):
+        """Build a store from the dict-of-block-dicts format of extractObjectPositions / objectData.json."""
+        builder = TrajectoryBuilder()
+        for name, blocks in objectsDict.items():
+            for block in blocks:
+                builder.addBlock(
+                    parseTimecodeToSeconds(block.get('rtime', '00:00:00.00000')),
+                    parseTimecodeToSeconds(block.get('duration', '00:00:00.00000')),
+                    block.get('x', 0.0), block.get('y', 0.0), block.get('z', 0.0),
+                    block.get('width'), block.get('height'), block.get('depth'),
+                    block.get('cartesian')
+                )
+            channel_id = blocks[0].get('channelID', "") if blocks else ""
+            builder.endObject(name, channel_id)
+        return builder.build()
+
+    def toObjectDict(self):
+        """Expand back into the dict-of-block-dicts format (for JSON debug exports)."""
+        objects = {}
+        for i, (name, blocks) in enumerate(self.items()):
+            channel_id = self.channelIDs[i]
+            block_list = []
+            for row in blocks.tolist():
+                start, duration, x, y, z, width, height, depth, cartesian = row
+                position_data = {
+                    'rtime': formatTimecode(start),
+                    'duration': formatTimecode(duration),
+                    'x': round(x, 6),
+                    'y': round(y, 6),
+                    'z': round(z, 6)
+                }
+                if channel_id:
+                    position_data['channelID'] = channel_id
+                if cartesian >= 0:
+                    position_data['cartesian'] = cartesian
+                for key, value in (('width', width), ('depth', depth), ('height', height)):
+                    if not np.isnan(value):
+                        position_data[key] = round(value, 6)
+                block_list.append(position_data)
+            objects[name] = block_list
+        return objects
+
+    def toArrays(self):
+        """Arrays that fully describe the store (for np.savez or embedding in another archive)."""
+        return {
+            "blocks": self.blocks,
+            "offsets": self.offsets,
+            "names": np.array(self.names, dtype=np.str_),
+            "channelIDs": np.array(self.channelIDs, dtype=np.str_)
+        }
+
+    @classmethod
+    def fromArrays(cls, data):
+        return cls(
+            data["names"].tolist(),
+            data["channelIDs"].tolist(),
+            data["offsets"],
+            data["blocks"]
+        )
+
+    def save(self, path):
+        """Write the store to a .npz file (exact round trip through load)."""
+        np.savez(path, **self.toArrays())
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls.fromArrays(data)
+
+
+class TrajectoryBuilder:
+    """Accumulates blocks column by column (compact array.array buffers) while parsing."""
+
+    __slots__ = ("_columns", "_segments", "_objectStart")
+
+    def __init__(self):
+        self._columns = {name: array("d" if name in ("start", "duration") else "b" if name == "cartesian" else "f")
+                         for name in TRAJECTORY_DTYPE.names}
+        self._segments = {}  # name -> (channelID, start, end), later duplicates replace earlier ones
+        self._objectStart = 0
+
+    def addBlock(self, start, duration, x, y, z, width=None, height=None, depth=None, cartesian=None):
+        columns = self._columns
+        columns["start"].append(start)
+        columns["duration"].append(duration)
+        columns["x"].append(x)
+        columns["y"].append(y)
+        columns["z"].append(z)
+        columns["width"].append(_optionalFloat(width))
+        columns["height"].append(_optionalFloat(height))
+        columns["depth"].append(_optionalFloat(depth))
+        columns["cartesian"].append(-1 if cartesian is None else cartesian)
+
+    def endObject(self, name, channelID=""):
+        """Close the current object; objects without blocks are dropped."""
+        end = len(self._columns["start"])
+        if end > self._objectStart:
+            # like re-assigning a dict key: first position, latest blocks
+            self._segments[name] = (channelID, self._objectStart, end)
+        self._objectStart = end
+
+    def build(self):
+        total = len(self._columns["start"])
+        flat = np.empty(total, dtype=TRAJECTORY_DTYPE)
+        for name, column in self._columns.items():
+            flat[name] = np.frombuffer(column, dtype=column.typecode) if total else []
+
+        names = list(self._segments)
+        channel_ids = [self._segments[name][0] for name in names]
+        lengths = [self._segments[name][2] - self._segments[name][1] for name in names]
+        offsets = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+        if sum(lengths) == total:
+            blocks = flat  # no duplicates, segments are already contiguous in order
+        else:
+            blocks = np.concatenate([flat[start:end] for _, start, end in self._segments.values()]) \
+                if names else flat[:0]
+        return TrajectoryStore(names, channel_ids, offsets, blocks)
@@ -1,7 +1,7 @@
 import numpy as np
-import soundfile as sf
 import matplotlib.pyplot as plt
 from pathlib import Path
+from src.bw64Reader import BW64Reader
 
 
 def analyzeRenderOutput(
@@ -35,11 +35,12 @@ def analyzeRenderOutput(
     
     print(f"Loading render file: {render_path}")
     
-    # Load the audio file
-    audio, sr = sf.read(str(render_path))
+    # Memory-map the audio file - only one second is converted to float at a time
+    reader = BW64Reader(render_path)
+    sr = reader.sample_rate
     
-    num_channels = audio.shape[1] if len(audio.shape) > 1 else 1
-    num_samples = audio.shape[0]
+    num_channels = reader.channels
+    num_samples = reader.frames
     duration = num_samples / sr
     
     print(f"Channels: {num_channels}")
@@ -56,22 +57,13 @@ def analyzeRenderOutput(
     # Store dB values for each channel
     db_values = np.zeros((num_channels, num_time_points))
     
-    for ch in range(num_channels):
-        for t in range(num_time_points):
-            start_sample = t * samples_per_second
-            end_sample = min(start_sample + samples_per_second, num_samples)
-            
-            # Get RMS for this second
-            chunk = audio[start_sample:end_sample, ch]
-            rms = np.sqrt(np.mean(chunk ** 2))
-            
-            # Convert to dB (reference: 1.0 = 0 dB)
-            if rms > 0:
-                db = 20 * np.log10(rms)
-            else:
-                db = -120  # Floor for silence
-            
-            db_values[ch, t] = db
+    for t, chunk in enumerate(reader.blocks(samples_per_second, stop=num_time_points * samples_per_second)):
+        # Get RMS for this second, all channels at once
+        rms = np.sqrt(np.mean(np.square(chunk), axis=0, dtype=np.float64))
+        
+        # Convert to dB (reference: 1.0 = 0 dB), floor for silence
+        db_values[:, t] = np.where(rms > 0, 20 * np.log10(np.maximum(rms, 1e-300)), -120)
+    reader.close()
     
     print("Creating plots...")
     
@@ -0,0 +1,234 @@
+import struct
+import numpy as np
+
+# Memory-mapped reader for RIFF/WAVE, RF64 and BW64 (ADM) PCM files.
+#
+# The chunk table is parsed once without touching the audio payload, then the
+# data chunk is exposed as a zero-copy np.memmap of shape (frames, channels).
+# Samples are only converted to float32 for the frames/channels that are asked for,
+# so peak memory stays flat regardless of the length of the master.
+#
+# layout notes:
+# - RF64 / BW64 files store 0xFFFFFFFF as the size of large chunks, the real
+#   sizes live in the ds64 chunk (data size + an optional table for other chunks)
+# - chunks are padded to an even number of bytes
+# - WAVE_FORMAT_EXTENSIBLE (0xFFFE) carries the real format in the first two
+#   bytes of the sub-format GUID
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+RIFF_IDS = (b"RIFF", b"RF64", b"BW64")
+
+# (format, bits per sample) -> (memmap dtype, soundfile subtype)
+SAMPLE_FORMATS = {
+    (WAVE_FORMAT_PCM, 8): ("u1", "PCM_U8"),
+    (WAVE_FORMAT_PCM, 16): ("<i2", "PCM_16"),
+    (WAVE_FORMAT_PCM, 24): ("u1", "PCM_24"),  # mapped as raw bytes, see _toFloat32
+    (WAVE_FORMAT_PCM, 32): ("<i4", "PCM_32"),
+    (WAVE_FORMAT_IEEE_FLOAT, 32): ("<f4", "FLOAT"),
+    (WAVE_FORMAT_IEEE_FLOAT, 64): ("<f8", "DOUBLE"),
+}
+
+
+def readChunkTable(path):
+    """Walk the RIFF/RF64/BW64 chunk list without reading any chunk payloads.
+
+    Parameters:
+    -----------
+    path : str
+        Path to the WAV / RF64 / BW64 file
+
+    Returns:
+    --------
+    tuple
+        (riff_id, chunks) - riff_id is b"RIFF", b"RF64" or b"BW64" and chunks is a list
+        of dicts with 'id' (bytes), 'offset' (payload start in bytes) and 'size'
+    """
+    with open(path, "rb") as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] not in RIFF_IDS or header[8:12] != b"WAVE":
+            raise ValueError(f"Not a RIFF/RF64/BW64 WAVE file: {path}")
+        riff_id = header[:4]
+
+        f.seek(0, 2)
+        file_size = f.tell()
+        f.seek(12)
+
+        ds64_sizes = {}
+        chunks = []
+        while f.tell() + 8 <= file_size:
+            chunk_header = f.read(8)
+            chunk_id, size = struct.unpack("<4sI", chunk_header)
+            offset = f.tell()
+
+            if chunk_id == b"ds64":
+                ds64 = f.read(size)
+                _, data_size, _, table_length = struct.unpack("<QQQI", ds64[:28])
+                ds64_sizes[b"data"] = data_size
+                for i in range(table_length):
+                    entry_id, entry_size = struct.unpack("<4sQ", ds64[28 + 12 * i:40 + 12 * i])
+                    ds64_sizes[entry_id] = entry_size
+            elif size == 0xFFFFFFFF:
+                size = ds64_sizes.get(chunk_id, file_size - offset)
+
+            # truncated / still-being-written files can claim more data than exists
+            size = min(size, file_size - offset)
+            chunks.append({"id": chunk_id, "offset": offset, "size": size})
+            f.seek(offset + size + (size & 1))
+
+    return riff_id, chunks
+
+
+def parseFmtChunk(payload):
+    """Decode a fmt chunk payload into a dict (format, channels, sample_rate, block_align, bits_per_sample)."""
+    format_tag, channels, sample_rate, byte_rate, block_align, bits_per_sample = struct.unpack("<HHIIHH", payload[:16])
+    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(payload) >= 26:
+        format_tag = struct.unpack("<H", payload[24:26])[0]
+    return {
+        "format": format_tag,
+        "channels": channels,
+        "sample_rate": sample_rate,
+        "byte_rate": byte_rate,
+        "block_align": block_align,
+        "bits_per_sample": bits_per_sample,
+    }
+
+
+class BW64Reader:
+    """Zero-copy reader for integer and float PCM in WAV, RF64 and BW64 files.
+
+    The data chunk is memory mapped with shape (frames, channels); read(), channel()
+    and blocks() slice that view lazily and convert only the requested range to float32
+    (scaled like libsndfile, so values match soundfile's float output).
+
+    Usage:
+        with BW64Reader("master.wav") as reader:
+            for block in reader.blocks(48000):
+                ...
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.riff_id, self.chunks = readChunkTable(self.path)
+
+        fmt_chunk = self.findChunk(b"fmt ")
+        data_chunk = self.findChunk(b"data")
+        if fmt_chunk is None or data_chunk is None:
+            raise ValueError(f"Missing fmt or data chunk in {self.path}")
+
+        with open(self.path, "rb") as f:
+            f.seek(fmt_chunk["offset"])
+            fmt = parseFmtChunk(f.read(fmt_chunk["size"]))
+
+        key = (fmt["format"], fmt["bits_per_sample"])
+        if key not in SAMPLE_FORMATS:
+            raise ValueError(f"Unsupported sample format {key} in {self.path} (only integer and float PCM)")
+
+        self.fmt = fmt
+        self.sample_rate = fmt["sample_rate"]
+        self.channels = fmt["channels"]
+        self.bits_per_sample = fmt["bits_per_sample"]
+        self.block_align = fmt["block_align"]
+        self.dtype, self.subtype = SAMPLE_FORMATS[key]
+        self.data_offset = data_chunk["offset"]
+        self.frames = data_chunk["size"] // self.block_align
+        self._data = None
+
+    def findChunk(self, chunk_id):
+        """Return the first chunk dict with the given 4-byte id, or None."""
+        for chunk in self.chunks:
+            if chunk["id"] == chunk_id:
+                return chunk
+        return None
+
+    @property
+    def data(self):
+        """Raw np.memmap of the data chunk, shape (frames, channels) - (frames, channels, 3) bytes for 24-bit."""
+        if self._data is None:
+            if self.frames == 0:
+                shape = (0, self.channels, 3) if self.bits_per_sample == 24 else (0, self.channels)
+                self._data = np.zeros(shape, dtype=self.dtype)
+            else:
+                shape = (self.frames, self.channels, 3) if self.bits_per_sample == 24 else (self.frames, self.channels)
+                self._data = np.memmap(self.path, dtype=self.dtype, mode="r", offset=self.data_offset, shape=shape)
+        return self._data
+
+    @property
+    def duration(self):
+        return self.frames / self.sample_rate
+
+    def read(self, start=0, stop=None, channels=None):
+        """Return frames [start, stop) as float32, shape (frames, channels).
+
+        channels can be an int, a slice or a list of channel indices; only those
+        columns are converted.
+        """
+        stop = self.frames if stop is None else min(stop, self.frames)
+        raw = self.data[start:stop]
+        if channels is not None:
+            raw = raw[:, channels]
+        return self._toFloat32(raw)
+
+    def channel(self, index, start=0, stop=None):
+        """Return one channel as a 1-D float32 array (strided read of the interleaved data)."""
+        return self.read(start, stop, channels=index)
+
+    def blocks(self, blocksize, channels=None, start=0, stop=None):
+        """Yield consecutive float32 blocks of at most blocksize frames, like sf.blocks."""
+        stop = self.frames if stop is None else min(stop, self.frames)
+        for block_start in range(start, stop, blocksize):
+            yield self.read(block_start, min(block_start + blocksize, stop), channels)
+
+    def readNative(self, start=0, stop=None, channels=None):
+        """Return frames [start, stop) without converting to float, for lossless copies.
+
+        The dtype is one soundfile writes without loss to the reader's own subtype:
+        int16 for 8/16-bit (8-bit shifted up to 16), int32 for 24/32-bit (24-bit in the
+        top three bytes, like libsndfile's int interface), float32 / float64 as stored.
+        """
+        stop = self.frames if stop is None else min(stop, self.frames)
+        raw = self.data[start:stop]
+        if channels is not None:
+            raw = raw[:, channels]
+        if self.bits_per_sample == 24:
+            samples = raw[..., 0].astype(np.int32) << 8
+            samples |= raw[..., 1].astype(np.int32) << 16
+            samples |= raw[..., 2].view(np.int8).astype(np.int32) << 24
+            return samples
+        if self.dtype == "u1":
+            return (raw.astype(np.int16) - 128) << 8
+        return np.ascontiguousarray(raw)
+
+    def nativeBlocks(self, blocksize, channels=None, start=0, stop=None):
+        """Yield consecutive readNative blocks of at most blocksize frames."""
+        stop = self.frames if stop is None else min(stop, self.frames)
+        for block_start in range(start, stop, blocksize):
+            yield self.readNative(block_start, min(block_start + blocksize, stop), channels)
+
+    def _toFloat32(self, raw):
+        if self.bits_per_sample == 24:
+            # assemble little-endian 24-bit samples, the top byte carries the sign
+            samples = raw[..., 0].astype(np.int32)
+            samples |= raw[..., 1].astype(np.int32) << 8
+            samples |= raw[..., 2].view(np.int8).astype(np.int32) << 16
+            return samples.astype(np.float32) * np.float32(1.0 / 0x800000)
+        if self.dtype == "u1":
+            return (raw.astype(np.float32) - 128.0) * np.float32(1.0 / 0x80)
+        if self.dtype == "<i2":
+            return raw.astype(np.float32) * np.float32(1.0 / 0x8000)
+        if self.dtype == "<i4":
+            return raw.astype(np.float32) * np.float32(1.0 / 0x80000000)
+        return raw.astype(np.float32)
+
+    def close(self):
+        """Drop the memory map (the OS unmaps once no views are left)."""
+        self._data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
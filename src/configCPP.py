@@ -1,13 +1,77 @@
+import hashlib
+import json
+import os
+import shutil
 import subprocess
+import sys
 from pathlib import Path
 
+# renderer build profiles -> CMake cache variables (see vbapRender/CMakeLists.txt)
+#
+# release         optimised (-O3), what the pipeline uses by default
+# relwithdebinfo  optimised with debug symbols, for profiling
+# native          release + link time optimisation + -march=native, fastest but
+#                 the binary only runs on CPUs like the one it was built on
+BUILD_PROFILES = {
+    "release": {"CMAKE_BUILD_TYPE": "Release", "SONOPLETH_LTO": "OFF", "SONOPLETH_NATIVE": "OFF"},
+    "relwithdebinfo": {"CMAKE_BUILD_TYPE": "RelWithDebInfo", "SONOPLETH_LTO": "OFF", "SONOPLETH_NATIVE": "OFF"},
+    "native": {"CMAKE_BUILD_TYPE": "Release", "SONOPLETH_LTO": "ON", "SONOPLETH_NATIVE": "ON"},
+}
+DEFAULT_BUILD_PROFILE = "release"
 
-def setupCppTools():
+# written next to the executable after a successful build: profile + hash of the sources it was built from
+BUILD_STAMP = "buildStamp.json"
+
+# written by setupCppTools after a full check: the binaries it verified (path, version, size,
+# mtime) and the size / mtime of every renderer source file. ensureCppTools only stats these
+# on later runs - no hashing, no subprocesses - and falls back to the full setupCppTools when
+# anything moved (which rebuilds if the sources really changed and rewrites the manifest).
+TOOLCHAIN_MANIFEST = "toolchain.json"
+TOOLCHAIN_MANIFEST_VERSION = 1
+
+
+def ensureCppTools(profile=None, verify=False, build_dir="vbapRender/build", source_dir="vbapRender"):
+    """
+    Fast startup check of the C++ tools: trust the toolchain manifest when every file
+    it lists is unchanged, otherwise run the full setupCppTools.
+    
+    Parameters:
+    -----------
+    profile : str, optional
+        Renderer build profile, one of BUILD_PROFILES. Without one the profile the
+        renderer was last built with is kept (see installedProfile)
+    verify : bool
+        Ignore the manifest and always run the full setupCppTools (--verify-tools)
+    
+    Returns:
+    --------
+    bool
+        True if the tools are ready, False otherwise
+    """
+    if profile is None:
+        profile = installedProfile(build_dir)
+    if not verify and toolchainIsCurrent(profile, build_dir, source_dir):
+        print(f"✓ C++ tools unchanged since last verified ({profile}, {build_dir}/{TOOLCHAIN_MANIFEST})")
+        return True
+    return setupCppTools(profile=profile, build_dir=build_dir, source_dir=source_dir)
+
+
+def setupCppTools(profile=DEFAULT_BUILD_PROFILE, build_dir="vbapRender/build", source_dir="vbapRender"):
     """
     Complete setup for C++ tools and dependencies.
-    Orchestrates installation of bwfmetaedit, submodule initialization, and VBAP renderer build.
+    Orchestrates submodule initialization and VBAP renderer build.
+    (ADM metadata is read natively in Python, bwfmetaedit is no longer needed.)
     Only performs actions that are needed (idempotent).
     
+    Parameters:
+    -----------
+    profile : str
+        Renderer build profile, one of BUILD_PROFILES
+    build_dir : str
+        Build directory path (relative to project root)
+    source_dir : str
+        Source directory containing CMakeLists.txt (relative to project root)
+    
     Returns:
     --------
     bool
@@ -17,89 +81,25 @@ def setupCppTools():
     print("Setting up C++ tools and dependencies...")
     print("="*60)
     
-    # Step 1: Install bwfmetaedit if needed
-    if not installBwfmetaedit():
-        print("\n⚠ Warning: bwfmetaedit installation failed, but continuing...")
-    
-    # Step 2: Initialize git submodules (allolib) if needed
+    # Step 1: Initialize git submodules (allolib) if needed
     if not initializeSubmodules():
         print("\n✗ Error: Failed to initialize submodules")
         return False
     
-    # Step 3: Build VBAP renderer if needed
-    if not buildVBAPRenderer():
+    # Step 2: Build VBAP renderer if needed
+    if not buildVBAPRenderer(build_dir=build_dir, source_dir=source_dir, profile=profile):
         print("\n✗ Error: Failed to build VBAP renderer")
         return False
     
+    # Step 3: Remember what was verified so the next run can skip all of the above
+    writeToolchainManifest(profile, build_dir, source_dir)
+    
     print("\n" + "="*60)
     print("✓ C++ tools setup complete!")
     print("="*60 + "\n")
     return True
 
 
-def installBwfmetaedit():
-    """
-    Install bwfmetaedit using Homebrew.
-    
-    Returns:
-    --------
-    bool
-        True if installation succeeded or already installed, False otherwise
-    """
-    print("\nChecking for bwfmetaedit...")
-    
-    # Check if already installed
-    try:
-        result = subprocess.run(
-            ["which", "bwfmetaedit"],
-            check=True,
-            capture_output=True,
-            text=True
-        )
-        print(f"✓ bwfmetaedit already installed at: {result.stdout.strip()}")
-        return True
-    except subprocess.CalledProcessError:
-        pass  # Not installed, proceed with installation
-    
-    # Check if brew is available
-    try:
-        subprocess.run(
-            ["which", "brew"],
-            check=True,
-            capture_output=True,
-            text=True
-        )
-    except subprocess.CalledProcessError:
-        print("\n✗ Error: Homebrew not found!")
-        print("  Install Homebrew from: https://brew.sh")
-        print("  Or manually install bwfmetaedit from: https://mediaarea.net/BWFMetaEdit")
-        return False
-    
-    # Install bwfmetaedit
-    print("Installing bwfmetaedit via Homebrew...")
-    try:
-        result = subprocess.run(
-            ["brew", "install", "bwfmetaedit"],
-            check=True,
-            capture_output=True,
-            text=True
-        )
-        print(result.stdout)
-        print("✓ bwfmetaedit installed successfully!")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"\n✗ Installation failed with error code {e.returncode}")
-        print(f"stdout: {e.stdout}")
-        print(f"stderr: {e.stderr}")
-        print("\nTry installing manually:")
-        print("  brew install bwfmetaedit")
-        print("  or download from: https://mediaarea.net/BWFMetaEdit")
-        return False
-    except Exception as e:
-        print(f"\n✗ Unexpected error during installation: {e}")
-        return False
-
-
 def initializeSubmodules(project_root=None):
     """
     Initialize and update git submodules (for allolib dependency).
@@ -153,10 +153,159 @@ def initializeSubmodules(project_root=None):
         return False
 
 
-def buildVBAPRenderer(build_dir="vbapRender/build", source_dir="vbapRender"):
+def rendererExecutable(build_dir="vbapRender/build"):
+    """Absolute path of the renderer executable in build_dir."""
+    return Path(__file__).parent.parent.resolve() / build_dir / "sonoPleth_vbap_render"
+
+
+def rendererVersion(executable):
+    """The renderer's --version line (build profile and options), None if it can't be run."""
+    try:
+        result = subprocess.run([str(executable), "--version"], capture_output=True, text=True, timeout=30)
+        return result.stdout.strip() if result.returncode == 0 else None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def rendererSourceFiles(source_dir="vbapRender"):
+    """The renderer's CMakeLists.txt and src/ files, the inputs of a build."""
+    source_path = Path(__file__).parent.parent.resolve() / source_dir
+    return [source_path / "CMakeLists.txt"] + sorted((source_path / "src").glob("*.[ch]pp"))
+
+
+def rendererSourceHash(source_dir="vbapRender"):
+    """blake2b (hex) of the renderer's CMakeLists.txt and src/ files - changes whenever the C++ is edited."""
+    h = hashlib.blake2b(digest_size=20)
+    for path in rendererSourceFiles(source_dir):
+        if path.exists():
+            h.update(path.name.encode())
+            h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+def installedProfile(build_dir="vbapRender/build"):
+    """Profile of the renderer in build_dir (toolchain manifest, else build stamp), DEFAULT_BUILD_PROFILE if none."""
+    try:
+        with open(Path(__file__).parent.parent.resolve() / build_dir / TOOLCHAIN_MANIFEST, "r") as f:
+            profile = json.load(f).get("profile")
+    except (OSError, ValueError, AttributeError):
+        profile = None
+    if profile not in BUILD_PROFILES:
+        profile = (readBuildStamp(build_dir) or {}).get("profile")
+    return profile if profile in BUILD_PROFILES else DEFAULT_BUILD_PROFILE
+
+
+def readBuildStamp(build_dir="vbapRender/build"):
+    """The stamp of the last successful build in build_dir, or None."""
+    path = Path(__file__).parent.parent.resolve() / build_dir / BUILD_STAMP
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _statStamp(path):
+    """[size, mtime_ns] of path, or None when it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def writeToolchainManifest(profile=DEFAULT_BUILD_PROFILE, build_dir="vbapRender/build", source_dir="vbapRender"):
+    """
+    Record the verified toolchain in build_dir/toolchain.json (see TOOLCHAIN_MANIFEST).
+    
+    Parameters:
+    -----------
+    profile : str
+        Build profile the renderer was verified with
+    build_dir : str
+        Build directory path (relative to project root)
+    source_dir : str
+        Source directory containing CMakeLists.txt (relative to project root)
+    
+    Returns:
+    --------
+    dict or None
+        The manifest written, None if it could not be written
+    """
+    project_root = Path(__file__).parent.parent.resolve()
+    executable = rendererExecutable(build_dir)
+    stamp = readBuildStamp(build_dir) or {}
+    version = rendererVersion(executable)
+    
+    allolib_include = project_root / "thirdparty" / "allolib" / "include"
+    manifest = {
+        "version": TOOLCHAIN_MANIFEST_VERSION,
+        "profile": profile,
+        "python": sys.executable,
+        "cmake": shutil.which("cmake"),
+        "allolib": str(allolib_include),
+        "renderer": {
+            "path": str(executable),
+            "version": version,
+            "stat": _statStamp(executable),
+        },
+        "sourceHash": stamp.get("sourceHash"),
+        "sources": {str(path.relative_to(project_root)): _statStamp(path)
+                    for path in rendererSourceFiles(source_dir)},
+    }
+    
+    path = project_root / build_dir / TOOLCHAIN_MANIFEST
+    try:
+        with open(str(path) + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(str(path) + ".tmp", path)
+    except OSError as e:
+        print(f"Warning: Could not write toolchain manifest {path}: {e}")
+        return None
+    return manifest
+
+
+def toolchainIsCurrent(profile=DEFAULT_BUILD_PROFILE, build_dir="vbapRender/build", source_dir="vbapRender"):
+    """
+    True when build_dir/toolchain.json describes exactly what is on disk: same profile,
+    renderer executable and allolib headers in place, and the same renderer source files
+    with the same size and mtime. Only stats files.
+    """
+    project_root = Path(__file__).parent.parent.resolve()
+    try:
+        with open(project_root / build_dir / TOOLCHAIN_MANIFEST, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    
+    if manifest.get("version") != TOOLCHAIN_MANIFEST_VERSION or manifest.get("profile") != profile:
+        return False
+    
+    renderer = manifest.get("renderer") or {}
+    executable = rendererExecutable(build_dir)
+    if renderer.get("path") != str(executable) or renderer.get("stat") is None:
+        return False
+    if _statStamp(executable) != renderer["stat"]:
+        return False
+    if not os.path.isdir(manifest.get("allolib", "")):
+        return False
+    
+    # a source added or removed changes the file list, an edit changes size / mtime
+    sources = manifest.get("sources") or {}
+    files = rendererSourceFiles(source_dir)
+    if len(files) != len(sources):
+        return False
+    for path in files:
+        if _statStamp(path) != sources.get(str(path.relative_to(project_root))):
+            return False
+    return True
+
+
+def buildVBAPRenderer(build_dir="vbapRender/build", source_dir="vbapRender", profile=DEFAULT_BUILD_PROFILE):
     """
     Build the VBAP renderer using CMake.
-    Only builds if executable doesn't exist (idempotent).
+    Only builds if the executable is missing, was built with another profile or
+    from different sources (idempotent).
     
     Parameters:
     -----------
@@ -164,27 +313,39 @@ def buildVBAPRenderer(build_dir="vbapRender/build", source_dir="vbapRender"):
         Build directory path (relative to project root)
     source_dir : str
         Source directory containing CMakeLists.txt (relative to project root)
+    profile : str
+        Build profile, one of BUILD_PROFILES
     
     Returns:
     --------
     bool
-        True if build succeeded or executable already exists, False otherwise
+        True if build succeeded or an up to date executable already exists, False otherwise
     """
     project_root = Path(__file__).parent.parent.resolve()
-    build_path = project_root / build_dir
-    executable = project_root / build_dir / "sonoPleth_vbap_render"
+    executable = rendererExecutable(build_dir)
     
-    # Check if executable already exists
-    if executable.exists():
-        print(f"✓ VBAP renderer already built at: {executable}")
+    source_hash = rendererSourceHash(source_dir)
+    stamp = readBuildStamp(build_dir)
+    if executable.exists() and stamp == {"profile": profile, "sourceHash": source_hash}:
+        print(f"✓ VBAP renderer already built at: {executable} ({profile})")
         return True
     
-    # Executable doesn't exist, proceed with build
-    print("Building VBAP renderer...")
-    return runCmake(build_dir, source_dir)
+    if not executable.exists():
+        print("Building VBAP renderer...")
+    elif stamp is None or stamp.get("profile") != profile:
+        print(f"Rebuilding VBAP renderer with the {profile} profile...")
+    else:
+        print("Renderer sources changed since the last build, rebuilding VBAP renderer...")
+    
+    if not runCmake(build_dir, source_dir, profile):
+        return False
+    
+    with open(project_root / build_dir / BUILD_STAMP, "w") as f:
+        json.dump({"profile": profile, "sourceHash": source_hash}, f, indent=2)
+    return True
 
 
-def runCmake(build_dir="vbapRender/build", source_dir="vbapRender"):
+def runCmake(build_dir="vbapRender/build", source_dir="vbapRender", profile=DEFAULT_BUILD_PROFILE):
     """
     Run CMake configuration and make to build the VBAP renderer.
     This is called by buildVBAPRenderer() and performs the actual build.
@@ -195,12 +356,18 @@ def runCmake(build_dir="vbapRender/build", source_dir="vbapRender"):
         Build directory path (relative to project root)
     source_dir : str
         Source directory containing CMakeLists.txt (relative to project root)
+    profile : str
+        Build profile, one of BUILD_PROFILES
     
     Returns:
     --------
     bool
         True if build succeeded, False otherwise
     """
+    if profile not in BUILD_PROFILES:
+        print(f"✗ Error: Unknown build profile '{profile}' (choose from {', '.join(BUILD_PROFILES)})")
+        return False
+    
     project_root = Path(__file__).parent.parent.resolve()
     build_path = project_root / build_dir
     source_path = project_root / source_dir
@@ -216,6 +383,7 @@ def runCmake(build_dir="vbapRender/build", source_dir="vbapRender"):
     
     print(f"  Source: {source_path}")
     print(f"  Build dir: {build_path}")
+    print(f"  Profile: {profile}")
     
     try:
         # Ensure submodules are initialized before building
@@ -224,8 +392,10 @@ def runCmake(build_dir="vbapRender/build", source_dir="vbapRender"):
         
         # Run CMake configuration
         print("\n  Running CMake configuration...")
+        cache_args = [f"-D{name}={value}" for name, value in BUILD_PROFILES[profile].items()]
         result = subprocess.run(
-            ["cmake", "-DCMAKE_POLICY_VERSION_MINIMUM=3.5", str(source_path)],
+            ["cmake", "-DCMAKE_POLICY_VERSION_MINIMUM=3.5", f"-DSONOPLETH_BUILD_PROFILE={profile}",
+             *cache_args, str(source_path)],
             cwd=str(build_path),
             check=True,
             capture_output=True,
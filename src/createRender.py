@@ -1,6 +1,19 @@
 import subprocess
 import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from src.bw64Reader import BW64Reader
+from src.configCPP import rendererVersion
+from src.renderCache import (
+    DEFAULT_RENDER_CACHE_DIR,
+    DEFAULT_MAX_BYTES,
+    sourceAudioDigests,
+    computeSourceKeys,
+    writeSourceKeys,
+    pruneRenderCache,
+)
 
 
 def deleteRenderOutput(output_file="processedData/spatial_render.wav"):
@@ -34,24 +47,204 @@ def deleteRenderOutput(output_file="processedData/spatial_render.wav"):
         return False
 
 
+# time-segmented rendering (runVBAPRender with workers > 1)
+#
+# the timeline is cut into one segment per worker and each segment is rendered by its
+# own renderer process (--start / --end), then the parts are concatenated into the
+# output file. the renderer evaluates directions once per 512-frame block counted from
+# frame 0, and a block's gain ramp only depends on its index on that grid (never on what
+# the process rendered before), so as long as every seam sits on the grid each segment
+# renders exactly the samples a full render would - the stitched file is sample-identical
+# and gains are continuous across the seams. incremental segments too: the renderer is
+# built with -ffp-contract=off, so a source summed from its cached contribution rounds
+# exactly like one panned straight into the mix. the subprocesses do the work, a thread
+# per segment just waits on one of them.
+
+RENDER_BLOCK_FRAMES = 512
+STITCH_BLOCK_FRAMES = 1 << 18
+
+
+def timelineFrames(source_folder=None, source_wav=None, names=None):
+    """Length in frames of the render timeline (longest source)."""
+    if source_wav:
+        with BW64Reader(source_wav) as reader:
+            return reader.frames
+    if names is None:
+        names = [p.stem for p in Path(source_folder).glob("src_*.wav")]
+    import soundfile as sf
+    frames = 0
+    for name in names:
+        path = os.path.join(source_folder, f"{name}.wav")
+        if os.path.exists(path):
+            frames = max(frames, sf.info(path).frames)
+    return frames
+
+
+def segmentBoundaries(total_frames, segments, block=RENDER_BLOCK_FRAMES):
+    """Split [0, total_frames) into at most `segments` ranges whose starts are multiples of block."""
+    blocks = -(-total_frames // block)
+    segments = max(1, min(segments, blocks))
+    cuts = [min(total_frames, (blocks * i // segments) * block) for i in range(segments + 1)]
+    return [(cuts[i], cuts[i + 1]) for i in range(segments) if cuts[i + 1] > cuts[i]]
+
+
+def stitchSegments(part_files, output_file):
+    """Concatenate the rendered segments into output_file (same float WAV as the renderer writes)."""
+    import soundfile as sf
+    info = sf.info(part_files[0])
+    total = sum(sf.info(p).frames for p in part_files)
+    # plain WAV tops out at 4 GB, go RF64 beyond that
+    file_format = "RF64" if total * info.channels * 4 >= 0xFFFFFFFF - 1024 else "WAV"
+    with sf.SoundFile(output_file, "w", samplerate=info.samplerate, channels=info.channels,
+                      subtype="FLOAT", format=file_format) as out:
+        for part in part_files:
+            for block in sf.blocks(part, blocksize=STITCH_BLOCK_FRAMES, dtype="float32", always_2d=True):
+                out.write(block)
+    return total
+
+
+def renderSegments(command, output_file, total_frames, workers):
+    """Render the timeline in `workers` segments concurrently and stitch them into output_file.
+
+    Parameters:
+    -----------
+    command : list
+        Renderer command line without --start / --end / --out
+    output_file : str
+        Final multichannel WAV
+    total_frames : int
+        Timeline length in frames (see timelineFrames)
+    workers : int
+        Number of segments / concurrent renderer processes
+
+    Returns:
+    --------
+    bool
+        True if every segment rendered and the output was stitched
+    """
+    segments = segmentBoundaries(total_frames, workers)
+    if not segments:
+        print("Nothing to render - the sources have no frames")
+        return False
+    part_files = [f"{output_file}.seg{i:03d}.wav" for i in range(len(segments))]
+    print(f"Rendering {total_frames} frames in {len(segments)} segments on {workers} workers")
+
+    def renderSegment(i):
+        start, end = segments[i]
+        t0 = time.perf_counter()
+        result = subprocess.run(
+            command + ["--start", str(start), "--end", str(end), "--out", part_files[i]],
+            capture_output=True,
+            text=True
+        )
+        elapsed = time.perf_counter() - t0
+        if result.returncode != 0:
+            print(result.stdout)
+            print(result.stderr)
+            print(f"  Segment {i} (frames {start}-{end}) failed with exit code {result.returncode}")
+            return False
+        print(f"  Segment {i} (frames {start}-{end}) rendered in {elapsed:.1f}s")
+        return True
+
+    try:
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            ok = all(list(pool.map(renderSegment, range(len(segments)))))
+        if not ok:
+            return False
+        render_time = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        frames = stitchSegments(part_files, output_file)
+        print(f"Rendered segments in {render_time:.1f}s, stitched {frames} frames in "
+              f"{time.perf_counter() - t0:.1f}s")
+        return True
+    finally:
+        for part in part_files:
+            if os.path.exists(part):
+                os.remove(part)
+
+
+def incrementalRenderArgs(render_instructions, speaker_layout, source_folder, source_wav, channel_map, cache_dir,
+                          instructions=None, executable=None):
+    """Fingerprint every source and return the renderer flags for an incremental render.
+    
+    executable is the renderer, its build profile goes into the keys.
+    Writes sourceKeys.json next to the render instructions.
+    """
+    if instructions is None:
+        if render_instructions.endswith(".bin"):
+            from src.packageADM.createRenderInfo import readRenderInstructionsBin
+            instructions = readRenderInstructionsBin(render_instructions)
+        else:
+            with open(render_instructions, "r") as f:
+                instructions = json.load(f)
+    
+    channels = None
+    if source_wav and channel_map:
+        with open(channel_map, "r") as f:
+            channels = json.load(f)
+    
+    names = list(instructions["sources"].keys())
+    audio_digests = sourceAudioDigests(names, source_wav=source_wav, channel_map=channels,
+                                       source_folder=source_folder, cache_dir=cache_dir)
+    renderer_version = (rendererVersion(executable) if executable else None) or ""
+    keys = computeSourceKeys(instructions, speaker_layout, audio_digests, renderer_version)
+    keys_path = str(Path(render_instructions).with_name("sourceKeys.json"))
+    writeSourceKeys(keys, keys_path)
+    
+    print(f"  Render cache: {cache_dir}")
+    return ["--cache-dir", cache_dir, "--source-keys", keys_path]
+
+
 def runVBAPRender(
     source_folder="processedData/stageForRender",
-    render_instructions="processedData/stageForRender/renderInstructions.json",
+    render_instructions="processedData/stageForRender/renderInstructions.bin",
     speaker_layout="vbapRender/allosphere_layout.json",
-    output_file="processedData/spatial_render.wav"
+    output_file="processedData/spatial_render.wav",
+    source_wav=None,
+    channel_map=None,
+    incremental=False,
+    cache_dir=DEFAULT_RENDER_CACHE_DIR,
+    cache_max_bytes=DEFAULT_MAX_BYTES,
+    instructions=None,
+    workers=1,
+    threads=1
 ):
     """
+    Run the VBAP renderer, either on staged mono stems (source_folder) or directly
+    on the interleaved ADM master (source_wav), reading only the mapped channels.
     
     params:
     -----------
     source_folder : str
-        Directory containing mono source WAV files (src_*.wav)
+        Directory containing mono source WAV files (src_*.wav), ignored with source_wav
     render_instructions : str
-        JSON file with spatial position data
+        Spatial position data - binary .bin (default, mmap'd by the renderer) or .json
     speaker_layout : str
         JSON file with speaker configuration
     output_file : str
         Output multichannel WAV file path
+    source_wav : str, optional
+        Multichannel ADM master to read sources from directly (no stem splitting)
+    channel_map : str, optional
+        JSON mapping source names to 0-based master channels (default: src_N -> N-1)
+    incremental : bool
+        Reuse cached per-source contributions for sources whose audio, keyframes and
+        layout are unchanged (see src/renderCache.py), re-rendering only the rest
+    cache_dir : str
+        Contribution cache directory for incremental renders
+    cache_max_bytes : int
+        Least recently used contributions are evicted beyond this size
+    instructions : dict, optional
+        Render instructions already in memory (PipelineContext.renderInstructions),
+        otherwise read from render_instructions when rendering incrementally
+    workers : int
+        Split the timeline into this many segments rendered by concurrent renderer
+        processes and stitched into output_file (1 = single render)
+    threads : int
+        Mix threads per renderer process (--threads). Output is identical from run to
+        run for a given thread count
     
     Returns:
     --------
@@ -72,14 +265,24 @@ def runVBAPRender(
     
     # Make paths absolute
     source_folder = str((project_root / source_folder).resolve())
+    if source_wav:
+        source_wav = str((project_root / source_wav).resolve())
+    if channel_map:
+        channel_map = str((project_root / channel_map).resolve())
     render_instructions = str((project_root / render_instructions).resolve())
     speaker_layout = str((project_root / speaker_layout).resolve())
     output_file = str((project_root / output_file).resolve())
     
     # Check if inputs exist
-    if not Path(source_folder).exists():
+    if source_wav and not Path(source_wav).exists():
+        print(f"Error: Source WAV not found: {source_wav}")
+        return False
+    if not source_wav and not Path(source_folder).exists():
         print(f"Error: Source folder not found: {source_folder}")
         return False
+    if channel_map and not Path(channel_map).exists():
+        print(f"Error: Channel map not found: {channel_map}")
+        return False
     if not Path(render_instructions).exists():
         print(f"Error: Render instructions not found: {render_instructions}")
         return False
@@ -89,29 +292,55 @@ def runVBAPRender(
     
     # Run the renderer
     print(f"\nRunning VBAP Renderer...")
-    print(f"  Source folder: {source_folder}")
+    if source_wav:
+        print(f"  Source WAV: {source_wav}")
+        print(f"  Channel map: {channel_map or 'src_N -> channel N'}")
+    else:
+        print(f"  Source folder: {source_folder}")
     print(f"  Instructions: {render_instructions}")
     print(f"  Speaker layout: {speaker_layout}")
     print(f"  Output: {output_file}\n")
     
-    try:
-        result = subprocess.run(
-            [
-                str(executable),
-                "--layout", speaker_layout,
-                "--positions", render_instructions,
-                "--sources", source_folder,
-                "--out", output_file
-            ],
-            check=True,
-            capture_output=False,
-            text=True
+    command = [
+        str(executable),
+        "--layout", speaker_layout,
+        "--positions-bin" if render_instructions.endswith(".bin") else "--positions", render_instructions,
+    ]
+    if source_wav:
+        command += ["--source-wav", source_wav]
+        if channel_map:
+            command += ["--channel-map", channel_map]
+    else:
+        command += ["--sources", source_folder]
+    if threads > 1:
+        command += ["--threads", str(threads)]
+    if incremental:
+        command += incrementalRenderArgs(
+            render_instructions, speaker_layout, source_folder, source_wav, channel_map,
+            str((project_root / cache_dir).resolve()), instructions, executable
         )
+    
+    try:
+        if workers > 1:
+            names = list(instructions["sources"].keys()) if instructions else None
+            total_frames = timelineFrames(source_folder, source_wav, names)
+            if not renderSegments(command, output_file, total_frames, workers):
+                print(f"\n✗ Render failed - a segment did not render")
+                return False
+        else:
+            subprocess.run(
+                command + ["--out", output_file],
+                check=True,
+                capture_output=False,
+                text=True
+            )
         
         # Check if output was created
         if Path(output_file).exists():
             size_mb = Path(output_file).stat().st_size / (1024 * 1024)
             print(f"\n✓ Render complete. Output: {output_file} ({size_mb:.1f} MB)")
+            if incremental:
+                pruneRenderCache(str((project_root / cache_dir).resolve()), cache_max_bytes)
             return True
         else:
             print(f"\n✗ Render failed - output file not created")
@@ -1,18 +1,37 @@
 import json
 import os
 import csv
+import numpy as np
 from pathlib import Path
+from src.analyzeADM.trajectoryStore import TrajectoryStore
+from src.analyzeADM.checkAudioChannels import mapEmptyChannels
 
 
 # this file is for creating a json in stageForRender that contains spatial instructions for VBAP / DBAP rendering
 
-# to do - add flag for static / dynamic objects - static objects only need one position, dynamic need time series
+# static objects are collapsed to one keyframe by simplifyKeyframes (simplify=True in createRenderInfoJSON)
+
+# binary render instructions (renderInstructions.bin), read by the renderer with mmap (--positions-bin)
+# all little-endian, arrays 8-byte aligned:
+#   header (32 bytes)   magic "SPRI", u32 version, u32 sampleRate, u32 numSources,
+#                       u64 numKeyframes, u64 reserved
+#   source table        numSources x (char name[64] NUL padded, u64 firstKeyframe, u64 keyframeCount)
+#   keyframe arrays     f64 time[numKeyframes], f32 x[...], f32 y[...], f32 z[...]
+RENDER_INSTRUCTIONS_MAGIC = b"SPRI"
+RENDER_INSTRUCTIONS_VERSION = 1
+
+_BIN_HEADER_DTYPE = np.dtype([
+    ("magic", "S4"), ("version", "<u4"), ("sampleRate", "<u4"), ("numSources", "<u4"),
+    ("numKeyframes", "<u8"), ("reserved", "<u8"),
+])
+_BIN_SOURCE_DTYPE = np.dtype([("name", "S64"), ("first", "<u8"), ("count", "<u8")])
 
 def loadProcessedData(processed_dir="processedData"):
     """Load all JSON files from processedData directory.
     
     Returns:
         dict: with, 'directSpeakerData', 'objectData', 'globalData'
+            objectData is a TrajectoryStore (from objectData.npz, or objectData.json as fallback)
     """
     data = {}
 
@@ -27,13 +46,17 @@ def loadProcessedData(processed_dir="processedData"):
         print(f"Warning: {speaker_path} not found")
     
     # Load object data
-    object_path = os.path.join(processed_dir, "objectData.json")
+    object_path = os.path.join(processed_dir, "objectData.npz")
+    legacy_object_path = os.path.join(processed_dir, "objectData.json")
     if os.path.exists(object_path):
-        with open(object_path, 'r') as f:
-            data['objectData'] = json.load(f)
+        data['objectData'] = TrajectoryStore.load(object_path)
         print(f"Loaded objectData from {object_path}")
+    elif os.path.exists(legacy_object_path):
+        with open(legacy_object_path, 'r') as f:
+            data['objectData'] = TrajectoryStore.fromObjectDict(json.load(f))
+        print(f"Loaded objectData from {legacy_object_path}")
     else:
-        data['objectData'] = {}
+        data['objectData'] = TrajectoryStore([], [], [0], [])
         print(f"Warning: {object_path} not found")
 
     channels_contains_audio_path = os.path.join(processed_dir, "containsAudio.json")
@@ -58,25 +81,6 @@ def loadProcessedData(processed_dir="processedData"):
     
     return data
 
-def mapEmptyChannels(data):
-    """Map which channels contain audio based on containsAudio data.
-    
-    Args:
-        data (dict): Loaded processed data containing containsAudio info
-    
-    Returns:
-        dict: Mapping of channel index -> contains_audio (True/False)
-    """
-    channel_audio_map = {}
-    contains_audio_info = data.get('containsAudio', {})
-    for channel_info in contains_audio_info.get('channels', []):
-        channel_index = channel_info.get('channel_index')
-        contains_audio = channel_info.get('contains_audio', False)
-        channel_audio_map[channel_index] = contains_audio
-    return channel_audio_map
-
-
-
 def assignChannels(data):
     """Assign channel numbers to DirectSpeakers and objects.
     
@@ -107,7 +111,7 @@ def assignChannels(data):
     
     # Assign channels 11+ to objects (in order, skip empty objects)
     for obj_name, blocks in data.get('objectData', {}).items():
-        if blocks:  # Only assign channel if object has data
+        if len(blocks):  # Only assign channel if object has data
             channel_mapping[obj_name] = channel_counter
             # Check if this channel (0-indexed in audio map) contains audio
             audio_status[obj_name] = channel_audio_map.get(channel_counter - 1, False)
@@ -132,7 +136,7 @@ def parseTimecodeToSeconds(timecode):
 
 def deleteRenderInstructionsJSON(output_path):
     """
-    Delete the renderInstructions.json file if it exists.
+    Delete the renderInstructions.json (or .bin) file if it exists.
     """
     file_path = Path(output_path).resolve()
     if file_path.exists():
@@ -144,11 +148,193 @@ def deleteRenderInstructionsJSON(output_path):
     else:
         print(f"No file to delete at: {file_path}")
 
+
+def writeRenderInstructionsBin(output_data, output_path):
+    """Write render instructions ({"sampleRate", "sources"} as built by createRenderInfoJSON) in the binary format.
+    
+    Returns:
+        int: File size in bytes
+    """
+    names = list(output_data["sources"].keys())
+    counts = [len(output_data["sources"][name]) for name in names]
+    total = int(sum(counts))
+    
+    table = np.zeros(len(names), dtype=_BIN_SOURCE_DTYPE)
+    for i, name in enumerate(names):
+        encoded = name.encode("utf-8")
+        if len(encoded) > 63:
+            raise ValueError(f"Source name too long for binary render instructions: {name}")
+        table[i]["name"] = encoded
+    table["count"] = counts
+    table["first"] = np.concatenate(([0], np.cumsum(counts)[:-1])) if names else []
+    
+    times = np.empty(total, dtype="<f8")
+    cart = np.empty((total, 3), dtype="<f4")
+    i = 0
+    for name in names:
+        for keyframe in output_data["sources"][name]:
+            times[i] = keyframe["time"]
+            cart[i] = keyframe["cart"]
+            i += 1
+    
+    header = np.zeros(1, dtype=_BIN_HEADER_DTYPE)
+    header["magic"] = RENDER_INSTRUCTIONS_MAGIC
+    header["version"] = RENDER_INSTRUCTIONS_VERSION
+    header["sampleRate"] = output_data["sampleRate"]
+    header["numSources"] = len(names)
+    header["numKeyframes"] = total
+    
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "wb") as f:
+        f.write(header.tobytes())
+        f.write(table.tobytes())
+        f.write(times.tobytes())
+        for axis in range(3):
+            f.write(np.ascontiguousarray(cart[:, axis]).tobytes())
+    
+    return os.path.getsize(output_path)
+
+
+def writeRenderInstructionsJSON(output_data, output_path):
+    """Write render instructions as readable JSON (debug export, the renderer reads the .bin)."""
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    
+    with open(output_path, 'w') as jsonfile:
+        json.dump(output_data, jsonfile, indent=2)
+    
+    print(f"Spatial instructions JSON saved to {output_path}")
+
+
+def writeChannelMap(output_data, output_path):
+    """Write the source -> master channel map for the renderer's direct mode (--channel-map).
+    
+    src_N is channel N of the ADM master, stored 0-based: {"src_1": 0, "src_11": 10, ...}
     
+    Returns:
+        dict: the channel map
+    """
+    channel_map = {name: int(name.split("_")[-1]) - 1 for name in output_data["sources"]}
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(channel_map, f, indent=2)
+    print(f"Channel map saved to {output_path} ({len(channel_map)} sources)")
+    return channel_map
 
 
-def createRenderInfoJSON(processed_dir="processedData", output_path="processedData/stageForRender/renderInstructions.json"):
-    """Create spatial instructions JSON with timestamped position data.
+def readRenderInstructionsBin(path):
+    """Read a binary render instructions file back into the {"sampleRate", "sources"} dict.
+    
+    Positions are stored as float32 and rounded back to 6 decimals like createRenderInfoJSON
+    rounds them, so the dict equals the one the package stage built (and the JSON export and
+    render cache keys come out the same whether the stage ran or was loaded).
+    """
+    raw = np.fromfile(path, dtype=np.uint8)
+    header = raw[:_BIN_HEADER_DTYPE.itemsize].view(_BIN_HEADER_DTYPE)[0]
+    if header["magic"] != RENDER_INSTRUCTIONS_MAGIC or header["version"] != RENDER_INSTRUCTIONS_VERSION:
+        raise ValueError(f"Not a version {RENDER_INSTRUCTIONS_VERSION} render instructions file: {path}")
+    
+    num_sources = int(header["numSources"])
+    total = int(header["numKeyframes"])
+    offset = _BIN_HEADER_DTYPE.itemsize
+    table = raw[offset:offset + num_sources * _BIN_SOURCE_DTYPE.itemsize].view(_BIN_SOURCE_DTYPE)
+    offset += num_sources * _BIN_SOURCE_DTYPE.itemsize
+    times = raw[offset:offset + 8 * total].view("<f8")
+    offset += 8 * total
+    xyz = [np.round(raw[offset + 4 * total * axis:offset + 4 * total * (axis + 1)].view("<f4").astype(np.float64), 6)
+           for axis in range(3)]
+    
+    sources = {}
+    for entry in table:
+        first, count = int(entry["first"]), int(entry["count"])
+        sources[entry["name"].decode("utf-8")] = [
+            {"time": float(times[k]), "cart": [float(xyz[0][k]), float(xyz[1][k]), float(xyz[2][k])]}
+            for k in range(first, first + count)
+        ]
+    return {"sampleRate": int(header["sampleRate"]), "sources": sources}
+
+
+
+def _directionError(times, cart, first, last):
+    """Angle (degrees) between each keyframe in (first, last) and the renderer's interpolation of the endpoints.
+    
+    Mirrors VBAPRenderer::interpolateDir: linear interpolation of the cartesian
+    positions by time, then normalisation to a direction.
+    """
+    t = times[first + 1:last]
+    span = times[last] - times[first]
+    u = (t - times[first]) / span if span > 0 else np.zeros_like(t)
+    interpolated = (1 - u)[:, None] * cart[first] + u[:, None] * cart[last]
+    actual = cart[first + 1:last]
+    
+    norms = np.linalg.norm(interpolated, axis=1) * np.linalg.norm(actual, axis=1)
+    cosine = np.einsum('ij,ij->i', interpolated, actual) / np.where(norms > 0, norms, 1.0)
+    angles = np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+    # a direction through the origin is undefined, never drop those points
+    return np.where(norms > 0, angles, np.inf)
+
+
+def simplifyKeyframes(times, cart, tolerance_deg=0.0):
+    """Pick the keyframes needed to reproduce a trajectory in the renderer.
+    
+    1. interior points of runs of identical positions are dropped (exact)
+    2. fully static objects collapse to a single keyframe (exact)
+    3. with tolerance_deg > 0, Ramer-Douglas-Peucker on the remaining points drops
+       every keyframe whose direction stays within tolerance_deg of the interpolation
+       between its neighbours (error measured as angle, like the renderer sees it)
+    
+    Args:
+        times (np.ndarray): keyframe times, sorted, shape (n,)
+        cart (np.ndarray): positions, shape (n, 3)
+        tolerance_deg (float): maximum angular error for step 3 (0 disables it)
+    
+    Returns:
+        np.ndarray: sorted indices of the keyframes to keep
+    """
+    n = len(times)
+    if n <= 2:
+        return np.arange(n)
+    
+    same_as_prev = np.all(cart[1:] == cart[:-1], axis=1)
+    if same_as_prev.all():
+        return np.array([0])
+    
+    # keep a point if it differs from either neighbour (so holds are preserved)
+    keep = np.ones(n, dtype=bool)
+    keep[1:-1] = ~(same_as_prev[:-1] & same_as_prev[1:])
+    candidates = np.flatnonzero(keep)
+    
+    if tolerance_deg <= 0 or len(candidates) <= 2:
+        return candidates
+    
+    times = times[candidates]
+    cart = cart[candidates]
+    selected = np.zeros(len(candidates), dtype=bool)
+    selected[[0, -1]] = True
+    stack = [(0, len(candidates) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        errors = _directionError(times, cart, first, last)
+        worst = int(np.argmax(errors))
+        if errors[worst] > tolerance_deg:
+            split = first + 1 + worst
+            selected[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    
+    return candidates[selected]
+
+
+def createRenderInfoJSON(processed_dir="processedData", output_path="processedData/stageForRender/renderInstructions.json", simplify=True, tolerance_deg=0.0, bin_path="processedData/stageForRender/renderInstructions.bin", exportJSON=False, context=None, channel_map_path="processedData/stageForRender/channelMap.json"):
+    """Create spatial instructions with timestamped position data.
+    
+    The renderer reads the binary file at bin_path (see writeRenderInstructionsBin);
+    the JSON at output_path is only written with exportJSON, as a debug export. The
+    source -> master channel map for the renderer's direct mode goes to channel_map_path.
+    
+    With a PipelineContext, metadata and channel activity come from the context instead
+    of processed_dir, and the channel assignments and instructions are stored back in it.
     
     JSON format:
     {
@@ -161,10 +347,19 @@ def createRenderInfoJSON(processed_dir="processedData", output_path="processedDa
     }
     
     Only includes channels that contain audio (skips empty channels).
+    With simplify, object keyframes go through simplifyKeyframes: repeated positions and
+    static objects are reduced without changing the render, tolerance_deg > 0 additionally
+    allows a bounded angular error.
     
     Args:
         processed_dir (str): Directory containing processed JSON files
         output_path (str): Where to save the JSON file
+        simplify (bool): Reduce object keyframes before writing
+        tolerance_deg (float): Angular error allowed when simplifying (0 = exact only)
+        bin_path (str): Where to save the binary render instructions
+        exportJSON (bool): Also write the JSON debug export
+        context (PipelineContext): In-memory results of the earlier stages (optional)
+        channel_map_path (str): Where to save the channel map (see writeChannelMap)
     
     Returns:
         int: Number of sources written
@@ -172,15 +367,22 @@ def createRenderInfoJSON(processed_dir="processedData", output_path="processedDa
 
     #delete existing render instructions if necessary 
     deleteRenderInstructionsJSON(output_path)
+    deleteRenderInstructionsJSON(bin_path)
     # Load all processed data
-    data = loadProcessedData(processed_dir)
+    data = context.toProcessedData() if context is not None else loadProcessedData(processed_dir)
     
     # Assign channel numbers and get audio status
     channel_mapping, audio_status = assignChannels(data)
+    if context is not None:
+        context.channelMapping = channel_mapping
+        context.audioStatus = audio_status
     
     sources = {}
     sources_with_audio = 0
     sources_without_audio = 0
+    keyframes_before = 0
+    keyframes_after = 0
+    static_objects = 0
     
     # Process DirectSpeakers
     for speaker_name, speaker_info in data.get('directSpeakerData', {}).items():
@@ -190,13 +392,14 @@ def createRenderInfoJSON(processed_dir="processedData", output_path="processedDa
             continue
         
         channel_num = channel_mapping[speaker_name]
+        # rounded like the object positions below (and readRenderInstructionsBin)
         sources[f"src_{channel_num}"] = [
             {
                 "time": 0.0,
                 "cart": [
-                    speaker_info.get('x', 0.0),
-                    speaker_info.get('y', 0.0),
-                    speaker_info.get('z', 0.0)
+                    round(float(speaker_info.get('x', 0.0)), 6),
+                    round(float(speaker_info.get('y', 0.0)), 6),
+                    round(float(speaker_info.get('z', 0.0)), 6)
                 ]
             }
         ]
@@ -204,7 +407,7 @@ def createRenderInfoJSON(processed_dir="processedData", output_path="processedDa
 
     # Process audio objects
     for obj_name, blocks in data.get('objectData', {}).items():
-        if not blocks:
+        if not len(blocks):
             continue
         
         # Skip if channel has no audio
@@ -213,23 +416,28 @@ def createRenderInfoJSON(processed_dir="processedData", output_path="processedDa
             continue
         
         channel_num = channel_mapping[obj_name]
-        position_list = []
         
-        # Add all position blocks with timestamps
-        for block in blocks:
-            time_seconds = parseTimecodeToSeconds(block.get('rtime', '00:00:00.00000'))
-            position_list.append({
-                "time": round(time_seconds, 2),
-                "cart": [
-                    block.get('x', 0.0),
-                    block.get('y', 0.0),
-                    block.get('z', 0.0)
-                ]
-            })
+        # Add all position blocks with timestamps, sorted by time (stable, like list.sort)
+        times = np.round(blocks['start'], 2)
+        order = np.argsort(times, kind='stable')
+        # float32 positions are rounded so the JSON doesn't carry float32 noise
+        cart = np.round(np.stack([blocks['x'], blocks['y'], blocks['z']], axis=1).astype(np.float64), 6)
+        times = times[order]
+        cart = cart[order]
         
-        # Sort by time
-        position_list.sort(key=lambda p: p['time'])
-        sources[f"src_{channel_num}"] = position_list
+        keyframes_before += len(times)
+        if simplify:
+            kept = simplifyKeyframes(times, cart, tolerance_deg)
+            times = times[kept]
+            cart = cart[kept]
+            if len(kept) == 1:
+                static_objects += 1
+        keyframes_after += len(times)
+        
+        sources[f"src_{channel_num}"] = [
+            {"time": t, "cart": c}
+            for t, c in zip(times.tolist(), cart.tolist())
+        ]
         sources_with_audio += 1
     
     # Create output structure
@@ -238,16 +446,24 @@ def createRenderInfoJSON(processed_dir="processedData", output_path="processedDa
         "sources": sources
     }
     
-    # Write to JSON
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    # Write binary instructions for the renderer
+    bin_size = writeRenderInstructionsBin(output_data, bin_path)
+    print(f"\nSpatial instructions saved to {bin_path} ({bin_size / 1024:.1f} KB)")
+    writeChannelMap(output_data, channel_map_path)
     
-    with open(output_path, 'w') as jsonfile:
-        json.dump(output_data, jsonfile, indent=2)
+    if context is not None:
+        context.renderInstructions = output_data
     
-    print(f"\nSpatial instructions JSON saved to {output_path}")
+    # Write to JSON (debug export)
+    if exportJSON:
+        writeRenderInstructionsJSON(output_data, output_path)
     print(f"  Sources with audio: {sources_with_audio}")
     print(f"  Sources without audio (skipped): {sources_without_audio}")
     print(f"  Total sources in JSON: {len(sources)}")
+    if simplify:
+        reduction = 100.0 * (1 - keyframes_after / keyframes_before) if keyframes_before else 0.0
+        print(f"  Object keyframes: {keyframes_before} -> {keyframes_after} ({reduction:.1f}% fewer, "
+              f"tolerance {tolerance_deg} deg, {static_objects} static objects collapsed)")
     
     return len(sources)
 
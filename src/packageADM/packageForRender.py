@@ -1,22 +1,31 @@
-
-from src.packageADM.splitStems import splitChannelsToMono
 from src.packageADM.createRenderInfo import createRenderInfoJSON
 
-# NOT WORKING YET 
+# by default the renderer reads the sources straight from the ADM master (--source-wav),
+# so only the instructions and the channel map are staged. splitStems=True still writes
+# src_N.wav mono files for archiving / external tools / the --sources folder mode
 
-def packageForRender(sourceADM, processed_dir="processedData", output_dir="stagedForRender"):
-    """Package data for rendering by splitting stems and creating render info JSON.
+def packageForRender(sourceADM, processed_dir="processedData", output_dir="stagedForRender", simplify=True, tolerance_deg=0.0, exportJSON=False, context=None, splitStems=False, stem_workers=4):
+    """Package data for rendering by creating render instructions (and optionally splitting stems).
     
     Args:
         processed_dir (str): Directory containing processed data.
         output_dir (str): Directory to save packaged data for rendering.
+        simplify (bool): Simplify object keyframes (see createRenderInfo.simplifyKeyframes).
+        tolerance_deg (float): Angular error allowed when simplifying (0 = exact only).
+        exportJSON (bool): Also write renderInstructions.json next to the binary instructions (debugging).
+        context (PipelineContext): In-memory results of the earlier stages; without it they are read from processed_dir.
+        splitStems (bool): Also write one mono WAV per active channel (not needed for direct-source rendering).
+        stem_workers (int): Writer threads used when splitting stems.
     """
-    # Create output directory
+    print("Attempting to run package for render -- creating render info...")
+    createRenderInfoJSON(processed_dir=processed_dir, simplify=simplify, tolerance_deg=tolerance_deg, exportJSON=exportJSON, context=context)
     
     # Split stems into individual audio files
-    print("Attempting to run package for render -- splitting stems and creating render info...")
-    createRenderInfoJSON(processed_dir=processed_dir)
-    splitChannelsToMono(sourceADM, processed_dir=processed_dir, output_dir=output_dir)
+    if splitStems:
+        from src.packageADM.splitStems import splitChannelsToMono
+        splitChannelsToMono(sourceADM, processed_dir=processed_dir, output_dir=output_dir, context=context, max_workers=stem_workers)
+    else:
+        print(f"Direct source mode - renderer reads channels from {sourceADM}, no stems written")
     print(f"Packaged data for render in {output_dir}")
     
 
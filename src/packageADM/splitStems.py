@@ -1,8 +1,14 @@
 import soundfile as sf
 import numpy as np
 from pathlib import Path
+from src.bw64Reader import BW64Reader
+from src.analyzeADM.checkAudioChannels import mapEmptyChannels
 import json
 import os
+import queue
+import threading
+import time
+from contextlib import ExitStack
 
 def loadContainsAudioData(processed_dir="processedData"):
     data = {}
@@ -18,29 +24,47 @@ def loadContainsAudioData(processed_dir="processedData"):
     return data
 
 
-def mapEmptyChannels(data):
-    """Map which channels contain audio based on containsAudio data.
+def _writeStemBlocks(block_queue, outputs, columns, stats, errors):
+    """Worker loop: write this worker's columns of every queued block until the None sentinel.
     
-    Args:
-        data (dict): Loaded processed data containing containsAudio info
-    
-    Returns:
-        dict: Mapping of channel index -> contains_audio (True/False)
+    stats[column] accumulates [seconds spent writing, frames written] per file. After an
+    error the worker keeps draining its queue so the reader never blocks on it.
     """
-    channel_audio_map = {}
-    contains_audio_info = data.get('containsAudio', {})
-    for channel_info in contains_audio_info.get('channels', []):
-        channel_index = channel_info.get('channel_index')
-        contains_audio = channel_info.get('contains_audio', False)
-        channel_audio_map[channel_index] = contains_audio
-    return channel_audio_map
+    failed = False
+    while True:
+        block = block_queue.get()
+        if block is None:
+            return
+        if failed:
+            continue
+        try:
+            for column in columns:
+                start = time.perf_counter()
+                outputs[column].write(block[:, column])
+                stats[column][0] += time.perf_counter() - start
+                stats[column][1] += len(block)
+        except Exception as e:
+            errors.append(e)
+            failed = True
 
 
-def splitChannelsToMono(source_path, processed_dir="processedData", output_dir="processedData/stageForRender"):
+def splitChannelsToMono(source_path, processed_dir="processedData", output_dir="processedData/stageForRender", context=None, blocksize=65536, max_workers=4, queue_depth=4):
     """
     Split a multichannel audio file into individual mono WAV files.
     Skips empty channels but preserves channel numbering.
     
+    Streams the source once: fixed-size blocks of the active channels are read from
+    the memory map and each column is appended to an already open mono writer, so
+    peak memory is a couple of blocks (blocksize x active channels) whatever the length
+    of the master. Output keeps the source sample format, and the samples are copied
+    without going through float (BW64Reader.readNative), so stems are bit-exact for
+    every PCM width including 32-bit.
+    
+    Encoding and writing run on max_workers threads (libsndfile releases the GIL), each
+    owning a fixed subset of the output files. Every worker has a bounded queue of
+    queue_depth blocks: when a worker falls behind the reader blocks (back-pressure),
+    so at most about queue_depth + 2 blocks are alive at once.
+    
     Parameters:
     -----------
     source_path : str
@@ -49,6 +73,14 @@ def splitChannelsToMono(source_path, processed_dir="processedData", output_dir="
         Directory containing processed data JSONs (default: "processedData")
     output_dir : str
         Directory to save the mono channel files (default: "processedData/stageForRender")
+    context : PipelineContext, optional
+        Take channel activity from context.containsAudio instead of containsAudio.json
+    blocksize : int
+        Frames per block (default 65536, ~32 MB for 128 32-bit channels)
+    max_workers : int
+        Writer threads (1 writes everything on one thread)
+    queue_depth : int
+        Blocks each writer may fall behind the reader before the reader waits
     
     Returns:
     --------
@@ -56,7 +88,10 @@ def splitChannelsToMono(source_path, processed_dir="processedData", output_dir="
         (total_channels, extracted_channels) - total and number actually written
     """
     # Load processed data and get empty channel mapping
-    data = loadContainsAudioData(processed_dir)
+    if context is not None:
+        data = {'containsAudio': context.containsAudio or {}}
+    else:
+        data = loadContainsAudioData(processed_dir)
     channel_audio_map = mapEmptyChannels(data)
     
     # Convert to absolute path to avoid issues when running from different directories
@@ -77,46 +112,98 @@ def splitChannelsToMono(source_path, processed_dir="processedData", output_dir="
         outputPath.mkdir(parents=True, exist_ok=True)
         print(f"Created directory: {outputPath}")
     
-    # Read the audio file
+    # Memory-map the audio file - only the active channels of one block are copied at a time
     print(f"\nReading ADM for splitting: {source_path}")
-    audio_data, sample_rate = sf.read(source_path)
-    
-    # Get number of channels
-    if audio_data.ndim == 1:
-        num_channels = 1
-        audio_data = audio_data.reshape(-1, 1)
-    else:
-        num_channels = audio_data.shape[1]
-    
-    print(f"Splitting {num_channels} channels at {sample_rate} Hz...")
-    print(f"Skipping empty channels based on containsAudio.json\n")
-    
-    extracted_count = 0
-    skipped_count = 0
-    
-    # Split each channel and save as mono file (only if contains audio)
-    for chanIndex in range(num_channels):
-        chanNumber = chanIndex + 1  # 1-indexed channel numbers
+    with BW64Reader(source_path) as reader, ExitStack() as writers:
+        sample_rate = reader.sample_rate
+        num_channels = reader.channels
         
-        # Check if this channel contains audio
-        has_audio = channel_audio_map.get(chanIndex, True)  # Default to True if not in map
+        print(f"Splitting {num_channels} channels at {sample_rate} Hz...")
+        print(f"Skipping empty channels based on channel activity\n")
         
-        if not has_audio:
-            print(f"  Channel {chanNumber}/{num_channels} -> SKIPPED (empty)")
-            skipped_count += 1
-            continue
+        active_channels = []
+        outputs = []
+        skipped_count = 0
         
-        chanData = audio_data[:, chanIndex]
-        output_file = outputPath / f"src_{chanNumber}.wav"
+        # Open one writer per channel that contains audio
+        for chanIndex in range(num_channels):
+            chanNumber = chanIndex + 1  # 1-indexed channel numbers
+            
+            # Check if this channel contains audio
+            has_audio = channel_audio_map.get(chanIndex, True)  # Default to True if not in map
+            
+            if not has_audio:
+                print(f"  Channel {chanNumber}/{num_channels} -> SKIPPED (empty)")
+                skipped_count += 1
+                continue
+            
+            output_file = outputPath / f"src_{chanNumber}.wav"
+            try:
+                # keep the source sample format rather than soundfile's PCM_16 default
+                outputs.append(writers.enter_context(
+                    sf.SoundFile(output_file, 'w', samplerate=sample_rate, channels=1, subtype=reader.subtype)
+                ))
+                active_channels.append(chanIndex)
+                print(f"  Channel {chanNumber}/{num_channels} -> {output_file.name}")
+            except Exception as e:
+                print(f"  Channel {chanNumber}/{num_channels} -> ERROR: {e}")
+                continue
         
-        try:
-            sf.write(output_file, chanData, sample_rate)
-            print(f"  Channel {chanNumber}/{num_channels} -> {output_file.name}")
-            extracted_count += 1
-        except Exception as e:
-            print(f"  Channel {chanNumber}/{num_channels} -> ERROR: {e}")
-            continue
+        # One pass over the data chunk, fanning each block out to the writer threads
+        if active_channels:
+            num_workers = max(1, min(max_workers, len(outputs)))
+            queues = [queue.Queue(maxsize=queue_depth) for _ in range(num_workers)]
+            stats = [[0.0, 0] for _ in outputs]
+            errors = []
+            workers = [
+                threading.Thread(
+                    target=_writeStemBlocks,
+                    args=(queues[w], outputs, list(range(w, len(outputs), num_workers)), stats, errors),
+                    daemon=True
+                )
+                for w in range(num_workers)
+            ]
+            for worker in workers:
+                worker.start()
+            print(f"\nWriting {len(outputs)} stems with {num_workers} writer threads (queue depth {queue_depth})")
+            
+            start_time = time.perf_counter()
+            stalls = 0
+            total_blocks = max(1, -(-reader.frames // blocksize))
+            next_report = 0.1
+            try:
+                for block_index, block in enumerate(reader.nativeBlocks(blocksize, channels=active_channels)):
+                    for block_queue in queues:
+                        if block_queue.full():
+                            stalls += 1  # a writer is behind, wait for it
+                        block_queue.put(block)
+                    
+                    progress = (block_index + 1) / total_blocks
+                    if progress >= next_report:
+                        print(f"  Read {progress * 100:.0f}% ({(block_index + 1) * blocksize / sample_rate:.0f} s)")
+                        while next_report <= progress:
+                            next_report += 0.1
+            finally:
+                for block_queue in queues:
+                    block_queue.put(None)
+                for worker in workers:
+                    worker.join()
+            
+            elapsed = time.perf_counter() - start_time
+            if errors:
+                raise RuntimeError(f"Writing stems failed: {errors[0]}") from errors[0]
+            
+            bytes_per_frame = reader.bits_per_sample / 8
+            print("\nPer-file write throughput:")
+            for chanIndex, (seconds, frames) in zip(active_channels, stats):
+                file_mb = frames * bytes_per_frame / (1024 * 1024)
+                print(f"  src_{chanIndex + 1}.wav: {file_mb:.1f} MB, {file_mb / max(seconds, 1e-9):.1f} MB/s")
+            written_mb = reader.frames * len(active_channels) * bytes_per_frame / (1024 * 1024)
+            print(f"  Wrote {written_mb:.1f} MB in {elapsed:.1f} s "
+                  f"({written_mb / max(elapsed, 1e-9):.1f} MB/s aggregate, {num_workers} workers, "
+                  f"reader waited on full queues {stalls} times)")
     
+    extracted_count = len(active_channels)
     print(f"\n✓ Extracted {extracted_count}/{num_channels} mono files to {output_dir}")
     print(f"✓ Skipped {skipped_count} empty channels")
     return num_channels, extracted_count
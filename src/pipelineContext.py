@@ -0,0 +1,100 @@
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import numpy as np
+
+from src.analyzeADM.trajectoryStore import TrajectoryStore
+
+# in-memory state handed from stage to stage by runPipeline / runGUI
+#
+# each stage takes an optional context: when one is passed the stage stores its
+# results here instead of writing them to processedData, and the next stage reads
+# them from here instead of reloading JSON. only what the renderer (a separate
+# process) needs still goes to disk - renderInstructions.bin and the channel map
+# (plus the mono stems when they are split).
+# the JSON / .npz dumps used for debugging and standalone runs are written once
+# at the end with exportDebugFiles.
+
+
+@dataclass
+class PipelineContext:
+    """Results of the pipeline stages for one source ADM file.
+
+    Attributes:
+        sourceADMFile: ADM BWF / BW64 master being rendered
+        speakerLayout: speaker layout JSON for the renderer
+        processedDir: where debug exports and render outputs go
+        containsAudio: per-channel activity (containsAudio.json format)
+        activityTimeline: (channels, hops) bool activity timeline, full scans only
+        activitySaved: containsAudio.json is already on disk (written or loaded by the stage graph)
+        objectData: parsed object trajectories
+        directSpeakerData: DirectSpeaker name -> position dict
+        globalData: <Technical> fields (SampleRate, Channels, ...)
+        channelMapping: source name -> 1-based channel number
+        audioStatus: source name -> channel contains audio
+        renderInstructions: {"sampleRate", "sources"} as written for the renderer
+    """
+    sourceADMFile: str
+    speakerLayout: str = "vbapRender/allosphere_layout.json"
+    processedDir: str = "processedData"
+
+    containsAudio: Optional[dict] = None
+    activityTimeline: Optional[np.ndarray] = None
+    activitySaved: bool = False
+
+    objectData: Optional[TrajectoryStore] = None
+    directSpeakerData: Optional[dict] = None
+    globalData: Optional[dict] = None
+
+    channelMapping: Dict[str, int] = field(default_factory=dict)
+    audioStatus: Dict[str, bool] = field(default_factory=dict)
+    renderInstructions: Optional[dict] = None
+
+    @property
+    def stageDir(self):
+        return os.path.join(self.processedDir, "stageForRender")
+
+    @property
+    def renderInstructionsPath(self):
+        return os.path.join(self.stageDir, "renderInstructions.bin")
+
+    @property
+    def channelMapPath(self):
+        return os.path.join(self.stageDir, "channelMap.json")
+
+    @property
+    def renderOutputFile(self):
+        return os.path.join(self.processedDir, "spatial_render.wav")
+
+    def toProcessedData(self):
+        """The dict createRenderInfo.loadProcessedData would build from processedData."""
+        return {
+            "directSpeakerData": self.directSpeakerData or {},
+            "objectData": self.objectData if self.objectData is not None else TrajectoryStore([], [], [0], []),
+            "containsAudio": self.containsAudio or {},
+            "globalData": self.globalData or {},
+        }
+
+    def exportDebugFiles(self, exportObjectJSON=True):
+        """Write everything gathered so far to processedDir in the usual file formats.
+
+        containsAudio.json (+ timeline .npy), globalData.json, directSpeakerData.json,
+        objectData.npz (+ objectData.json with exportObjectJSON) and
+        stageForRender/renderInstructions.json - whichever stages have run.
+        """
+        from src.analyzeADM.checkAudioChannels import saveAudioActivity
+        from src.analyzeADM.parser import writeParsedMetadata
+        from src.packageADM.createRenderInfo import writeRenderInstructionsJSON
+
+        print(f"\nExporting pipeline data to {self.processedDir}...")
+        if self.containsAudio is not None and not self.activitySaved:
+            saveAudioActivity(self.containsAudio, os.path.join(self.processedDir, "containsAudio.json"),
+                              self.activityTimeline)
+        if self.objectData is not None:
+            writeParsedMetadata(self.objectData, self.directSpeakerData, self.globalData,
+                                ToggleExportJSON=exportObjectJSON, TogglePrintSummary=False,
+                                sourceName=self.sourceADMFile)
+        if self.renderInstructions is not None:
+            writeRenderInstructionsJSON(self.renderInstructions,
+                                        os.path.join(self.stageDir, "renderInstructions.json"))
@@ -0,0 +1,349 @@
+import hashlib
+import json
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+# dependency-aware stage runner for runPipeline / runGUI
+#
+# each Stage declares the stages it depends on, its input files, its parameters and its
+# output files. its fingerprint is a blake2b of the name, the parameters, the size and
+# mtime of every input and the fingerprints of the stages it depends on, so a change
+# anywhere upstream propagates down the graph. after a stage has run, its fingerprint and
+# the size / mtime of its outputs are recorded in processedData/.stages.json.
+# on the next run a stage whose fingerprint matches and whose outputs are untouched is
+# skipped, and its load function puts the recorded outputs back into the PipelineContext
+# (e.g. containsAudio.json, the binary render instructions) for the stages after it.
+#
+# fromStage / toStage run a slice of the graph: stages before fromStage are only loaded
+# (even if out of date), stages after toStage are left alone. force reruns every stage
+# of the slice. e.g. a new speaker layout only changes the render fingerprint, so the
+# activity scan, metadata and packaging are loaded and only render + analysis run.
+#
+# a stage starts as soon as the stages it depends on are done, so independent stages run
+# concurrently on a thread pool: the activity scan (reads the audio, numpy releases the
+# GIL) overlaps with the metadata extraction and parse. they write different context
+# fields and neither reads the other's, so the results are the same as one after the other.
+
+STAGE_STATE_FILE = ".stages.json"
+STAGE_STATE_VERSION = 1
+
+STAGE_NAMES = ("activity", "metadata", "package", "render", "analysis")
+
+
+@dataclass
+class Stage:
+    """One step of the pipeline.
+
+    Attributes:
+        name: stage name (--from-stage / --to-stage)
+        run: fn(context) -> False on failure (anything else is success)
+        deps: names of the stages whose results this stage reads
+        inputs: files the result depends on (fingerprinted by size and mtime)
+        outputs: files the stage writes (must still be untouched for a skip)
+        params: settings the result depends on (must be JSON serialisable)
+        load: fn(context) restoring the stage's results when it is skipped
+    """
+    name: str
+    run: Callable
+    deps: tuple = ()
+    inputs: List[str] = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+    params: Dict = field(default_factory=dict)
+    load: Optional[Callable] = None
+
+    def fingerprint(self, dep_fingerprints):
+        h = hashlib.blake2b(digest_size=20)
+        h.update(f"v{STAGE_STATE_VERSION}:{self.name}:".encode())
+        h.update(json.dumps(self.params, sort_keys=True).encode())
+        for path in self.inputs:
+            h.update(f"{os.path.abspath(path)}:{_statStamp(path)}".encode())
+        for dep in self.deps:
+            h.update(f"{dep}:{dep_fingerprints[dep]}".encode())
+        return h.hexdigest()
+
+
+def _statStamp(path):
+    """[size, mtime_ns] of path, or None when it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def loadStageState(state_path):
+    """Stage records of the last runs ({name: {"fingerprint", "outputs", "seconds"}}), {} if none."""
+    try:
+        with open(state_path, "r") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if state.get("version") != STAGE_STATE_VERSION:
+        return {}
+    return state.get("stages", {})
+
+
+def saveStageState(state_path, records):
+    os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+    with open(state_path + ".tmp", "w") as f:
+        json.dump({"version": STAGE_STATE_VERSION, "stages": records}, f, indent=2)
+    os.replace(state_path + ".tmp", state_path)
+
+
+def _outputsCurrent(record, stage):
+    # a record from before an output was added to the stage does not cover it
+    outputs = record.get("outputs", {})
+    return (all(path in outputs for path in stage.outputs)
+            and all(_statStamp(path) == stamp for path, stamp in outputs.items()))
+
+
+def runStages(stages, context, fromStage=None, toStage=None, force=False, state_path=None, max_parallel=4):
+    """
+    Run the stages, skipping those that are up to date. Stages whose dependencies are
+    all done run concurrently (up to max_parallel at a time), e.g. the activity scan and
+    the metadata extraction, which share no data.
+
+    Parameters:
+    -----------
+    stages : list of Stage
+        In dependency order (every dep comes before the stage using it)
+    context : PipelineContext
+        Handed to every run / load function. Concurrent stages must write different fields
+    fromStage : str, optional
+        Only load the stages before this one
+    toStage : str, optional
+        Stop after this stage
+    force : bool
+        Run every stage from fromStage to toStage even if it is up to date
+    state_path : str, optional
+        Stage records file (default: <context.processedDir>/.stages.json)
+    max_parallel : int
+        Stages running at the same time (1 = one after the other)
+
+    Returns:
+    --------
+    list
+        (stage name, "ran" / "skipped" / "loaded" / "failed", start, end) per stage handled,
+        in order of completion, with start / end in seconds since runStages was called.
+        After a failure no new stage is started (see failedStage)
+    """
+    names = [stage.name for stage in stages]
+    for name in (fromStage, toStage):
+        if name is not None and name not in names:
+            raise ValueError(f"Unknown stage '{name}' (choose from {', '.join(names)})")
+    start = names.index(fromStage) if fromStage else 0
+    end = names.index(toStage) if toStage else len(stages) - 1
+    if start > end:
+        raise ValueError(f"--from-stage {fromStage} comes after --to-stage {toStage}")
+
+    state_path = state_path or os.path.join(context.processedDir, STAGE_STATE_FILE)
+    records = loadStageState(state_path)
+    fingerprints = {}
+    timings = []
+    t_start = time.perf_counter()
+
+    def clock():
+        return time.perf_counter() - t_start
+
+    pending = list(enumerate(stages[:end + 1]))
+    running = {}  # future -> (stage, fingerprint)
+    failed = False
+
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as pool:
+        while (pending and not failed) or running:
+            # start (or skip) every stage whose dependencies are done
+            for item in [item for item in pending if all(dep in fingerprints for dep in item[1].deps)]:
+                if failed:
+                    break
+                pending.remove(item)
+                index, stage = item
+                fingerprint = stage.fingerprint(fingerprints)
+                record = records.get(stage.name)
+                current = record is not None and record["fingerprint"] == fingerprint and _outputsCurrent(record, stage)
+
+                if index < start or (current and not force):
+                    if record is None or not _outputsCurrent(record, stage):
+                        raise RuntimeError(f"Stage '{stage.name}' has no usable results from an earlier run, "
+                                           f"run it (or start from it) first")
+                    if not current:
+                        print(f"⚠ Stage '{stage.name}' is out of date but is loaded (--from-stage {fromStage})")
+                    t0 = clock()
+                    if stage.load is not None:
+                        stage.load(context)
+                    timings.append((stage.name, "loaded" if index < start else "skipped", t0, clock()))
+                    if index < start:
+                        print(f"✓ Stage '{stage.name}' results loaded")
+                    else:
+                        print(f"✓ Stage '{stage.name}' up to date, results loaded")
+                    # later stages depend on what was actually loaded
+                    fingerprints[stage.name] = record["fingerprint"]
+                    continue
+
+                print(f"\n▶ Stage '{stage.name}'")
+                running[pool.submit(_runTimed, stage, context, clock)] = (stage, fingerprint)
+
+            if not running:
+                if pending and not failed and not any(all(dep in fingerprints for dep in stage.deps)
+                                                      for _, stage in pending):
+                    raise ValueError(f"Stage '{pending[0][1].name}' depends on a stage that is not in the graph")
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, fingerprint = running.pop(future)
+                ok, t0 = future.result()
+                t1 = clock()
+                if ok is False:
+                    timings.append((stage.name, "failed", t0, t1))
+                    records.pop(stage.name, None)
+                    failed = True
+                else:
+                    timings.append((stage.name, "ran", t0, t1))
+                    fingerprints[stage.name] = fingerprint
+                    records[stage.name] = {
+                        "fingerprint": fingerprint,
+                        "outputs": {path: _statStamp(path) for path in stage.outputs},
+                        "seconds": round(t1 - t0, 3),
+                    }
+                # saved after every stage so an interrupted run keeps what it finished
+                saveStageState(state_path, records)
+
+    return timings
+
+
+def _runTimed(stage, context, clock):
+    # start is taken in the worker: a stage queued behind a busy pool has not started yet
+    start = clock()
+    try:
+        return stage.run(context), start
+    except Exception as e:
+        # reported as a failed stage so the stages already running finish and the
+        # fingerprints of the ones that succeeded are still saved
+        print(f"\n✗ Error in stage '{stage.name}': {e}")
+        traceback.print_exc()
+        return False, start
+
+
+def failedStage(timings):
+    """Name of the stage that failed, or None."""
+    return next((name for name, status, _, _ in timings if status == "failed"), None)
+
+
+def printStageTimings(timings, width=40):
+    """Per-stage start / end and a timeline bar, plus the time saved by running stages concurrently."""
+    if not timings:
+        return
+    wall = max(end for _, _, _, end in timings)
+    busy = sum(end - start for _, _, start, end in timings)
+    scale = width / wall if wall > 0 else 0
+    print("\nStage timings:")
+    for name, status, start, end in sorted(timings, key=lambda t: t[2]):
+        first = min(width - 1, int(start * scale))
+        bar = " " * first + "#" * max(1, int(end * scale) - first)
+        print(f"  {name:<10} {status:<8} {start:7.2f} -> {end:7.2f} s  |{bar:<{width}}|")
+    print(f"  wall {wall:.2f} s, stages {busy:.2f} s, {max(0.0, busy - wall):.2f} s overlapped")
+
+
+def pipelineStages(context, threshold_db=-100, simplify=True, tolerance_deg=0.0,
+                   incrementalRender=False, renderWorkers=1, renderThreads=1, analysisPDF=None):
+    """
+    The standard pipeline as a list of Stages for runStages.
+
+    activity -> containsAudio.json (+ timeline) in processedDir
+    metadata -> parsed ADM metadata (persisted by the metadata cache)
+    package  -> stageForRender/renderInstructions.bin + channelMap.json
+    render   -> spatial_render.wav
+    analysis -> the analysis PDF (only with analysisPDF)
+
+    Parameters:
+    -----------
+    context : PipelineContext
+        Source file, speaker layout and output locations
+    threshold_db : float
+        Channel activity threshold
+    simplify, tolerance_deg :
+        Keyframe simplification (see createRenderInfo.simplifyKeyframes)
+    incrementalRender : bool
+        Reuse cached per-source contributions when rendering (does not change the output,
+        opt-in: fingerprinting reads the whole master and the cache takes disk space)
+    renderWorkers : int
+        Concurrent render segments (does not change the output)
+    renderThreads : int
+        Mix threads per renderer process (can change the last bits, so it's a render parameter)
+    analysisPDF : str, optional
+        Where to write the render analysis, no analysis stage without it
+    """
+    from src.configCPP import rendererExecutable
+    from src.analyzeADM.checkAudioChannels import timelinePath
+    containsAudioPath = os.path.join(context.processedDir, "containsAudio.json")
+
+    def runActivity(ctx):
+        from src.analyzeADM.checkAudioChannels import exportAudioActivity, saveAudioActivity
+        exportAudioActivity(ctx.sourceADMFile, threshold_db=threshold_db, full_scan=True, context=ctx)
+        saveAudioActivity(ctx.containsAudio, containsAudioPath, ctx.activityTimeline)
+        ctx.activitySaved = True
+
+    def loadActivity(ctx):
+        from src.analyzeADM.checkAudioChannels import loadActivityTimeline
+        with open(containsAudioPath, "r") as f:
+            ctx.containsAudio = json.load(f)
+        ctx.activityTimeline = loadActivityTimeline(containsAudioPath)
+        ctx.activitySaved = True
+
+    def runMetadata(ctx, printSummary=True):
+        from src.analyzeADM.metadataCache import loadADMMetadata
+        loadADMMetadata(ctx.sourceADMFile, TogglePrintSummary=printSummary, context=ctx)
+
+    def runPackage(ctx):
+        from src.packageADM.packageForRender import packageForRender
+        packageForRender(ctx.sourceADMFile, ctx.processedDir, simplify=simplify,
+                         tolerance_deg=tolerance_deg, context=ctx)
+
+    def loadPackage(ctx):
+        from src.packageADM.createRenderInfo import assignChannels, readRenderInstructionsBin
+        # channel assignments only depend on the activity and metadata stages (loaded already)
+        ctx.channelMapping, ctx.audioStatus = assignChannels(ctx.toProcessedData())
+        ctx.renderInstructions = readRenderInstructionsBin(ctx.renderInstructionsPath)
+
+    def runRender(ctx):
+        from src.createRender import runVBAPRender
+        return runVBAPRender(
+            source_folder=ctx.stageDir,
+            render_instructions=ctx.renderInstructionsPath,
+            source_wav=ctx.sourceADMFile,
+            channel_map=ctx.channelMapPath,
+            speaker_layout=ctx.speakerLayout,
+            output_file=ctx.renderOutputFile,
+            incremental=incrementalRender,
+            instructions=ctx.renderInstructions,
+            workers=renderWorkers,
+            threads=renderThreads
+        )
+
+    def runAnalysis(ctx):
+        from src.analyzeRender import analyzeRenderOutput
+        print("Analyzing rendered spatial audio...")
+        analyzeRenderOutput(render_file=ctx.renderOutputFile, output_pdf=analysisPDF)
+
+    stages = [
+        Stage("activity", runActivity, inputs=[context.sourceADMFile],
+              outputs=[containsAudioPath, timelinePath(containsAudioPath)],
+              params={"threshold_db": threshold_db, "full_scan": True},
+              load=loadActivity),
+        # nothing to track on disk: loading goes through the metadata cache (a few ms on a hit)
+        Stage("metadata", runMetadata, inputs=[context.sourceADMFile],
+              load=lambda ctx: runMetadata(ctx, printSummary=False)),
+        Stage("package", runPackage, deps=("activity", "metadata"),
+              outputs=[context.renderInstructionsPath, context.channelMapPath],
+              params={"simplify": simplify, "tolerance_deg": tolerance_deg}, load=loadPackage),
+        Stage("render", runRender, deps=("package",),
+              inputs=[context.sourceADMFile, context.speakerLayout, str(rendererExecutable())],
+              outputs=[context.renderOutputFile], params={"threads": renderThreads}),
+    ]
+    if analysisPDF:
+        stages.append(Stage("analysis", runAnalysis, deps=("render",), outputs=[analysisPDF]))
+    return stages
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+from src.bw64Reader import BW64Reader
+
+# cache keys for incremental renders (renderer --cache-dir / --source-keys)
+#
+# the renderer stores each source's speaker-domain contribution as <key>.contrib in
+# the cache dir (only the blocks where the source has signal, and in each only the
+# speakers it reaches). a key fingerprints everything that contribution depends on:
+# its audio, its keyframes, the speaker layout and the sample rate - so after a mix
+# revision only the sources whose audio or trajectory changed are re-rendered. the
+# renderer's --version (build profile) is part of the key too, so switching profiles
+# never sums contributions another build rendered.
+#
+# audio digests cost one read of the audio, so they are remembered per file
+# (path, size, mtime) in audioDigests.json. least recently used contributions are
+# evicted once the cache grows beyond max_bytes (the renderer refreshes hits' mtime).
+
+DEFAULT_RENDER_CACHE_DIR = "processedData/cache/render"
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024 * 1024
+
+# bump when the renderer's output for the same inputs changes
+RENDER_CACHE_VERSION = 4  # 2: gains ramp across blocks, 3: sparse block records, 4: no FMA contraction
+
+DIGEST_BLOCK_FRAMES = 1 << 20
+
+
+def _statKey(path):
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _isCurrent(stat_key):
+    path = stat_key.rsplit(":", 2)[0]
+    return os.path.exists(path) and _statKey(path) == stat_key
+
+
+def _loadDigestCache(cache_dir):
+    path = os.path.join(cache_dir, "audioDigests.json")
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Warning: Ignoring unreadable audio digest cache {path}: {e}")
+    return {}
+
+
+def _saveDigestCache(cache_dir, digests):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, "audioDigests.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(digests, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def channelDigests(wavPath, channels):
+    """blake2b digest (hex) of the raw samples of each channel, in one pass over the data chunk."""
+    hashes = {ch: hashlib.blake2b(digest_size=20) for ch in channels}
+    with BW64Reader(wavPath) as reader:
+        header = f"{reader.sample_rate}:{reader.subtype}:{reader.frames}".encode()
+        for h in hashes.values():
+            h.update(header)
+        raw = reader.data
+        for start in range(0, reader.frames, DIGEST_BLOCK_FRAMES):
+            block = raw[start:start + DIGEST_BLOCK_FRAMES]
+            for ch, h in hashes.items():
+                h.update(np.ascontiguousarray(block[:, ch]).data)
+    return {ch: h.hexdigest() for ch, h in hashes.items()}
+
+
+def fileDigest(path):
+    """blake2b digest (hex) of a whole file."""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for piece in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(piece)
+    return h.hexdigest()
+
+
+def sourceAudioDigests(names, source_wav=None, channel_map=None, source_folder=None, cache_dir=DEFAULT_RENDER_CACHE_DIR):
+    """Audio digest for each source name.
+
+    Parameters:
+    -----------
+    names : list
+        Source names (src_N)
+    source_wav : str, optional
+        Interleaved master the renderer reads in direct mode
+    channel_map : dict, optional
+        Source name -> 0-based master channel (default src_N -> N-1)
+    source_folder : str, optional
+        Folder with <name>.wav mono stems (used when source_wav is not given)
+    cache_dir : str
+        Where audioDigests.json is kept
+
+    Returns:
+    --------
+    dict
+        source name -> hex digest
+    """
+    known = _loadDigestCache(cache_dir)
+    digests = {}
+
+    if source_wav:
+        if channel_map is None:
+            channel_map = {name: int(name.split("_")[-1]) - 1 for name in names}
+        file_key = _statKey(source_wav)
+        channel_digests = known.setdefault(file_key, {})
+        missing = sorted({channel_map[name] for name in names} - {int(ch) for ch in channel_digests})
+        if missing:
+            print(f"Hashing {len(missing)} channels of {source_wav}...")
+            for ch, digest in channelDigests(source_wav, missing).items():
+                channel_digests[str(ch)] = digest
+        for name in names:
+            digests[name] = channel_digests[str(channel_map[name])]
+    else:
+        for name in names:
+            path = os.path.join(source_folder, f"{name}.wav")
+            file_key = _statKey(path)
+            if file_key not in known:
+                known[file_key] = fileDigest(path)
+            digests[name] = known[file_key]
+
+    # forget digests of files that have since changed or disappeared
+    live = {key: value for key, value in known.items() if _isCurrent(key)}
+    _saveDigestCache(cache_dir, live)
+    return digests
+
+
+def computeSourceKeys(instructions, layout_path, audio_digests, renderer_version=""):
+    """Cache key per source from its audio digest, its keyframes, the layout, the sample rate
+    and the renderer build (renderer_version, its --version output).
+
+    instructions is the {"sampleRate", "sources"} dict written for the renderer; keyframes are
+    hashed at the precision the renderer reads them (float64 time, float32 x/y/z).
+    """
+    with open(layout_path, "rb") as f:
+        layout_digest = hashlib.blake2b(f.read(), digest_size=20).hexdigest()
+
+    keys = {}
+    for name, keyframes in instructions["sources"].items():
+        h = hashlib.blake2b(digest_size=20)
+        h.update(f"v{RENDER_CACHE_VERSION}:{renderer_version}:{instructions['sampleRate']}:{layout_digest}:"
+                 f"{audio_digests[name]}".encode())
+        h.update(np.array([k["time"] for k in keyframes], dtype="<f8").tobytes())
+        h.update(np.array([k["cart"] for k in keyframes], dtype="<f4").tobytes())
+        keys[name] = h.hexdigest()
+    return keys
+
+
+def writeSourceKeys(keys, output_path):
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(keys, f, indent=2)
+    print(f"Saved {len(keys)} source cache keys to {output_path}")
+
+
+def pruneRenderCache(cache_dir=DEFAULT_RENDER_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+    """Delete least recently used contributions until the cache is at most max_bytes. Returns bytes freed."""
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".contrib"):
+            stat = os.stat(os.path.join(cache_dir, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+    entries.sort()
+
+    total = sum(size for _, size, _ in entries)
+    freed = 0
+    for _, size, name in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+            total -= size
+            freed += size
+            print(f"Evicted render cache entry: {name}")
+        except Exception as e:
+            print(f"Warning: Could not evict {name}: {e}")
+    print(f"Render cache: {total / (1024 * 1024):.1f} MB in {cache_dir}")
+    return freed
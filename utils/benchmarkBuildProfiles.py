@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# compare the renderer build profiles (src/configCPP.py BUILD_PROFILES) on a fixed test render
+#
+# usage:
+#   python utils/benchmarkBuildProfiles.py [--profiles release relwithdebinfo native]
+#                                          [--seconds 60] [--sources 32] [--runs 3]
+#
+# each profile is built into its own vbapRender/build-<profile> directory (the pipeline's
+# vbapRender/build is left alone), then renders the same synthetic programme: a float
+# master with `sources` channels, half of them moving, on the AlloSphere layout.
+# reports the best wall time of `runs` renders and the real-time factor (programme
+# length / render time). multiply-add contraction is off in every profile, so the
+# profiles differ in speed only.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.configCPP import BUILD_PROFILES, buildVBAPRenderer
+
+PROJECT_ROOT = Path(__file__).parent.parent.resolve()
+
+
+def writeTestRender(folder, seconds, num_sources, sample_rate=48000):
+    """Synthetic master + instructions, the same for every run (fixed seed)."""
+    rng = np.random.default_rng(1)
+    frames = int(seconds * sample_rate)
+    master = os.path.join(folder, "master.wav")
+    with sf.SoundFile(master, "w", samplerate=sample_rate, channels=num_sources, subtype="FLOAT") as f:
+        for start in range(0, frames, sample_rate):
+            n = min(sample_rate, frames - start)
+            f.write((0.1 * rng.standard_normal((n, num_sources))).astype(np.float32))
+
+    sources = {}
+    for s in range(num_sources):
+        start = rng.uniform(-1, 1, 3)
+        if s % 2:
+            # moving: a new position every second
+            keyframes = [{"time": float(t), "cart": (start + 0.05 * t * rng.uniform(-1, 1, 3)).tolist()}
+                         for t in range(int(seconds) + 1)]
+        else:
+            keyframes = [{"time": 0.0, "cart": start.tolist()}]
+        sources[f"src_{s + 1}"] = keyframes
+
+    instructions = os.path.join(folder, "renderInstructions.json")
+    with open(instructions, "w") as f:
+        json.dump({"sampleRate": sample_rate, "sources": sources}, f)
+    return master, instructions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Real-time factor of each renderer build profile")
+    parser.add_argument("--profiles", nargs="+", default=list(BUILD_PROFILES), choices=list(BUILD_PROFILES))
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--sources", type=int, default=32)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--layout", default="vbapRender/allosphere_layout.json")
+    args = parser.parse_args()
+
+    layout = str((PROJECT_ROOT / args.layout).resolve())
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        master, instructions = writeTestRender(tmp, args.seconds, args.sources)
+        reference = None
+
+        for profile in args.profiles:
+            build_dir = f"vbapRender/build-{profile}"
+            if not buildVBAPRenderer(build_dir=build_dir, profile=profile):
+                print(f"Build of the {profile} profile failed")
+                return 1
+            executable = str(PROJECT_ROOT / build_dir / "sonoPleth_vbap_render")
+            version = subprocess.run([executable, "--version"], capture_output=True, text=True).stdout.strip()
+
+            output = os.path.join(tmp, f"render_{profile}.wav")
+            command = [executable, "--layout", layout, "--positions", instructions,
+                       "--source-wav", master, "--out", output]
+            times = []
+            for _ in range(args.runs):
+                t0 = time.perf_counter()
+                subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+                times.append(time.perf_counter() - t0)
+
+            rendered, _ = sf.read(output, dtype="float32")
+            if reference is None:
+                reference = rendered
+            max_diff = float(np.abs(rendered - reference).max()) if rendered.shape == reference.shape else float("nan")
+            results.append((profile, min(times), version, max_diff))
+
+    print(f"\n{args.seconds:.0f} s programme, {args.sources} sources, best of {args.runs} runs")
+    print(f"{'profile':>16} {'time (s)':>10} {'RTF':>8} {'vs first':>9} {'max diff':>10}")
+    base = results[0][1]
+    for profile, best, version, max_diff in results:
+        print(f"{profile:>16} {best:>10.2f} {args.seconds / best:>7.1f}x {base / best:>8.2f}x {max_diff:>10.2e}")
+    for profile, _, version, _ in results:
+        print(f"  {profile}: {version}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# benchmark the single-pass streaming ADM parser against the original three-parse path
+#
+# usage:
+#   python utils/benchmarkParser.py [metadata.xml] [--objects 118] [--blocks 2000]
+#
+# without an XML path a synthetic ADM document is generated in a temp folder.
+# each approach runs in its own process so peak RSS is measured separately.
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.analyzeADM.parser import (
+    extractObjectPositions,
+    getGlobalData,
+    getDirectSpeakerData,
+    parseADMStream,
+)
+
+
+def writeSyntheticADM(path, num_objects=118, blocks_per_object=2000, num_speakers=10):
+    """Write a bwfmetaedit-style XML with DirectSpeakers, moving objects and a <Technical> section."""
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<conformance_point_document>\n<File>\n')
+        f.write("<Technical><Channels>128</Channels><SampleRate>48000</SampleRate><BitPerSample>24</BitPerSample></Technical>\n")
+        f.write('<aXML><ebuCoreMain xmlns="urn:ebu:metadata-schema:ebuCore_2016"><coreMetadata><format><audioFormatExtended>\n')
+
+        for s in range(num_speakers):
+            f.write(f'<audioChannelFormat audioChannelFormatID="AC_0001{s + 1:04X}" audioChannelFormatName="Speaker{s + 1}" typeDefinition="DirectSpeakers">')
+            f.write(f'<audioBlockFormat audioBlockFormatID="AB_0001{s + 1:04X}_00000001"><speakerLabel>M+{s * 30:03d}</speakerLabel>'
+                    f'<cartesian>1</cartesian><position coordinate="X">{(s % 3) - 1}.0</position>'
+                    f'<position coordinate="Y">1.0</position><position coordinate="Z">0.0</position></audioBlockFormat>')
+            f.write("</audioChannelFormat>\n")
+
+        for o in range(num_objects):
+            f.write(f'<audioChannelFormat audioChannelFormatID="AC_0003{o + 1:04X}" audioChannelFormatName="Object{o + 1}" typeDefinition="Objects">')
+            for b in range(blocks_per_object):
+                seconds = b * 0.1
+                rtime = f"00:{int(seconds // 60):02d}:{seconds % 60:08.5f}"
+                f.write(f'<audioBlockFormat audioBlockFormatID="AB_0003{o + 1:04X}_{b + 1:08X}" rtime="{rtime}" duration="00:00:00.10000">'
+                        f'<cartesian>1</cartesian><position coordinate="X">{(b % 200) / 100 - 1:.4f}</position>'
+                        f'<position coordinate="Y">{(o % 10) / 10:.4f}</position><position coordinate="Z">0.0000</position>'
+                        f'<width>0.0</width><depth>0.0</depth><height>0.0</height></audioBlockFormat>')
+            f.write("</audioChannelFormat>\n")
+
+        f.write("</audioFormatExtended></format></coreMetadata></ebuCoreMain></aXML>\n</File>\n</conformance_point_document>\n")
+
+
+def runThreeParses(xml_path, out_dir):
+    objects = extractObjectPositions(xml_path)
+    getGlobalData(xml_path, outputPath=os.path.join(out_dir, "globalData.json"))
+    speakers = getDirectSpeakerData(xml_path, outputPath=os.path.join(out_dir, "directSpeakerData.json"))
+    return objects, speakers
+
+
+def runStreaming(xml_path, out_dir):
+    objects, speakers, _ = parseADMStream(xml_path)
+    return objects, speakers
+
+
+def _measure(name, xml_path, out_dir, queue):
+    func = runThreeParses if name == "three etree.parse" else runStreaming
+    start = time.perf_counter()
+    objects, speakers = func(xml_path, out_dir)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_kb //= 1024  # macOS reports bytes
+    blocks = sum(len(b) for _, b in objects.items())
+    queue.put((elapsed, peak_kb / 1024, len(objects), blocks, len(speakers)))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the streaming ADM parser")
+    ap.add_argument("xml", nargs="?", help="ADM XML to parse (synthetic if omitted)")
+    ap.add_argument("--objects", type=int, default=118)
+    ap.add_argument("--blocks", type=int, default=2000, help="blocks per object for the synthetic file")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        xml_path = args.xml
+        if xml_path is None:
+            xml_path = os.path.join(tmp, "synthetic_adm.xml")
+            print(f"Writing synthetic ADM ({args.objects} objects x {args.blocks} blocks)...")
+            writeSyntheticADM(xml_path, args.objects, args.blocks)
+        print(f"XML size: {os.path.getsize(xml_path) / (1024 * 1024):.1f} MB\n")
+
+        results = {}
+        for name in ("three etree.parse", "streaming iterparse"):
+            queue = multiprocessing.Queue()
+            proc = multiprocessing.Process(target=_measure, args=(name, xml_path, tmp, queue))
+            proc.start()
+            results[name] = queue.get()
+            proc.join()
+            elapsed, peak_mb, objects, blocks, speakers = results[name]
+            print(f"{name:>22}: {elapsed:7.2f} s  peak RSS {peak_mb:8.1f} MB  "
+                  f"({objects} objects, {blocks} blocks, {speakers} DirectSpeakers)")
+
+        old = results["three etree.parse"]
+        new = results["streaming iterparse"]
+        print(f"\nSpeedup: {old[0] / max(new[0], 1e-9):.2f}x, peak RSS ratio: {old[1] / max(new[1], 1e-9):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# benchmark time-segmented rendering: wall time and speedup versus worker count
+#
+# usage:
+#   python utils/benchmarkRender.py <sourceADMFile> [--layout vbapRender/allosphere_layout.json]
+#                                   [--workers 1 2 4 8]
+#
+# the ADM master is analyzed and packaged once (direct mode), then rendered once per
+# worker count. every render is compared against the single-worker render, which must
+# match sample for sample. incremental rendering is off so every run does the full work.
+#
+# afterwards the largest worker count renders twice more incrementally into an empty
+# cache: once storing every source's contribution (cold), once summing them back (warm).
+# block gains only depend on the block index and the renderer is built without
+# multiply-add contraction (vbapRender/CMakeLists.txt), so both must match the reference
+# exactly too - any difference means a seam or a cached contribution was summed differently.
+
+import argparse
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.chdir(Path(__file__).parent.parent)
+
+from src.analyzeADM.checkAudioChannels import exportAudioActivity
+from src.analyzeADM.metadataCache import loadADMMetadata
+from src.packageADM.packageForRender import packageForRender
+from src.createRender import runVBAPRender
+from src.pipelineContext import PipelineContext
+
+
+def filesMatch(path_a, path_b, blocksize=1 << 18):
+    """True when both WAVs have the same shape and identical samples."""
+    if sf.info(path_a).frames != sf.info(path_b).frames:
+        return False
+    blocks_b = sf.blocks(path_b, blocksize=blocksize, dtype="float32", always_2d=True)
+    for block_a in sf.blocks(path_a, blocksize=blocksize, dtype="float32", always_2d=True):
+        if not np.array_equal(block_a, next(blocks_b)):
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speedup of segmented rendering versus worker count")
+    parser.add_argument("source", help="ADM BWF / BW64 master")
+    parser.add_argument("--layout", default="vbapRender/allosphere_layout.json")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    context = PipelineContext(args.source, args.layout)
+    exportAudioActivity(args.source, threshold_db=-100, full_scan=True, context=context)
+    loadADMMetadata(args.source, TogglePrintSummary=False, context=context)
+    packageForRender(args.source, context.processedDir, context=context)
+
+    worker_counts = sorted(set([1] + args.workers))
+    reference = os.path.join(context.processedDir, "benchmark_render_w1.wav")
+    results = []
+    for workers in worker_counts:
+        output = os.path.join(context.processedDir, f"benchmark_render_w{workers}.wav")
+        t0 = time.perf_counter()
+        ok = runVBAPRender(
+            render_instructions=context.renderInstructionsPath,
+            source_wav=context.sourceADMFile,
+            channel_map=context.channelMapPath,
+            speaker_layout=args.layout,
+            output_file=output,
+            instructions=context.renderInstructions,
+            workers=workers
+        )
+        elapsed = time.perf_counter() - t0
+        if not ok:
+            print(f"Render with {workers} workers failed")
+            return 1
+        results.append((workers, elapsed, workers == 1 or filesMatch(reference, output)))
+
+    cache_dir = os.path.join(context.processedDir, "cache", "benchmarkRender")
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    incremental = []
+    for run in ("cold", "warm"):
+        output = os.path.join(context.processedDir, f"benchmark_render_{run}.wav")
+        t0 = time.perf_counter()
+        ok = runVBAPRender(
+            render_instructions=context.renderInstructionsPath,
+            source_wav=context.sourceADMFile,
+            channel_map=context.channelMapPath,
+            speaker_layout=args.layout,
+            output_file=output,
+            incremental=True,
+            cache_dir=cache_dir,
+            instructions=context.renderInstructions,
+            workers=worker_counts[-1]
+        )
+        elapsed = time.perf_counter() - t0
+        if not ok:
+            print(f"Incremental render ({run} cache) failed")
+            return 1
+        incremental.append((run, elapsed, filesMatch(reference, output)))
+        os.remove(output)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print(f"\n{'workers':>8} {'time (s)':>10} {'speedup':>9} {'efficiency':>11}  identical")
+    base = results[0][1]
+    for workers, elapsed, identical in results:
+        speedup = base / elapsed
+        print(f"{workers:>8} {elapsed:>10.2f} {speedup:>8.2f}x {speedup / workers:>10.0%}  {'yes' if identical else 'NO'}")
+    print(f"({os.cpu_count()} CPUs)")
+
+    print(f"\nincremental, {worker_counts[-1]} workers")
+    for run, elapsed, identical in incremental:
+        print(f"{run:>8} {elapsed:>10.2f} {base / elapsed:>8.2f}x {'':>11}  {'yes' if identical else 'NO'}")
+
+    for workers, _, _ in results:
+        os.remove(os.path.join(context.processedDir, f"benchmark_render_w{workers}.wav"))
+    return 0 if all(identical for _, _, identical in results + incremental) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# time to first useful work of runPipeline: interpreter start -> tool check -> stages imported
+#
+# usage:
+#   python utils/benchmarkStartup.py [--runs 10]
+#
+# every run is a fresh interpreter (like a batch job), timed from spawn until it is
+# ready to start the activity scan. two ways of getting there:
+#
+#   full     what runPipeline used to do: import every stage and matplotlib / lxml /
+#            soundfile up front, then the full setupCppTools (submodule check, source
+#            hash, build stamp) - the same as --verify-tools plus eager imports
+#   manifest what runPipeline does now: ensureCppTools stats the toolchain manifest,
+#            stage modules are imported after it and the heavy libraries only when used
+#
+# the manifest is written by the first full run, so both modes see a built renderer.
+# reports the median and best wall time of `runs` runs and the module count loaded.
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent.resolve()
+
+FULL = """
+import sys
+for module in ("matplotlib.pyplot", "lxml.etree", "soundfile"):
+    try:
+        __import__(module)
+    except ImportError:
+        pass
+from src.configCPP import setupCppTools
+from src.analyzeADM.metadataCache import loadADMMetadata
+from src.analyzeADM.checkAudioChannels import exportAudioActivity
+from src.packageADM.packageForRender import packageForRender
+from src.packageADM.splitStems import splitChannelsToMono
+from src.createRender import runVBAPRender
+from src.pipelineContext import PipelineContext
+if not setupCppTools():
+    sys.exit(1)
+print(len(sys.modules), file=sys.stderr)
+"""
+
+MANIFEST = """
+import sys
+from src.configCPP import ensureCppTools
+if not ensureCppTools():
+    sys.exit(1)
+from src.analyzeADM.metadataCache import loadADMMetadata
+from src.analyzeADM.checkAudioChannels import exportAudioActivity
+from src.packageADM.packageForRender import packageForRender
+from src.createRender import runVBAPRender
+from src.pipelineContext import PipelineContext
+print(len(sys.modules), file=sys.stderr)
+"""
+
+
+def timeStartup(code):
+    """Wall time (s) of a fresh interpreter running code, and the number of modules it loaded."""
+    t0 = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=str(PROJECT_ROOT),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - t0
+    if result.returncode != 0:
+        raise RuntimeError(f"startup run failed:\n{result.stderr}")
+    return elapsed, int(result.stderr.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to first useful work of runPipeline")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    # one full run first: builds the renderer if needed and writes the toolchain manifest
+    timeStartup(FULL)
+
+    results = []
+    for mode, code in (("full", FULL), ("manifest", MANIFEST)):
+        times = []
+        for _ in range(args.runs):
+            elapsed, modules = timeStartup(code)
+            times.append(elapsed)
+        results.append((mode, statistics.median(times), min(times), modules))
+
+    print(f"\ntime to first useful work, {args.runs} runs each")
+    print(f"{'mode':>10} {'median (ms)':>12} {'best (ms)':>10} {'modules':>8} {'speedup':>8}")
+    base = results[0][1]
+    for mode, median, best, modules in results:
+        print(f"{mode:>10} {median * 1000:>12.1f} {best * 1000:>10.1f} {modules:>8} {base / median:>7.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+#include "BinaryLoader.hpp"
+
+#include <cstdint>
+#include <cstring>
+#include <stdexcept>
+
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+namespace {
+
+constexpr size_t kHeaderBytes = 32;
+constexpr size_t kSourceEntryBytes = 80;
+constexpr size_t kNameBytes = 64;
+
+template <typename T>
+T readValue(const uint8_t *p) {
+    T v;
+    std::memcpy(&v, p, sizeof(T));
+    return v;
+}
+
+// unmaps and closes on every exit path, including the validation throws
+struct MappedFile {
+    int fd = -1;
+    void *addr = MAP_FAILED;
+    size_t size = 0;
+
+    ~MappedFile() {
+        if (addr != MAP_FAILED) munmap(addr, size);
+        if (fd >= 0) close(fd);
+    }
+};
+
+} // namespace
+
+SpatialData BinaryLoader::loadSpatialInstructions(const std::string &path) {
+    MappedFile file;
+    file.fd = open(path.c_str(), O_RDONLY);
+    if (file.fd < 0) throw std::runtime_error("Cannot open spatial instructions: " + path);
+
+    struct stat st;
+    if (fstat(file.fd, &st) != 0) throw std::runtime_error("Cannot stat spatial instructions: " + path);
+    file.size = static_cast<size_t>(st.st_size);
+    if (file.size < kHeaderBytes) throw std::runtime_error("Spatial instructions file too small: " + path);
+
+    file.addr = mmap(nullptr, file.size, PROT_READ, MAP_PRIVATE, file.fd, 0);
+    if (file.addr == MAP_FAILED) throw std::runtime_error("Cannot mmap spatial instructions: " + path);
+    const uint8_t *base = static_cast<const uint8_t *>(file.addr);
+
+    if (std::memcmp(base, "SPRI", 4) != 0)
+        throw std::runtime_error("Not a binary render instructions file: " + path);
+    uint32_t version = readValue<uint32_t>(base + 4);
+    if (version != kVersion)
+        throw std::runtime_error("Unsupported render instructions version " + std::to_string(version) +
+                                 " (expected " + std::to_string(kVersion) + ")");
+
+    uint32_t sampleRate = readValue<uint32_t>(base + 8);
+    uint32_t numSources = readValue<uint32_t>(base + 12);
+    uint64_t numKeyframes = readValue<uint64_t>(base + 16);
+
+    size_t tableBytes = static_cast<size_t>(numSources) * kSourceEntryBytes;
+    size_t timesOffset = kHeaderBytes + tableBytes;
+    size_t xOffset = timesOffset + numKeyframes * sizeof(double);
+    size_t yOffset = xOffset + numKeyframes * sizeof(float);
+    size_t zOffset = yOffset + numKeyframes * sizeof(float);
+    size_t expected = zOffset + numKeyframes * sizeof(float);
+    if (file.size != expected)
+        throw std::runtime_error("Spatial instructions size mismatch: " + std::to_string(file.size) +
+                                 " bytes, expected " + std::to_string(expected));
+
+    SpatialData d;
+    d.sampleRate = static_cast<int>(sampleRate);
+
+    const uint8_t *table = base + kHeaderBytes;
+    for (uint32_t s = 0; s < numSources; s++) {
+        const uint8_t *entry = table + s * kSourceEntryBytes;
+        const char *namePtr = reinterpret_cast<const char *>(entry);
+        std::string name(namePtr, strnlen(namePtr, kNameBytes));
+        uint64_t first = readValue<uint64_t>(entry + kNameBytes);
+        uint64_t count = readValue<uint64_t>(entry + kNameBytes + 8);
+        if (first > numKeyframes || count > numKeyframes - first)
+            throw std::runtime_error("Keyframe range out of bounds for source " + name);
+
+        std::vector<Keyframe> frames(count);
+        for (uint64_t k = 0; k < count; k++) {
+            uint64_t i = first + k;
+            frames[k].time = readValue<double>(base + timesOffset + i * sizeof(double));
+            frames[k].x = readValue<float>(base + xOffset + i * sizeof(float));
+            frames[k].y = readValue<float>(base + yOffset + i * sizeof(float));
+            frames[k].z = readValue<float>(base + zOffset + i * sizeof(float));
+        }
+        d.sources[name] = std::move(frames);
+    }
+
+    return d;
+}
@@ -0,0 +1,22 @@
+#pragma once
+
+// loads the binary render instructions written by createRenderInfo.py (renderInstructions.bin)
+// same SpatialData as JSONLoader, but the file is mmap'd and the keyframe arrays
+// are copied straight out - no text parsing
+//
+// layout (little-endian, arrays 8-byte aligned):
+//   header      "SPRI", u32 version, u32 sampleRate, u32 numSources, u64 numKeyframes, u64 reserved
+//   sources     numSources x (char name[64], u64 firstKeyframe, u64 keyframeCount)
+//   keyframes   f64 time[numKeyframes], f32 x[...], f32 y[...], f32 z[...]
+
+#include <cstdint>
+#include <string>
+
+#include "JSONLoader.hpp"
+
+class BinaryLoader {
+public:
+    static constexpr uint32_t kVersion = 1;
+
+    static SpatialData loadSpatialInstructions(const std::string &path);
+};
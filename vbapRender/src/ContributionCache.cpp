@@ -0,0 +1,169 @@
+#include "ContributionCache.hpp"
+
+#include <cstring>
+#include <filesystem>
+#include <iostream>
+#include <stdexcept>
+
+namespace fs = std::filesystem;
+
+namespace {
+constexpr size_t kHeaderBytes = 4 + 4 + 4 + 4 + 8 + 8;
+constexpr size_t kFooterBytes = 4 + 8;
+}
+
+ContributionCache::ContributionCache(const std::string &dir) : mDir(dir) {
+    fs::create_directories(mDir);
+}
+
+std::string ContributionCache::pathFor(const std::string &key) const {
+    return (fs::path(mDir) / (key + ".contrib")).string();
+}
+
+std::unique_ptr<ContributionReader> ContributionCache::open(const std::string &key, int numSpeakers, int blockFrames,
+                                                            size_t rangeStart, size_t rangeEnd) const {
+    std::string path = pathFor(key);
+    auto reader = std::make_unique<ContributionReader>();
+    std::ifstream &f = reader->mFile;
+    f.open(path, std::ios::binary);
+    if (!f.good()) return nullptr;
+
+    char magic[4];
+    uint32_t version = 0, speakers = 0, block = 0;
+    uint64_t start = 0, end = 0;
+    f.read(magic, 4);
+    f.read(reinterpret_cast<char *>(&version), 4);
+    f.read(reinterpret_cast<char *>(&speakers), 4);
+    f.read(reinterpret_cast<char *>(&block), 4);
+    f.read(reinterpret_cast<char *>(&start), 8);
+    f.read(reinterpret_cast<char *>(&end), 8);
+    if (!f.good() || std::memcmp(magic, "SPCC", 4) != 0 || version != kVersion ||
+        speakers != static_cast<uint32_t>(numSpeakers) || block != static_cast<uint32_t>(blockFrames) ||
+        start != rangeStart || end != rangeEnd) {
+        std::cerr << "  Ignoring invalid cache entry " << path << "\n";
+        return nullptr;
+    }
+
+    // entries are only renamed into place once complete, a missing footer means the
+    // file was damaged afterwards
+    char footer[4];
+    uint64_t records = 0;
+    f.seekg(-static_cast<std::streamoff>(kFooterBytes), std::ios::end);
+    f.read(footer, 4);
+    f.read(reinterpret_cast<char *>(&records), 8);
+    if (!f.good() || std::memcmp(footer, "SPCE", 4) != 0) {
+        std::cerr << "  Ignoring truncated cache entry " << path << "\n";
+        return nullptr;
+    }
+    f.seekg(static_cast<std::streamoff>(kHeaderBytes), std::ios::beg);
+
+    reader->mPath = path;
+    reader->mNumSpeakers = speakers;
+    reader->mRemaining = records;
+    if (!reader->readRecordHeader()) {
+        std::cerr << "  Ignoring invalid cache entry " << path << "\n";
+        return nullptr;
+    }
+
+    // mark as recently used for LRU eviction
+    std::error_code ec;
+    fs::last_write_time(path, fs::file_time_type::clock::now(), ec);
+    return reader;
+}
+
+std::unique_ptr<ContributionWriter> ContributionCache::create(const std::string &key, int numSpeakers, int blockFrames,
+                                                              size_t rangeStart, size_t rangeEnd) const {
+    auto writer = std::make_unique<ContributionWriter>();
+    writer->mPath = pathFor(key);
+    writer->mTmpPath = writer->mPath + ".tmp";
+    std::ofstream &f = writer->mFile;
+    f.open(writer->mTmpPath, std::ios::binary);
+    if (!f.good()) throw std::runtime_error("Cannot write cache entry " + writer->mTmpPath);
+
+    uint32_t version = kVersion, speakers = numSpeakers, block = blockFrames;
+    uint64_t start = rangeStart, end = rangeEnd;
+    f.write("SPCC", 4);
+    f.write(reinterpret_cast<const char *>(&version), 4);
+    f.write(reinterpret_cast<const char *>(&speakers), 4);
+    f.write(reinterpret_cast<const char *>(&block), 4);
+    f.write(reinterpret_cast<const char *>(&start), 8);
+    f.write(reinterpret_cast<const char *>(&end), 8);
+    return writer;
+}
+
+bool ContributionReader::readRecordHeader() {
+    mHasRecord = false;
+    if (mRemaining == 0) return true;
+
+    uint32_t numChannels = 0;
+    mFile.read(reinterpret_cast<char *>(&mBlockStart), 8);
+    mFile.read(reinterpret_cast<char *>(&mBlockLen), 4);
+    mFile.read(reinterpret_cast<char *>(&numChannels), 4);
+    if (!mFile.good() || numChannels > mNumSpeakers) return false;
+    mChannels.resize(numChannels);
+    mFile.read(reinterpret_cast<char *>(mChannels.data()), static_cast<std::streamsize>(numChannels * sizeof(uint32_t)));
+    for (uint32_t ch : mChannels) {
+        if (ch >= mNumSpeakers) return false;
+    }
+    mRemaining--;
+    mHasRecord = mFile.good();
+    return mHasRecord;
+}
+
+void ContributionReader::addBlock(size_t blockStart, BlockMix &mix) {
+    while (mHasRecord && mBlockStart <= blockStart) {
+        size_t count = (size_t)mChannels.size() * mBlockLen;
+        mSamples.resize(count);
+        mFile.read(reinterpret_cast<char *>(mSamples.data()), static_cast<std::streamsize>(count * sizeof(float)));
+        if (!mFile.good()) throw std::runtime_error("Failed reading cache entry " + mPath);
+
+        // records before blockStart only show up if blocks were skipped, they're dropped
+        if (mBlockStart == blockStart) {
+            for (size_t k = 0; k < mChannels.size(); k++) {
+                mix.addSamples(static_cast<int>(mChannels[k]), mSamples.data() + k * mBlockLen, mBlockLen);
+            }
+        }
+        if (!readRecordHeader()) throw std::runtime_error("Failed reading cache entry " + mPath);
+    }
+}
+
+void ContributionWriter::writeBlock(size_t blockStart, size_t blockLen, const BlockMix &mix) {
+    mChannels.clear();
+    for (int ch : mix.touched()) {
+        const float *buf = mix.channel(ch);
+        bool silent = true;
+        for (size_t i = 0; i < blockLen && silent; i++) silent = (buf[i] == 0.0f);
+        if (!silent) mChannels.push_back(static_cast<uint32_t>(ch));
+    }
+    if (mChannels.empty()) return;
+
+    uint64_t start = blockStart;
+    uint32_t len = static_cast<uint32_t>(blockLen);
+    uint32_t numChannels = static_cast<uint32_t>(mChannels.size());
+    mFile.write(reinterpret_cast<const char *>(&start), 8);
+    mFile.write(reinterpret_cast<const char *>(&len), 4);
+    mFile.write(reinterpret_cast<const char *>(&numChannels), 4);
+    mFile.write(reinterpret_cast<const char *>(mChannels.data()), static_cast<std::streamsize>(numChannels * sizeof(uint32_t)));
+    for (uint32_t ch : mChannels) {
+        mFile.write(reinterpret_cast<const char *>(mix.channel(static_cast<int>(ch))),
+                    static_cast<std::streamsize>(blockLen * sizeof(float)));
+    }
+    mRecords++;
+}
+
+void ContributionWriter::commit() {
+    mFile.write("SPCE", 4);
+    mFile.write(reinterpret_cast<const char *>(&mRecords), 8);
+    mFile.close();
+    if (mFile.fail()) throw std::runtime_error("Failed writing cache entry " + mTmpPath);
+    fs::rename(mTmpPath, mPath);
+    mCommitted = true;
+}
+
+ContributionWriter::~ContributionWriter() {
+    if (!mCommitted) {
+        mFile.close();
+        std::error_code ec;
+        fs::remove(mTmpPath, ec);
+    }
+}
@@ -0,0 +1,87 @@
+#pragma once
+
+// per-source contribution cache for incremental renders (--cache-dir / --source-keys)
+//
+// VBAP is linear per source, so the mix is the sum of each source rendered alone.
+// a contribution is kept on the renderer's 512-frame block grid: only blocks where the
+// source has signal get a record, and a record only holds the speakers that block
+// reached (three, up to six while the source crosses into another triplet). an object
+// playing for a minute of a two hour programme costs a minute of three channels, not
+// two hours of every speaker it ever visited. records are in time order so a render
+// reads an entry front to back alongside the timeline, one block at a time.
+//
+// entries are <cache-dir>/<key>.contrib where the key is the fingerprint createRender.py
+// computed from the source audio, keyframes, layout and sample rate. hits refresh the
+// file time so the python side can evict least recently used entries.
+//
+// file layout (little-endian): "SPCC", u32 version, u32 numSpeakers, u32 blockFrames,
+// u64 rangeStart, u64 rangeEnd, then per record u64 blockStart, u32 blockLen,
+// u32 numChannels, u32 channel[numChannels], f32 samples[numChannels][blockLen],
+// and the footer "SPCE", u64 number of records
+
+#include <cstdint>
+#include <fstream>
+#include <memory>
+#include <string>
+#include <vector>
+
+#include "GainMixer.hpp"
+
+// reads one cached contribution block by block
+class ContributionReader {
+public:
+    // add the cached samples of the block starting at blockStart into mix (nothing if the
+    // source was silent there). blocks must be asked for in time order
+    void addBlock(size_t blockStart, BlockMix &mix);
+
+private:
+    friend class ContributionCache;
+    bool readRecordHeader();
+
+    std::ifstream mFile;
+    std::string mPath;
+    uint32_t mNumSpeakers = 0;
+    uint64_t mRemaining = 0;            // records after the current one
+    bool mHasRecord = false;
+    uint64_t mBlockStart = 0;           // current record
+    uint32_t mBlockLen = 0;
+    std::vector<uint32_t> mChannels;
+    std::vector<float> mSamples;
+};
+
+// writes one contribution block by block to a temporary file, moved under its key by
+// commit() so an interrupted render never leaves a truncated entry behind
+class ContributionWriter {
+public:
+    ~ContributionWriter();
+
+    // append the speakers the block reached (channels that came out all zero are left out)
+    void writeBlock(size_t blockStart, size_t blockLen, const BlockMix &mix);
+    void commit();
+
+private:
+    friend class ContributionCache;
+
+    std::ofstream mFile;
+    std::string mPath, mTmpPath;
+    uint64_t mRecords = 0;
+    bool mCommitted = false;
+    std::vector<uint32_t> mChannels;
+};
+
+class ContributionCache {
+public:
+    static constexpr uint32_t kVersion = 2;
+
+    explicit ContributionCache(const std::string &dir);
+
+    // nullptr on a miss or an unreadable / mismatched entry
+    std::unique_ptr<ContributionReader> open(const std::string &key, int numSpeakers, int blockFrames,
+                                             size_t rangeStart, size_t rangeEnd) const;
+    std::unique_ptr<ContributionWriter> create(const std::string &key, int numSpeakers, int blockFrames,
+                                               size_t rangeStart, size_t rangeEnd) const;
+
+private:
+    std::string mDir;
+    std::string pathFor(const std::string &key) const;
+};
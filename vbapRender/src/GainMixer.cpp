@@ -0,0 +1,67 @@
+#include "GainMixer.hpp"
+#include <algorithm>
+
+void mixGain(float *out, const float *samples, size_t n, float g0, float g1) {
+    if (g0 == g1) {
+        for (size_t i = 0; i < n; i++) {
+            out[i] += g1 * samples[i];
+        }
+        return;
+    }
+    // int counter: int -> float converts vectorise, size_t -> float doesn't on x86
+    const int count = (int)n;
+    const float step = (g1 - g0) / (float)count;
+    for (int i = 0; i < count; i++) {
+        out[i] += (g0 + step * (float)(i + 1)) * samples[i];
+    }
+}
+
+BlockMix::BlockMix(int numSpeakers, int blockSize)
+    : mBlockSize(blockSize),
+      mData((size_t)numSpeakers * blockSize, 0.0f),
+      mIsTouched(numSpeakers, 0) {
+    mTouched.reserve(numSpeakers);
+}
+
+void BlockMix::clear() {
+    for (int speaker : mTouched) {
+        std::fill_n(mData.data() + (size_t)speaker * mBlockSize, mBlockSize, 0.0f);
+        mIsTouched[speaker] = 0;
+    }
+    mTouched.clear();
+}
+
+float *BlockMix::touch(int speaker) {
+    if (!mIsTouched[speaker]) {
+        mIsTouched[speaker] = 1;
+        mTouched.push_back(speaker);
+    }
+    return mData.data() + (size_t)speaker * mBlockSize;
+}
+
+void BlockMix::add(const SpeakerGains &from, const SpeakerGains &to, const float *samples, size_t n) {
+    // a handful of entries each, linear lookups are cheapest
+    auto gainIn = [](const SpeakerGains &gains, int speaker) {
+        for (auto &g : gains) {
+            if (g.speaker == speaker) return g.gain;
+        }
+        return 0.0f;
+    };
+
+    for (auto &g : to) {
+        mixGain(touch(g.speaker), samples, n, gainIn(from, g.speaker), g.gain);
+    }
+    // speakers the source is leaving fade out
+    for (auto &g : from) {
+        if (gainIn(to, g.speaker) == 0.0f) {
+            mixGain(touch(g.speaker), samples, n, g.gain, 0.0f);
+        }
+    }
+}
+
+void BlockMix::addSamples(int speaker, const float *samples, size_t n) {
+    float *out = touch(speaker);
+    for (size_t i = 0; i < n; i++) {
+        out[i] += samples[i];
+    }
+}
@@ -0,0 +1,52 @@
+#pragma once
+
+// sparse gain-matrix mixing for VBAPRenderer
+//
+// a VBAP pan only drives the three speakers of one triplet (up to six in the block where
+// a source crosses into another triplet and both sets ramp). so instead of rendering
+// every source into an AudioIOData and copying all speaker channels out per block,
+// sources are mixed with their gains straight into a planar block buffer, and only the
+// speaker channels some source reached are cleared and summed afterwards.
+//
+// gains ramp linearly across each block from the previous block's gains, so moving
+// sources don't step at block boundaries. constant gains use a plain multiply-add, the
+// inner loops are contiguous and branch free so the compiler can vectorise them.
+
+#include <cstddef>
+#include <vector>
+
+struct SpeakerGain {
+    int speaker;
+    float gain;
+};
+using SpeakerGains = std::vector<SpeakerGain>;
+
+// out[i] += samples[i] * gain, with gain ramped linearly from g0 to reach g1 on the last sample
+void mixGain(float *out, const float *samples, size_t n, float g0, float g1);
+
+class BlockMix {
+public:
+    BlockMix(int numSpeakers, int blockSize);
+
+    // zero the channels the previous block touched
+    void clear();
+
+    // mix samples[0 .. n) in, ramping each speaker from its gain in `from` to its gain in
+    // `to` (a speaker missing on one side has gain 0 there)
+    void add(const SpeakerGains &from, const SpeakerGains &to, const float *samples, size_t n);
+
+    // add already panned samples (a cached contribution) to one speaker
+    void addSamples(int speaker, const float *samples, size_t n);
+
+    // speakers with signal this block, in the order they were first reached
+    const std::vector<int> &touched() const { return mTouched; }
+    const float *channel(int speaker) const { return mData.data() + (size_t)speaker * mBlockSize; }
+
+private:
+    float *touch(int speaker);
+
+    int mBlockSize;
+    std::vector<float> mData;       // [speaker][frame]
+    std::vector<char> mIsTouched;
+    std::vector<int> mTouched;
+};
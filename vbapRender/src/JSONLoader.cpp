@@ -31,3 +31,31 @@ SpatialData JSONLoader::loadSpatialInstructions(const std::string &path) {
 
     return d;
 }
+
+std::map<std::string, int> JSONLoader::loadChannelMap(const std::string &path) {
+    std::ifstream f(path);
+    if (!f.good()) throw std::runtime_error("Cannot open channel map JSON");
+
+    json j;
+    f >> j;
+
+    std::map<std::string, int> channelMap;
+    for (auto &[name, channel] : j.items()) {
+        channelMap[name] = channel.get<int>();
+    }
+    return channelMap;
+}
+
+std::map<std::string, std::string> JSONLoader::loadSourceKeys(const std::string &path) {
+    std::ifstream f(path);
+    if (!f.good()) throw std::runtime_error("Cannot open source keys JSON");
+
+    json j;
+    f >> j;
+
+    std::map<std::string, std::string> keys;
+    for (auto &[name, key] : j.items()) {
+        keys[name] = key.get<std::string>();
+    }
+    return keys;
+}
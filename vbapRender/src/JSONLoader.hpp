@@ -17,4 +17,10 @@ struct SpatialData {
 class JSONLoader {
 public:
     static SpatialData loadSpatialInstructions(const std::string &path);
+
+    // {"src_N": channelIndex, ...} - 0-based channels of the interleaved source WAV
+    static std::map<std::string, int> loadChannelMap(const std::string &path);
+
+    // {"src_N": "fingerprint", ...} - cache keys for incremental renders
+    static std::map<std::string, std::string> loadSourceKeys(const std::string &path);
 };
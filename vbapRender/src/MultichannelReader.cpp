@@ -0,0 +1,194 @@
+#include "MultichannelReader.hpp"
+
+#include <cstring>
+#include <stdexcept>
+
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+namespace {
+
+constexpr uint16_t kFormatPCM = 0x0001;
+constexpr uint16_t kFormatFloat = 0x0003;
+constexpr uint16_t kFormatExtensible = 0xFFFE;
+
+template <typename T>
+T readValue(const uint8_t *p) {
+    T v;
+    std::memcpy(&v, p, sizeof(T));
+    return v;
+}
+
+// one converter per sample format so the inner loop has no per-sample switch.
+// frame-major: the interleaved source is read once, front to back, and each frame is
+// scattered to the channels' destinations (one write stream per channel)
+template <typename Convert>
+void deinterleave(const uint8_t *data, int blockAlign, int bytesPerSample,
+                  uint64_t start, size_t count,
+                  const std::vector<int> &channels, const std::vector<float *> &dest,
+                  Convert convert) {
+    const size_t numChannels = channels.size();
+    std::vector<size_t> offsets(numChannels);
+    for (size_t c = 0; c < numChannels; c++)
+        offsets[c] = static_cast<size_t>(channels[c]) * bytesPerSample;
+
+    const uint8_t *frame = data + start * blockAlign;
+    for (size_t f = 0; f < count; f++) {
+        for (size_t c = 0; c < numChannels; c++)
+            dest[c][f] = convert(frame + offsets[c]);
+        frame += blockAlign;
+    }
+}
+
+} // namespace
+
+MultichannelReader::MultichannelReader(const std::string &path) : mPath(path) {
+    mFd = open(path.c_str(), O_RDONLY);
+    if (mFd < 0) throw std::runtime_error("Cannot open source WAV: " + path);
+
+    struct stat st;
+    if (fstat(mFd, &st) != 0) {
+        release();
+        throw std::runtime_error("Cannot stat source WAV: " + path);
+    }
+    mMapSize = static_cast<size_t>(st.st_size);
+    if (mMapSize < 12) {
+        release();
+        throw std::runtime_error("Source WAV too small: " + path);
+    }
+
+    mMap = mmap(nullptr, mMapSize, PROT_READ, MAP_PRIVATE, mFd, 0);
+    if (mMap == MAP_FAILED) {
+        mMap = nullptr;
+        release();
+        throw std::runtime_error("Cannot mmap source WAV: " + path);
+    }
+    // sequential block reads, let the kernel read ahead
+    madvise(mMap, mMapSize, MADV_SEQUENTIAL);
+
+    const uint8_t *base = static_cast<const uint8_t *>(mMap);
+    bool riff = std::memcmp(base, "RIFF", 4) == 0;
+    bool rf64 = std::memcmp(base, "RF64", 4) == 0 || std::memcmp(base, "BW64", 4) == 0;
+    if ((!riff && !rf64) || std::memcmp(base + 8, "WAVE", 4) != 0) {
+        release();
+        throw std::runtime_error("Not a RIFF/RF64/BW64 WAVE file: " + path);
+    }
+
+    uint64_t ds64DataSize = 0;
+    const uint8_t *fmt = nullptr;
+    uint32_t fmtSize = 0;
+    uint64_t dataOffset = 0, dataSize = 0;
+    bool haveData = false;
+
+    uint64_t pos = 12;
+    while (pos + 8 <= mMapSize) {
+        const uint8_t *id = base + pos;
+        uint64_t size = readValue<uint32_t>(base + pos + 4);
+        uint64_t offset = pos + 8;
+
+        if (std::memcmp(id, "ds64", 4) == 0 && size >= 16) {
+            ds64DataSize = readValue<uint64_t>(base + offset + 8);
+        } else if (size == 0xFFFFFFFFull && std::memcmp(id, "data", 4) == 0) {
+            size = ds64DataSize ? ds64DataSize : mMapSize - offset;
+        }
+        // truncated files can claim more data than exists
+        if (size > mMapSize - offset) size = mMapSize - offset;
+
+        if (std::memcmp(id, "fmt ", 4) == 0 && !fmt) {
+            fmt = base + offset;
+            fmtSize = static_cast<uint32_t>(size);
+        } else if (std::memcmp(id, "data", 4) == 0 && !haveData) {
+            dataOffset = offset;
+            dataSize = size;
+            haveData = true;
+        }
+        pos = offset + size + (size & 1);
+    }
+
+    if (!fmt || fmtSize < 16 || !haveData) {
+        release();
+        throw std::runtime_error("Missing fmt or data chunk in " + path);
+    }
+
+    uint16_t formatTag = readValue<uint16_t>(fmt);
+    mChannels = readValue<uint16_t>(fmt + 2);
+    mSampleRate = static_cast<int>(readValue<uint32_t>(fmt + 4));
+    mBlockAlign = readValue<uint16_t>(fmt + 12);
+    int bits = readValue<uint16_t>(fmt + 14);
+    if (formatTag == kFormatExtensible && fmtSize >= 26) formatTag = readValue<uint16_t>(fmt + 24);
+
+    if (formatTag == kFormatPCM && bits == 8) mFormat = SampleFormat::U8;
+    else if (formatTag == kFormatPCM && bits == 16) mFormat = SampleFormat::I16;
+    else if (formatTag == kFormatPCM && bits == 24) mFormat = SampleFormat::I24;
+    else if (formatTag == kFormatPCM && bits == 32) mFormat = SampleFormat::I32;
+    else if (formatTag == kFormatFloat && bits == 32) mFormat = SampleFormat::F32;
+    else if (formatTag == kFormatFloat && bits == 64) mFormat = SampleFormat::F64;
+    else {
+        release();
+        throw std::runtime_error("Unsupported sample format in " + path + " (only integer and float PCM)");
+    }
+
+    mBytesPerSample = bits / 8;
+    if (mChannels <= 0 || mBlockAlign < mChannels * mBytesPerSample) {
+        release();
+        throw std::runtime_error("Invalid fmt chunk in " + path);
+    }
+    mData = base + dataOffset;
+    mFrames = dataSize / mBlockAlign;
+}
+
+MultichannelReader::~MultichannelReader() {
+    release();
+}
+
+void MultichannelReader::release() {
+    if (mMap) munmap(mMap, mMapSize);
+    if (mFd >= 0) close(mFd);
+    mMap = nullptr;
+    mFd = -1;
+}
+
+size_t MultichannelReader::readChannels(uint64_t start, size_t count,
+                                        const std::vector<int> &channels,
+                                        const std::vector<float *> &dest) const {
+    if (start >= mFrames) return 0;
+    if (count > mFrames - start) count = static_cast<size_t>(mFrames - start);
+    for (int ch : channels) {
+        if (ch < 0 || ch >= mChannels)
+            throw std::runtime_error("Channel " + std::to_string(ch) + " out of range in " + mPath);
+    }
+
+    switch (mFormat) {
+    case SampleFormat::U8:
+        deinterleave(mData, mBlockAlign, mBytesPerSample, start, count, channels, dest,
+                     [](const uint8_t *p) { return (static_cast<float>(*p) - 128.0f) * (1.0f / 0x80); });
+        break;
+    case SampleFormat::I16:
+        deinterleave(mData, mBlockAlign, mBytesPerSample, start, count, channels, dest,
+                     [](const uint8_t *p) { return readValue<int16_t>(p) * (1.0f / 0x8000); });
+        break;
+    case SampleFormat::I24:
+        deinterleave(mData, mBlockAlign, mBytesPerSample, start, count, channels, dest,
+                     [](const uint8_t *p) {
+                         // little-endian 24-bit, the top byte carries the sign
+                         int32_t v = p[0] | (p[1] << 8) | (static_cast<int8_t>(p[2]) * 65536);
+                         return static_cast<float>(v) * (1.0f / 0x800000);
+                     });
+        break;
+    case SampleFormat::I32:
+        deinterleave(mData, mBlockAlign, mBytesPerSample, start, count, channels, dest,
+                     [](const uint8_t *p) { return static_cast<float>(readValue<int32_t>(p)) * (1.0f / 0x80000000u); });
+        break;
+    case SampleFormat::F32:
+        deinterleave(mData, mBlockAlign, mBytesPerSample, start, count, channels, dest,
+                     [](const uint8_t *p) { return readValue<float>(p); });
+        break;
+    case SampleFormat::F64:
+        deinterleave(mData, mBlockAlign, mBytesPerSample, start, count, channels, dest,
+                     [](const uint8_t *p) { return static_cast<float>(readValue<double>(p)); });
+        break;
+    }
+    return count;
+}
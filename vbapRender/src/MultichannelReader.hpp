@@ -0,0 +1,49 @@
+#pragma once
+
+// reader for the interleaved ADM master (RIFF/WAVE, RF64 and BW64) used by --source-wav
+//
+// libsndfile doesn't recognise BW64, so the chunk table is walked here (same rules as
+// src/bw64Reader.py: ds64 sizes for RF64/BW64, even-byte padding, WAVE_FORMAT_EXTENSIBLE)
+// and the file is mmap'd read-only. readChannels converts just the requested channels
+// of a frame range to float, scaled like libsndfile's float reads.
+
+#include <cstdint>
+#include <string>
+#include <vector>
+
+class MultichannelReader {
+public:
+    explicit MultichannelReader(const std::string &path);
+    ~MultichannelReader();
+
+    MultichannelReader(const MultichannelReader &) = delete;
+    MultichannelReader &operator=(const MultichannelReader &) = delete;
+
+    int sampleRate() const { return mSampleRate; }
+    int channels() const { return mChannels; }
+    uint64_t frames() const { return mFrames; }
+
+    // deinterleave frames [start, start + count) of channels[i] into dest[i][0 .. count)
+    // returns the number of frames read (less than count at the end of the file)
+    size_t readChannels(uint64_t start, size_t count,
+                        const std::vector<int> &channels,
+                        const std::vector<float *> &dest) const;
+
+private:
+    void release();
+
+    enum class SampleFormat { U8, I16, I24, I32, F32, F64 };
+
+    std::string mPath;
+    int mFd = -1;
+    void *mMap = nullptr;
+    size_t mMapSize = 0;
+
+    const uint8_t *mData = nullptr;
+    uint64_t mFrames = 0;
+    int mChannels = 0;
+    int mSampleRate = 0;
+    int mBlockAlign = 0;
+    int mBytesPerSample = 0;
+    SampleFormat mFormat = SampleFormat::I16;
+};
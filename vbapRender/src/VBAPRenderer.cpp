@@ -1,6 +1,14 @@
 #include "VBAPRenderer.hpp"
 #include <cmath>
+#include <condition_variable>
+#include <exception>
+#include <functional>
 #include <iostream>
+#include <limits>
+#include <memory>
+#include <mutex>
+#include <thread>
+#include <utility>
 
 VBAPRenderer::VBAPRenderer(const SpeakerLayoutData &layout,
                            const SpatialData &spatial,
@@ -42,23 +50,27 @@ VBAPRenderer::VBAPRenderer(const SpeakerLayoutData &layout,
     mVBAP.compile();
 }
 
-al::Vec3f VBAPRenderer::interpolateDir(const std::vector<Keyframe> &kfs, double t) {
+al::Vec3f VBAPRenderer::interpolateDir(const std::vector<Keyframe> &kfs, double t, size_t &cursor) const {
     // linear interpolation between keyframes for smooth spatial motion
     // takes time in seconds and returns normalized direction vector
+    //
+    // cursor is the keyframe segment of the previous lookup. blocks come in time order so
+    // it only ever moves forward, one lookup is O(1) amortised instead of a scan from 0.
+    // before the first / after the last keyframe the nearest keyframe holds
     
-    if (kfs.size() == 1) {
+    if (kfs.size() == 1 || t <= kfs.front().time) {
         return al::Vec3f(kfs[0].x, kfs[0].y, kfs[0].z).normalize();
     }
-
-    Keyframe k1, k2;
-    for (int i = 0; i < kfs.size() - 1; i++) {
-        if (t >= kfs[i].time && t <= kfs[i+1].time) {
-            k1 = kfs[i];
-            k2 = kfs[i+1];
-            break;
-        }
+    if (t >= kfs.back().time) {
+        return al::Vec3f(kfs.back().x, kfs.back().y, kfs.back().z).normalize();
     }
 
+    if (cursor + 1 >= kfs.size() || t < kfs[cursor].time) cursor = 0;  // went back in time
+    while (t > kfs[cursor + 1].time) cursor++;
+
+    const Keyframe &k1 = kfs[cursor];
+    const Keyframe &k2 = kfs[cursor + 1];
+
     double u = (t - k1.time) / (k2.time - k1.time);
     al::Vec3f v(
         (1-u)*k1.x + u*k2.x,
@@ -69,87 +81,396 @@ al::Vec3f VBAPRenderer::interpolateDir(const std::vector<Keyframe> &kfs, double
     return v;
 }
 
-MultiWavData VBAPRenderer::render() {
-    int sr = mSpatial.sampleRate;
-    int numSpeakers = mLayout.speakers.size();
+void VBAPRenderer::updateGains(GainCache &cache, const al::Vec3f &dir, al::Vbap &vbap,
+                               al::AudioIOData &impulseIO, uint64_t &updates) const {
+    // static sources (DirectSpeakers beds, parked objects) keep their gains, the triplet
+    // search only runs again once the direction changed. the match is exact, not within a
+    // tolerance: the gains stay a function of the direction alone, so a segment or an
+    // incremental render gets the same gains as a full render whatever it rendered before
+    if (cache.valid && dir[0] == cache.dir[0] && dir[1] == cache.dir[1] && dir[2] == cache.dir[2]) return;
+
+    // renderBuffer of a unit impulse gives each speaker's gain for this direction,
+    // whatever triplet search and normalisation AlloLib does
+    float impulse = 1.0f;
+    impulseIO.zeroOut();
+    vbap.renderBuffer(impulseIO, dir, &impulse, 1);
+    impulseIO.frame(0);
+    cache.gains.clear();
+    for (int ch = 0; ch < impulseIO.channelsOut(); ch++) {
+        float g = impulseIO.out(ch, 0);
+        if (g != 0.0f) cache.gains.push_back({ch, g});
+    }
+    cache.dir = dir;
+    cache.valid = true;
+    updates++;
+}
+
+void VBAPRenderer::panBlock(PanState &pan, const std::vector<Keyframe> &kfs, size_t blockStart,
+                            al::Vbap &vbap, al::AudioIOData &impulseIO,
+                            BlockMix &mix, const float *samples, size_t numFrames) const {
+    double sr = mSpatial.sampleRate;
+
+    // the block ramps from the gains of the previous grid block's direction to this one's.
+    // `to` of the block just before is exactly that, otherwise (first block, skipped
+    // silent block, segment start) it is computed for blockStart - kBlockFrames
+    if (pan.to.valid && pan.lastBlockStart + kBlockFrames == blockStart) {
+        std::swap(pan.from, pan.to);
+    } else {
+        size_t prevStart = blockStart >= kBlockFrames ? blockStart - kBlockFrames : blockStart;
+        updateGains(pan.from, interpolateDir(kfs, prevStart / sr, pan.cursor), vbap, impulseIO, pan.updates);
+    }
+    updateGains(pan.to, interpolateDir(kfs, blockStart / sr, pan.cursor), vbap, impulseIO, pan.updates);
+    pan.lastBlockStart = blockStart;
 
-    size_t totalSamples = 0;
+    mix.add(pan.from.gains, pan.to.gains, samples, numFrames);
+    pan.blocks++;
+}
+
+size_t VBAPRenderer::totalSamples() const {
+    size_t total = 0;
     for (auto &[name, wav] : mSources) {
-        totalSamples = std::max(totalSamples, wav.samples.size());
+        total = std::max(total, (size_t)(wav.startFrame + wav.samples.size()));
+    }
+    return total;
+}
+
+void VBAPRenderer::setRange(size_t startFrame, size_t endFrame) {
+    // directions are evaluated once per 512-frame block from frame 0, so a range starting
+    // on that grid renders exactly the same samples as the full timeline
+    if (startFrame % 512 != 0) {
+        std::cerr << "Warning: --start " << startFrame << " is not a multiple of 512, "
+                  << "segment seams will not match a full render exactly\n";
+    }
+    mRangeStart = startFrame;
+    mRangeEnd = endFrame;
+}
+
+bool VBAPRenderer::isSilent(const MonoWavData &src, size_t blockStart, size_t blockLen) const {
+    // peak scan straight on the source samples, before anything is copied. only exact
+    // digital silence counts so skipping never changes the output
+    size_t begin = std::max<size_t>(blockStart, src.startFrame);
+    size_t end = std::min<size_t>(blockStart + blockLen, src.startFrame + src.samples.size());
+    if (begin >= end) return true;  // no samples in this block
+    const float *data = src.samples.data() + (begin - src.startFrame);
+    float peak = 0.0f;
+    for (size_t i = 0; i < end - begin; i++) {
+        peak = std::max(peak, std::fabs(data[i]));
     }
+    return peak == 0.0f;
+}
 
-    std::cout << "Rendering " << totalSamples << " samples (" 
-              << (double)totalSamples / sr << " sec) to " 
-              << numSpeakers << " speakers from " << mSources.size() << " sources\n";
+void VBAPRenderer::fillSourceBuffer(const MonoWavData &src, size_t blockStart, size_t blockLen, float *buffer) const {
+    for (size_t i = 0; i < blockLen; i++) {
+        size_t globalIdx = blockStart + i;
+        size_t localIdx = globalIdx - src.startFrame;
+        buffer[i] = (globalIdx >= src.startFrame && localIdx < src.samples.size()) ? src.samples[localIdx] : 0.0f;
+    }
+}
 
-    // output uses consecutive channels 0 to numSpeakers-1
-    // this is simpler than trying to maintain the AlloSphere hardware channel gaps
-    // if you need to remap to hardware channels later just create a channel routing map
-    MultiWavData out;
-    out.sampleRate = sr;
-    out.channels = numSpeakers;
-    out.samples.resize(numSpeakers);
-    for (auto &c : out.samples) c.resize(totalSamples, 0.0f);
+namespace {
 
+// hands blocks to the mix threads of renderWindows and waits until every thread is done
+// with the current one. the threads live for the whole render, one wake-up per block.
+// an exception in a mix thread is kept and rethrown on the render thread by wait()
+class BlockDispatcher {
+public:
+    // render thread: wake the mix threads for the next block
+    void start(int threads) {
+        std::lock_guard<std::mutex> lock(mMutex);
+        mPending = threads;
+        mGeneration++;
+        mStart.notify_all();
+    }
+
+    // render thread: block until every mix thread called finished()
+    void wait() {
+        std::unique_lock<std::mutex> lock(mMutex);
+        mDone.wait(lock, [this] { return mPending == 0; });
+        if (mError) std::rethrow_exception(std::exchange(mError, nullptr));
+    }
+
+    void stop() {
+        std::lock_guard<std::mutex> lock(mMutex);
+        mStopping = true;
+        mGeneration++;
+        mStart.notify_all();
+    }
+
+    // mix thread: wait for the next block, false once the render is over
+    bool next(uint64_t &seen) {
+        std::unique_lock<std::mutex> lock(mMutex);
+        mStart.wait(lock, [&] { return mGeneration != seen; });
+        seen = mGeneration;
+        return !mStopping;
+    }
+
+    // mix thread: done with the block, error is set if mixing it threw
+    void finished(std::exception_ptr error = nullptr) {
+        std::lock_guard<std::mutex> lock(mMutex);
+        if (error && !mError) mError = error;
+        if (--mPending == 0) mDone.notify_one();
+    }
+
+private:
+    std::mutex mMutex;
+    std::condition_variable mStart, mDone;
+    uint64_t mGeneration = 0;
+    int mPending = 0;
+    bool mStopping = false;
+    std::exception_ptr mError;
+};
+
+// stops and joins the mix threads however renderWindows is left. an exception from a
+// window callback or the cache (full disk, damaged entry) would otherwise unwind past
+// joinable std::threads, which is std::terminate instead of an error message
+class HelperGuard {
+public:
+    HelperGuard(BlockDispatcher &dispatcher, std::vector<std::thread> &helpers)
+        : mDispatcher(dispatcher), mHelpers(helpers) {}
+    ~HelperGuard() { join(); }
+
+    void join() {
+        mDispatcher.stop();
+        for (auto &helper : mHelpers) {
+            if (helper.joinable()) helper.join();
+        }
+    }
+
+private:
+    BlockDispatcher &mDispatcher;
+    std::vector<std::thread> &mHelpers;
+};
+
+}  // namespace
+
+void VBAPRenderer::setThreads(int threads) {
+    mThreads = std::max(1, threads);
+}
+
+static void setupAudioIO(al::AudioIOData &audioIO, int numSpeakers, int sr, int frames) {
     // CRITICAL: must call framesPerBuffer BEFORE channelsOut
     // otherwise AudioIOData throws assertion failures about buffer size not being set
     // the AlloLib API is picky about initialization order
-    const int bufferSize = 512;
-    al::AudioIOData audioIO;
-    audioIO.framesPerBuffer(bufferSize);
+    audioIO.framesPerBuffer(frames);
     audioIO.framesPerSecond(sr);
     audioIO.channelsIn(0);
     audioIO.channelsOut(numSpeakers);
-    
-    std::vector<float> sourceBuffer(bufferSize);
-    
-    int blocksProcessed = 0;
-    for (size_t blockStart = 0; blockStart < totalSamples; blockStart += bufferSize) {
-        size_t blockEnd = std::min(totalSamples, blockStart + bufferSize);
-        size_t blockLen = blockEnd - blockStart;
-        
-        if (blocksProcessed % 1000 == 0) {
-            std::cout << "  Block " << blocksProcessed << " (" 
-                      << (int)(100.0 * blockStart / totalSamples) << "%)\n" << std::flush;
+}
+
+VBAPRenderer::MixLane::MixLane(int numSpeakers, int sr, int bufferSize)
+    : mix(numSpeakers, bufferSize), scratch(numSpeakers, bufferSize), sourceBuffer(bufferSize) {
+    setupAudioIO(impulseIO, numSpeakers, sr, 1);
+}
+
+void VBAPRenderer::mixBlock(MixLane &lane, size_t blockStart, size_t blockLen) {
+    // zero out the speakers of the last block before accumulating sources
+    lane.mix.clear();
+
+    for (auto &slot : lane.sources) {
+        // incremental: an unchanged source's contribution is summed straight from the cache
+        if (slot.cached) {
+            slot.cached->addBlock(blockStart, lane.mix);
+            continue;
+        }
+
+        // most objects are silent between cues, nothing to copy or pan
+        if (isSilent(*slot.src, blockStart, blockLen)) {
+            slot.pan.skipped++;
+            continue;
+        }
+
+        // copy source samples into buffer for this block
+        fillSourceBuffer(*slot.src, blockStart, blockLen, lane.sourceBuffer.data());
+
+        // spatial direction for this source at current time, then its VBAP gains
+        // (best speaker triplet for the direction) applied to the block
+        // this accumulates into the lane's mix so multiple sources can overlap
+        if (!slot.store) {
+            panBlock(slot.pan, *slot.kfs, blockStart, *lane.vbap, lane.impulseIO,
+                     lane.mix, lane.sourceBuffer.data(), blockLen);
+            continue;
         }
-        blocksProcessed++;
-        
-        // zero out the audio buffer before accumulating sources
-        // VBAP uses += to accumulate multiple sources into the same speakers
-        audioIO.zeroOut();
-        
-        int sourceIdx = 0;
-        for (auto &[name, kfs] : mSpatial.sources) {
-            const MonoWavData &src = mSources.at(name);
-            
-            // copy source samples into buffer for this block
-            for (size_t i = 0; i < blockLen; i++) {
-                size_t globalIdx = blockStart + i;
-                sourceBuffer[i] = (globalIdx < src.samples.size()) ? src.samples[globalIdx] : 0.0f;
+
+        // incremental: panned on its own so the block can be cached, then summed exactly
+        // like a cached block would be. same result as panning into the mix because mixGain's
+        // multiply-add is never fused (-ffp-contract=off in CMakeLists.txt)
+        lane.scratch.clear();
+        panBlock(slot.pan, *slot.kfs, blockStart, *lane.vbap, lane.impulseIO,
+                 lane.scratch, lane.sourceBuffer.data(), blockLen);
+        slot.store->writeBlock(blockStart, blockLen, lane.scratch);
+        for (int ch : lane.scratch.touched()) {
+            lane.mix.addSamples(ch, lane.scratch.channel(ch), blockLen);
+        }
+    }
+}
+
+void VBAPRenderer::renderWindows(size_t rangeStart, size_t rangeEnd, size_t windowFrames,
+                                 const std::function<float *(size_t, size_t)> &beginWindow,
+                                 const std::function<void(size_t, size_t)> &endWindow,
+                                 const CacheRef *cache) {
+    int sr = mSpatial.sampleRate;
+    int numSpeakers = mLayout.speakers.size();
+    size_t totalSamples = rangeEnd - rangeStart;
+
+    // sources are split into contiguous groups (map order), one per thread. each thread
+    // mixes its group into its own AudioIOData and the groups are summed in order below,
+    // so a given thread count always produces the same output. with one thread this is
+    // the plain sequential mix
+    int numSources = mSpatial.sources.size();
+    int threads = std::max(1, std::min(mThreads, numSources));
+    if (threads > 1) {
+        std::cout << "Mixing " << numSources << " sources on " << threads << " threads\n";
+    }
+
+    // incremental: sources with a cached contribution for this range are re-summed from
+    // it, the others are rendered and stored. a contribution only covers its range,
+    // segments of a sharded render get their own entries
+    std::string rangeSuffix;
+    if (rangeStart != 0 || mRangeEnd != std::numeric_limits<size_t>::max()) {
+        rangeSuffix = "-" + std::to_string(rangeStart) + "-" + std::to_string(rangeEnd);
+    }
+    int hits = 0, stored = 0;
+
+    const int bufferSize = kBlockFrames;
+    std::vector<std::unique_ptr<MixLane>> lanes;
+    int sourceIdx = 0;
+    for (auto &[name, kfs] : mSpatial.sources) {
+        int t = (int)((int64_t)sourceIdx * threads / numSources);
+        if (t == (int)lanes.size()) {
+            lanes.push_back(std::make_unique<MixLane>(numSpeakers, sr, bufferSize));
+            if (t == 0) {
+                lanes[t]->vbap = &mVBAP;
+            } else {
+                // al::Vbap is not shared between threads, each helper gets its own copy
+                lanes[t]->ownVbap = std::make_unique<al::Vbap>(mSpeakers, true);
+                lanes[t]->ownVbap->compile();
+                lanes[t]->vbap = lanes[t]->ownVbap.get();
             }
-            
-            // get spatial direction for this source at current time
-            double timeSec = (double)blockStart / (double)sr;
-            al::Vec3f dir = interpolateDir(kfs, timeSec);
-            
-            // renderBuffer finds the best speaker triplet for this direction
-            // calculates VBAP gains and mixes the source into the output channels
-            // this accumulates into audioIO so multiple sources can overlap
-            mVBAP.renderBuffer(audioIO, dir, sourceBuffer.data(), blockLen);
-            sourceIdx++;
         }
-        
-        // copy the rendered audio from AudioIOData into our output buffer
-        // must call frame(0) to reset the read position before accessing samples
-        audioIO.frame(0);
-        for (size_t i = 0; i < blockLen; i++) {
-            for (int ch = 0; ch < numSpeakers; ch++) {
-                out.samples[ch][blockStart + i] += audioIO.out(ch, i);
+        SourceSlot slot{&kfs, &mSources.at(name), {}, nullptr, nullptr};
+        if (cache && cache->sourceKeys.count(name)) {
+            std::string key = cache->sourceKeys.at(name) + rangeSuffix;
+            slot.cached = cache->cache.open(key, numSpeakers, bufferSize, rangeStart, rangeEnd);
+            if (slot.cached) {
+                hits++;
+            } else {
+                slot.store = cache->cache.create(key, numSpeakers, bufferSize, rangeStart, rangeEnd);
+                stored++;
             }
+            std::cout << "  " << name << ": " << (slot.cached ? "cached" : "rendering") << "\n";
         }
+        lanes[t]->sources.push_back(std::move(slot));
+        sourceIdx++;
+    }
 
+    // lane 0 is mixed on this thread, the others on helper threads that live for the whole render
+    BlockDispatcher dispatcher;
+    size_t blockStart = rangeStart, blockLen = 0;
+    std::vector<std::thread> helpers;
+    HelperGuard guard(dispatcher, helpers);
+    for (size_t t = 1; t < lanes.size(); t++) {
+        helpers.emplace_back([&, t] {
+            uint64_t seen = 0;
+            while (dispatcher.next(seen)) {
+                std::exception_ptr error;
+                try {
+                    mixBlock(*lanes[t], blockStart, blockLen);
+                } catch (...) {
+                    error = std::current_exception();
+                }
+                dispatcher.finished(error);
+            }
+        });
+    }
+
+    int blocksProcessed = 0;
+    for (size_t windowStart = rangeStart; windowStart < rangeEnd; windowStart += windowFrames) {
+        size_t windowEnd = std::min(rangeEnd, windowStart + windowFrames);
+        // interleaved, zeroed
+        float *window = beginWindow(windowStart, windowEnd);
+
+        for (blockStart = windowStart; blockStart < windowEnd; blockStart += bufferSize) {
+            blockLen = std::min(windowEnd, blockStart + bufferSize) - blockStart;
+
+            if (blocksProcessed % 1000 == 0) {
+                std::cout << "  Block " << blocksProcessed << " ("
+                          << (int)(100.0 * (blockStart - rangeStart) / totalSamples) << "%)\n" << std::flush;
+            }
+            blocksProcessed++;
+
+            if (!helpers.empty()) dispatcher.start(helpers.size());
+            if (!lanes.empty()) mixBlock(*lanes[0], blockStart, blockLen);
+            if (!helpers.empty()) dispatcher.wait();
+
+            // sum the lanes into the window, always in lane order
+            float *dst = window + (blockStart - windowStart) * numSpeakers;
+            for (auto &lane : lanes) {
+                for (int ch : lane->mix.touched()) {
+                    const float *buf = lane->mix.channel(ch);
+                    for (size_t i = 0; i < blockLen; i++) {
+                        dst[i * numSpeakers + ch] += buf[i];
+                    }
+                }
+            }
+        }
+
+        endWindow(windowStart, windowEnd);
+    }
+
+    guard.join();
+
+    uint64_t updates = 0, sourceBlocks = 0, skipped = 0;
+    for (auto &lane : lanes) {
+        for (auto &slot : lane->sources) {
+            if (slot.store) slot.store->commit();
+            updates += slot.pan.updates;
+            sourceBlocks += slot.pan.blocks;
+            skipped += slot.pan.skipped;
+        }
+    }
+    std::cout << "Skipped " << skipped << " of " << skipped + sourceBlocks << " source blocks as silent\n";
+    std::cout << "Gains computed for " << updates << " of " << sourceBlocks
+              << " panned source blocks (reused for the rest)\n";
+    if (cache) {
+        std::cout << "Sources rendered: " << stored << ", reused from cache: " << hits << "\n";
     }
-    
     std::cout << "\n";
-    return out;
+}
+
+void VBAPRenderer::renderStream(SourceStream &stream, MultichannelWriter &writer) {
+    streamWindows(stream, writer, nullptr);
+}
+
+void VBAPRenderer::renderIncremental(SourceStream &stream, MultichannelWriter &writer, const ContributionCache &cache,
+                                     const std::map<std::string, std::string> &sourceKeys) {
+    CacheRef ref{cache, sourceKeys};
+    streamWindows(stream, writer, &ref);
+}
+
+void VBAPRenderer::streamWindows(SourceStream &stream, MultichannelWriter &writer, const CacheRef *cache) {
+    int sr = mSpatial.sampleRate;
+    int numSpeakers = mLayout.speakers.size();
+
+    size_t rangeEnd = std::min<size_t>(mRangeEnd, stream.frames());
+    size_t rangeStart = std::min(mRangeStart, rangeEnd);
+    size_t totalSamples = rangeEnd - rangeStart;
+    size_t windowFrames = writer.bufferFrames();
+
+    std::cout << "Streaming render: " << totalSamples << " samples ("
+              << (double)totalSamples / sr << " sec, frames " << rangeStart << "-" << rangeEnd << ") to "
+              << numSpeakers << " speakers from " << mSources.size() << " sources, "
+              << windowFrames << "-frame windows\n";
+
+    // the renderer's sources are stream.sources(), read() refills them for each window.
+    // each window is mixed straight into the writer's free buffer while the writer thread
+    // puts the previous one on disk
+    renderWindows(rangeStart, rangeEnd, windowFrames,
+        [&](size_t windowStart, size_t windowEnd) {
+            stream.read(windowStart, windowEnd);
+            return writer.buffer();
+        },
+        [&](size_t windowStart, size_t windowEnd) {
+            writer.commit(windowEnd - windowStart);
+        },
+        cache);
 }
@@ -17,16 +17,25 @@
 // 4. VBAP uses += to accumulate sources so call zeroOut before each block
 //
 // 5. must call audioIO.frame(0) before reading output samples
+//
+// 6. sources are not mixed through renderBuffer: it only runs on a 1-frame unit impulse
+//    to get a direction's speaker gains, which are then ramped across the block into
+//    a sparse BlockMix (GainMixer.hpp). notes 3-5 apply to that impulse AudioIOData
 
 #pragma once
 
+#include <functional>
+#include <limits>
 #include <map>
+#include <memory>
 #include <string>
 #include <vector>
 #include <al/math/al_Vec.hpp>
 #include <al/sound/al_Vbap.hpp>
 #include <al/io/al_AudioIOData.hpp>
 
+#include "ContributionCache.hpp"
+#include "GainMixer.hpp"
 #include "JSONLoader.hpp"
 #include "LayoutLoader.hpp"
 #include "WavUtils.hpp"
@@ -37,7 +46,23 @@ public:
                  const SpatialData &spatial,
                  const std::map<std::string, MonoWavData> &sources);
 
-    MultiWavData render();
+    // render only timeline frames [startFrame, endFrame) (--start / --end)
+    void setRange(size_t startFrame, size_t endFrame);
+
+    // mix sources on this many threads (--threads), see renderWindows
+    void setThreads(int threads);
+
+    // constant memory: the renderer must have been built on stream.sources(). sources are
+    // read a window at a time and each rendered window goes straight to the writer
+    void renderStream(SourceStream &stream, MultichannelWriter &writer);
+
+    // incremental renderStream: each source's contribution is cached under sourceKeys[name]
+    // while it is mixed; sources whose key is already cached are only re-summed from the
+    // cache, a block at a time alongside the window. same block grid, gains and summation
+    // order as renderStream, so the mix is identical (the build turns multiply-add
+    // contraction off, see CMakeLists.txt)
+    void renderIncremental(SourceStream &stream, MultichannelWriter &writer, const ContributionCache &cache,
+                           const std::map<std::string, std::string> &sourceKeys);
 
 private:
     SpeakerLayoutData mLayout;
@@ -53,6 +78,79 @@ private:
 
     float blockSize = 256.0f;
 
-    // linear interpolation between spatial keyframes
-    al::Vec3f interpolateDir(const std::vector<Keyframe> &kfs, double t);
+    size_t totalSamples() const;
+    // true when the source has only zero samples in the block
+    bool isSilent(const MonoWavData &src, size_t blockStart, size_t blockLen) const;
+    void fillSourceBuffer(const MonoWavData &src, size_t blockStart, size_t blockLen, float *buffer) const;
+
+    static constexpr size_t kBlockFrames = 512;
+
+    // speaker gains (non-zero only) for one direction
+    struct GainCache {
+        bool valid = false;
+        al::Vec3f dir;
+        SpeakerGains gains;
+    };
+
+    // per-source panning state: keyframe cursor and the gains at the start (previous
+    // block's direction) and end of the current block
+    struct PanState {
+        size_t cursor = 0;
+        GainCache from, to;
+        size_t lastBlockStart = 0;              // block `to` belongs to
+        uint64_t updates = 0, blocks = 0, skipped = 0;
+    };
+    void updateGains(GainCache &cache, const al::Vec3f &dir, al::Vbap &vbap,
+                     al::AudioIOData &impulseIO, uint64_t &updates) const;
+
+    // pan one block of a source into mix (+=) with gains ramped across the block.
+    // the ramp runs from the gains at the previous grid block's direction to this
+    // block's, so they depend only on blockStart, not on which blocks were rendered before
+    void panBlock(PanState &pan, const std::vector<Keyframe> &kfs, size_t blockStart,
+                  al::Vbap &vbap, al::AudioIOData &impulseIO,
+                  BlockMix &mix, const float *samples, size_t numFrames) const;
+
+    struct SourceSlot {
+        const std::vector<Keyframe> *kfs;
+        const MonoWavData *src;
+        PanState pan;
+        std::unique_ptr<ContributionReader> cached;   // incremental: re-summed, not panned
+        std::unique_ptr<ContributionWriter> store;    // incremental: panned and cached
+    };
+
+    // one mix thread's sources, VBAP instance and speaker buffer
+    struct MixLane {
+        MixLane(int numSpeakers, int sr, int bufferSize);
+        std::vector<SourceSlot> sources;
+        al::Vbap *vbap = nullptr;
+        std::unique_ptr<al::Vbap> ownVbap;
+        BlockMix mix;                           // planar speaker block buffer
+        BlockMix scratch;                       // one source alone, for the cache
+        al::AudioIOData impulseIO;              // 1 frame, for gain lookups
+        std::vector<float> sourceBuffer;
+    };
+    void mixBlock(MixLane &lane, size_t blockStart, size_t blockLen);
+
+    // incremental renders: the contribution cache and each source's key in it
+    struct CacheRef {
+        const ContributionCache &cache;
+        const std::map<std::string, std::string> &sourceKeys;
+    };
+
+    // mixes [rangeStart, rangeEnd) window by window (a multiple of the 512-frame block):
+    // beginWindow(start, end) returns a zeroed interleaved buffer for the window,
+    // endWindow(start, end) is called once it's mixed
+    void renderWindows(size_t rangeStart, size_t rangeEnd, size_t windowFrames,
+                       const std::function<float *(size_t, size_t)> &beginWindow,
+                       const std::function<void(size_t, size_t)> &endWindow,
+                       const CacheRef *cache = nullptr);
+    void streamWindows(SourceStream &stream, MultichannelWriter &writer, const CacheRef *cache);
+    static constexpr size_t kWindowFrames = 65536;
+
+    int mThreads = 1;
+    size_t mRangeStart = 0;
+    size_t mRangeEnd = std::numeric_limits<size_t>::max();
+
+    // linear interpolation between spatial keyframes, cursor remembers the last segment
+    al::Vec3f interpolateDir(const std::vector<Keyframe> &kfs, double t, size_t &cursor) const;
 };
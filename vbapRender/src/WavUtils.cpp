@@ -1,91 +1,176 @@
 #include "WavUtils.hpp"
+#include "MultichannelReader.hpp"
 #include <sndfile.h>
 #include <filesystem>
 #include <iostream>
+#include <algorithm>
 
 namespace fs = std::filesystem;
 
-MonoWavData loadMonoFile(const fs::path &path) {
-    SF_INFO info;
-    SNDFILE *snd = sf_open(path.string().c_str(), SFM_READ, &info);
-    if (!snd) throw std::runtime_error("Failed to open WAV: " + path.string());
+SourceStream::SourceStream(const std::string &folder,
+                           const std::map<std::string, std::vector<struct Keyframe>> &sourceKeys,
+                           int expectedSR)
+{
+    for (auto &[name, kf] : sourceKeys) {
+        fs::path p = fs::path(folder) / (name + ".wav");
 
-    if (info.channels != 1)
-        throw std::runtime_error("Source WAV is not mono: " + path.string());
+        if (!fs::exists(p)) {
+            throw std::runtime_error("Missing source WAV: " + p.string());
+        }
+
+        SF_INFO info = {};
+        SNDFILE *snd = sf_open(p.string().c_str(), SFM_READ, &info);
+        if (!snd) throw std::runtime_error("Failed to open WAV: " + p.string());
+        mFiles.push_back(snd);
 
-    MonoWavData d;
-    d.sampleRate = info.samplerate;
-    d.samples.resize(info.frames);
+        if (info.channels != 1)
+            throw std::runtime_error("Source WAV is not mono: " + p.string());
+        if (info.samplerate != expectedSR)
+            throw std::runtime_error("Sample rate mismatch in: " + p.string());
 
-    sf_read_float(snd, d.samples.data(), info.frames);
-    sf_close(snd);
+        mFileFrames.push_back(static_cast<uint64_t>(info.frames));
+        mFilePos.push_back(0);
+        mFrames = std::max(mFrames, mFileFrames.back());
 
-    return d;
+        MonoWavData &d = mSources[name];
+        d.sampleRate = info.samplerate;
+        mTargets.push_back(&d);
+    }
 }
 
-std::map<std::string, MonoWavData>
-WavUtils::loadSources(const std::string &folder,
-                      const std::map<std::string, std::vector<struct Keyframe>> &sourceKeys,
-                      int expectedSR)
+SourceStream::SourceStream(const std::string &path,
+                           const std::map<std::string, std::vector<struct Keyframe>> &sourceKeys,
+                           const std::map<std::string, int> &channelMap,
+                           int expectedSR)
+    : mMaster(std::make_unique<MultichannelReader>(path))
 {
-    std::map<std::string, MonoWavData> out;
+    if (mMaster->sampleRate() != expectedSR) {
+        throw std::runtime_error("Sample rate mismatch in: " + path);
+    }
+    mFrames = mMaster->frames();
 
-    for (auto &[name, kf] : sourceKeys) {
-        fs::path p = fs::path(folder) / (name + ".wav");
+    std::cout << "Streaming " << sourceKeys.size() << " of " << mMaster->channels()
+              << " channels from " << path << " (" << mFrames << " frames)\n";
 
-        if (!fs::exists(p)) {
-            throw std::runtime_error("Missing source WAV: " + p.string());
+    for (auto &[name, kf] : sourceKeys) {
+        auto it = channelMap.find(name);
+        if (it == channelMap.end()) {
+            throw std::runtime_error("No channel mapped for source: " + name);
         }
+        MonoWavData &d = mSources[name];
+        d.sampleRate = mMaster->sampleRate();
+        mChannels.push_back(it->second);
+        mTargets.push_back(&d);
+    }
+}
 
-        MonoWavData d = loadMonoFile(p);
+SourceStream::~SourceStream() {
+    for (SNDFILE *snd : mFiles) sf_close(snd);
+}
 
-        if (d.sampleRate != expectedSR) {
-            throw std::runtime_error("Sample rate mismatch in: " + p.string());
+void SourceStream::read(uint64_t start, uint64_t end) {
+    if (mMaster) {
+        uint64_t s = std::min(start, mFrames);
+        uint64_t e = std::min(end, mFrames);
+        std::vector<float *> dest(mTargets.size());
+        for (size_t i = 0; i < mTargets.size(); i++) {
+            mTargets[i]->startFrame = s;
+            mTargets[i]->samples.resize(e - s);  // keeps its capacity from window to window
+            dest[i] = mTargets[i]->samples.data();
         }
-
-        out[name] = d;
+        mMaster->readChannels(s, e - s, mChannels, dest);
+        return;
     }
 
-    return out;
+    for (size_t i = 0; i < mFiles.size(); i++) {
+        uint64_t s = std::min(start, mFileFrames[i]);
+        uint64_t e = std::min(end, mFileFrames[i]);
+        MonoWavData &d = *mTargets[i];
+        d.startFrame = s;
+        d.samples.resize(e - s);
+        if (e == s) continue;
+        if (mFilePos[i] != s) sf_seek(mFiles[i], static_cast<sf_count_t>(s), SEEK_SET);
+        sf_read_float(mFiles[i], d.samples.data(), static_cast<sf_count_t>(e - s));
+        mFilePos[i] = e;
+    }
 }
 
-void WavUtils::writeMultichannelWav(const std::string &path,
-                                    const MultiWavData &mw)
+MultichannelWriter::MultichannelWriter(const std::string &path, int channels, int sampleRate,
+                                       uint64_t expectedFrames, size_t bufferFrames)
+    : mPath(path), mChannels(channels), mBufferFrames(bufferFrames)
 {
     SF_INFO info = {};
-    info.channels = mw.channels;
-    info.samplerate = mw.sampleRate;
-    info.format = SF_FORMAT_WAV | SF_FORMAT_FLOAT;
-
-    std::cout << "Writing WAV: " << mw.channels << " channels, " 
-              << mw.sampleRate << " Hz\n";
-    std::cout << "Samples per channel: " << mw.samples[0].size() << "\n";
-
-    SNDFILE *snd = sf_open(path.c_str(), SFM_WRITE, &info);
-    if (!snd) {
+    info.channels = channels;
+    info.samplerate = sampleRate;
+    // plain WAV sizes are 32 bit
+    bool rf64 = expectedFrames * channels * sizeof(float) >= 0xFFFFFFFFull - 1024;
+    info.format = (rf64 ? SF_FORMAT_RF64 : SF_FORMAT_WAV) | SF_FORMAT_FLOAT;
+
+    mFile = sf_open(path.c_str(), SFM_WRITE, &info);
+    if (!mFile) {
         std::cerr << "Error opening file for write: " << sf_strerror(nullptr) << "\n";
         throw std::runtime_error("Cannot create WAV file");
     }
 
-    size_t totalSamples = mw.samples[0].size();
-    std::vector<float> interleaved(totalSamples * mw.channels);
+    for (auto &b : mBuffers) b.assign(bufferFrames * channels, 0.0f);
+    mThread = std::thread(&MultichannelWriter::writeLoop, this);
+}
+
+MultichannelWriter::~MultichannelWriter() {
+    try {
+        close();
+    } catch (const std::exception &e) {
+        std::cerr << e.what() << "\n";
+    }
+}
+
+void MultichannelWriter::writeLoop() {
+    std::unique_lock<std::mutex> lock(mMutex);
+    while (true) {
+        mCond.wait(lock, [this] { return mPending || mClosing; });
+        if (!mPending) break;
 
-    std::cout << "Interleaving " << interleaved.size() << " total samples...\n";
+        const float *data = mBuffers[mPendingIndex].data();
+        sf_count_t frames = static_cast<sf_count_t>(mPendingFrames);
+        lock.unlock();
+        sf_count_t written = sf_writef_float(mFile, data, frames);
+        lock.lock();
 
-    for (size_t i = 0; i < totalSamples; i++) {
-        for (int ch = 0; ch < mw.channels; ch++) {
-            interleaved[i * mw.channels + ch] = mw.samples[ch][i];
+        if (written != frames && mError.empty()) {
+            mError = "Write error: " + std::string(sf_strerror(mFile));
         }
+        mFramesWritten += written;
+        mPending = false;
+        mCond.notify_all();
+    }
+}
+
+void MultichannelWriter::commit(size_t frames) {
+    {
+        std::unique_lock<std::mutex> lock(mMutex);
+        mCond.wait(lock, [this] { return !mPending; });  // the other buffer is on disk
+        if (!mError.empty()) throw std::runtime_error(mError + " (" + mPath + ")");
+        mPending = true;
+        mPendingIndex = mFill;
+        mPendingFrames = frames;
+        mCond.notify_all();
     }
+    mFill ^= 1;
+    std::fill(mBuffers[mFill].begin(), mBuffers[mFill].end(), 0.0f);
+}
 
-    std::cout << "Writing to file...\n";
-    sf_count_t written = sf_write_float(snd, interleaved.data(), interleaved.size());
-    std::cout << "Wrote " << written << " samples (expected " << interleaved.size() << ")\n";
-    
-    if (written != (sf_count_t)interleaved.size()) {
-        std::cerr << "Write error: " << sf_strerror(snd) << "\n";
+void MultichannelWriter::close() {
+    if (!mFile) return;
+    {
+        std::unique_lock<std::mutex> lock(mMutex);
+        mCond.wait(lock, [this] { return !mPending; });
+        mClosing = true;
+        mCond.notify_all();
     }
-    
-    sf_close(snd);
-    std::cout << "File closed\n";
+    mThread.join();
+    sf_close(mFile);
+    mFile = nullptr;
+
+    std::cout << "Wrote " << mFramesWritten << " frames x " << mChannels << " channels to " << mPath << "\n";
+    if (!mError.empty()) throw std::runtime_error(mError + " (" + mPath + ")");
 }
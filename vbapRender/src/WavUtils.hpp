@@ -1,27 +1,113 @@
 #pragma once
 
+#include <condition_variable>
+#include <cstdint>
+#include <limits>
+#include <memory>
+#include <mutex>
 #include <string>
+#include <thread>
 #include <vector>
 #include <map>
+#include <sndfile.h>
+
+class MultichannelReader;
 
 struct MonoWavData {
     int sampleRate;
+    uint64_t startFrame = 0;     // timeline frame of samples[0] (--start renders load a range)
     std::vector<float> samples;
 };
 
-struct MultiWavData {
-    int sampleRate;
-    int channels;
-    std::vector<std::vector<float>> samples;
+constexpr uint64_t kEndOfFile = std::numeric_limits<uint64_t>::max();
+
+// streaming source reader for VBAPRenderer::renderStream
+//
+// sources() holds only the current window of every source: read(start, end) refills it
+// in place with frames [start, end). the master stays mmap'd (sequential readahead),
+// mono stems stay open and are read sequentially, so memory doesn't grow with the
+// length of the programme
+class SourceStream {
+public:
+    // mono <name>.wav files in folder
+    SourceStream(const std::string &folder,
+                 const std::map<std::string, std::vector<struct Keyframe>> &sourceKeys,
+                 int expectedSR);
+
+    // channels of the interleaved master, channelMap gives the 0-based channel per source
+    SourceStream(const std::string &path,
+                 const std::map<std::string, std::vector<struct Keyframe>> &sourceKeys,
+                 const std::map<std::string, int> &channelMap,
+                 int expectedSR);
+
+    ~SourceStream();
+
+    SourceStream(const SourceStream &) = delete;
+    SourceStream &operator=(const SourceStream &) = delete;
+
+    // length of the longest source
+    uint64_t frames() const { return mFrames; }
+
+    void read(uint64_t start, uint64_t end);
+
+    const std::map<std::string, MonoWavData> &sources() const { return mSources; }
+
+private:
+    std::map<std::string, MonoWavData> mSources;
+    std::vector<MonoWavData *> mTargets;        // mSources in map order
+    uint64_t mFrames = 0;
+
+    // direct mode
+    std::unique_ptr<MultichannelReader> mMaster;
+    std::vector<int> mChannels;
+
+    // mono stems
+    std::vector<SNDFILE *> mFiles;
+    std::vector<uint64_t> mFileFrames, mFilePos;
 };
 
-class WavUtils {
+// multichannel float WAV writer with a background write thread
+//
+// double buffered: the renderer fills buffer() (interleaved, zeroed) while the
+// previous buffer is written to disk, commit() hands it over. files beyond 4 GB are
+// written as RF64
+class MultichannelWriter {
 public:
-    static std::map<std::string, MonoWavData>
-    loadSources(const std::string &folder,
-                const std::map<std::string, std::vector<struct Keyframe>> &sourceKeys,
-                int expectedSR);
+    MultichannelWriter(const std::string &path, int channels, int sampleRate,
+                       uint64_t expectedFrames, size_t bufferFrames);
+    ~MultichannelWriter();
+
+    MultichannelWriter(const MultichannelWriter &) = delete;
+    MultichannelWriter &operator=(const MultichannelWriter &) = delete;
+
+    float *buffer() { return mBuffers[mFill].data(); }
+    size_t bufferFrames() const { return mBufferFrames; }
+
+    // queue the first `frames` frames of buffer() and switch to the other buffer
+    void commit(size_t frames);
+
+    // wait for the last write and close the file, throws if any write failed
+    void close();
+
+    uint64_t framesWritten() const { return mFramesWritten; }
+
+private:
+    void writeLoop();
+
+    SNDFILE *mFile = nullptr;
+    std::string mPath;
+    int mChannels;
+    size_t mBufferFrames;
+    std::vector<float> mBuffers[2];
+    int mFill = 0;
 
-    static void writeMultichannelWav(const std::string &path,
-                                     const MultiWavData &mw);
+    std::thread mThread;
+    std::mutex mMutex;
+    std::condition_variable mCond;
+    bool mPending = false;       // a buffer is queued or being written
+    int mPendingIndex = 0;
+    size_t mPendingFrames = 0;
+    bool mClosing = false;
+    std::string mError;
+    uint64_t mFramesWritten = 0;
 };
@@ -0,0 +1,140 @@
+// microbenchmark: per-block source mixing through AudioIOData vs the sparse gain mixer
+//
+// usage: sonoPleth_bench_mix [numSources=118] [numSpeakers=54] [blocks=2000] [movingPercent=25]
+//
+// old path: zeroOut, renderBuffer per source into an AudioIOData with every speaker
+// channel, then a copy of all channels into the output block (what render() used to do).
+// new path: gains per source (cached, one impulse through renderBuffer when a source
+// moves), ramped multiply-add into a BlockMix, copy of the touched channels only.
+// movingPercent of the sources move a little every block, the rest are static (beds,
+// parked objects). moving sources still pay the triplet search every block on both paths.
+
+#include <chrono>
+#include <cmath>
+#include <iostream>
+#include <random>
+#include <string>
+#include <vector>
+#include <al/math/al_Vec.hpp>
+#include <al/sound/al_Vbap.hpp>
+#include <al/io/al_AudioIOData.hpp>
+
+#include "GainMixer.hpp"
+
+using Clock = std::chrono::steady_clock;
+
+static void setupAudioIO(al::AudioIOData &audioIO, int numSpeakers, int frames) {
+    // framesPerBuffer before channelsOut, see VBAPRenderer.hpp
+    audioIO.framesPerBuffer(frames);
+    audioIO.framesPerSecond(48000);
+    audioIO.channelsIn(0);
+    audioIO.channelsOut(numSpeakers);
+}
+
+int main(int argc, char *argv[]) {
+    int numSources = argc > 1 ? std::stoi(argv[1]) : 118;
+    int numSpeakers = argc > 2 ? std::stoi(argv[2]) : 54;
+    int blocks = argc > 3 ? std::stoi(argv[3]) : 2000;
+    int movingPercent = argc > 4 ? std::stoi(argv[4]) : 25;
+    const int blockSize = 512;
+
+    // speakers on three rings, like a dome
+    al::Speakers speakers;
+    for (int i = 0; i < numSpeakers; i++) {
+        int ring = i % 3;
+        speakers.emplace_back(al::Speaker(i, 360.0f * i / numSpeakers - 180.0f, -30.0f + 30.0f * ring, 0, 1.0f));
+    }
+    al::Vbap vbap(speakers, true);
+    vbap.compile();
+
+    std::mt19937 rng(1);
+    std::uniform_real_distribution<float> uni(-1.0f, 1.0f);
+    std::vector<std::vector<float>> audio(numSources, std::vector<float>(blockSize));
+    std::vector<al::Vec3f> dirs(numSources);
+    for (int s = 0; s < numSources; s++) {
+        for (auto &x : audio[s]) x = 0.2f * uni(rng);
+        dirs[s] = al::Vec3f(uni(rng), uni(rng), 0.5f * uni(rng)).normalize();
+    }
+    auto dirAt = [&](int s, int block) {
+        if (s * 100 >= movingPercent * numSources) return dirs[s];
+        float a = 0.002f * block;
+        return al::Vec3f(dirs[s].x + a, dirs[s].y - a, dirs[s].z).normalize();
+    };
+
+    std::vector<float> window((size_t)blockSize * numSpeakers);
+    double checksumOld = 0, checksumNew = 0;
+
+    // old path
+    al::AudioIOData audioIO;
+    setupAudioIO(audioIO, numSpeakers, blockSize);
+    auto t0 = Clock::now();
+    for (int b = 0; b < blocks; b++) {
+        audioIO.zeroOut();
+        for (int s = 0; s < numSources; s++) {
+            vbap.renderBuffer(audioIO, dirAt(s, b), audio[s].data(), blockSize);
+        }
+        audioIO.frame(0);
+        for (int i = 0; i < blockSize; i++) {
+            for (int ch = 0; ch < numSpeakers; ch++) {
+                window[(size_t)i * numSpeakers + ch] = audioIO.out(ch, i);
+            }
+        }
+        checksumOld += window[b % window.size()];
+    }
+    double oldSec = std::chrono::duration<double>(Clock::now() - t0).count();
+
+    // new path
+    BlockMix mix(numSpeakers, blockSize);
+    al::AudioIOData impulseIO;
+    setupAudioIO(impulseIO, numSpeakers, 1);
+    std::vector<SpeakerGains> from(numSources), to(numSources);
+    std::vector<al::Vec3f> gainDirs(numSources);
+    std::vector<bool> valid(numSources, false);
+    long updates = 0;
+    t0 = Clock::now();
+    for (int b = 0; b < blocks; b++) {
+        mix.clear();
+        for (int s = 0; s < numSources; s++) {
+            al::Vec3f dir = dirAt(s, b);
+            std::swap(from[s], to[s]);
+            al::Vec3f moved = dir - gainDirs[s];
+            if (!valid[s] || moved.dot(moved) > 1e-10f) {
+                float impulse = 1.0f;
+                impulseIO.zeroOut();
+                vbap.renderBuffer(impulseIO, dir, &impulse, 1);
+                impulseIO.frame(0);
+                to[s].clear();
+                for (int ch = 0; ch < numSpeakers; ch++) {
+                    if (impulseIO.out(ch, 0) != 0.0f) to[s].push_back({ch, impulseIO.out(ch, 0)});
+                }
+                gainDirs[s] = dir;
+                valid[s] = true;
+                updates++;
+            } else {
+                to[s] = from[s];
+            }
+            if (b == 0) from[s] = to[s];
+            mix.add(from[s], to[s], audio[s].data(), blockSize);
+        }
+        std::fill(window.begin(), window.end(), 0.0f);
+        for (int ch : mix.touched()) {
+            const float *buf = mix.channel(ch);
+            for (int i = 0; i < blockSize; i++) {
+                window[(size_t)i * numSpeakers + ch] += buf[i];
+            }
+        }
+        checksumNew += window[b % window.size()];
+    }
+    double newSec = std::chrono::duration<double>(Clock::now() - t0).count();
+
+    double sourceBlocks = (double)blocks * numSources;
+    std::cout << numSources << " sources, " << numSpeakers << " speakers, " << blocks << " blocks of "
+              << blockSize << " frames, " << movingPercent << "% of the sources moving\n";
+    std::cout << "  AudioIOData path: " << oldSec * 1e9 / sourceBlocks << " ns per source block ("
+              << oldSec << " s)\n";
+    std::cout << "  sparse gain path: " << newSec * 1e9 / sourceBlocks << " ns per source block ("
+              << newSec << " s, " << updates << " gain updates)\n";
+    std::cout << "  speedup: " << oldSec / newSec << "x\n";
+    std::cout << "  (checksums " << checksumOld << " / " << checksumNew << ")\n";
+    return 0;
+}
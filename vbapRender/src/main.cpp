@@ -1,7 +1,7 @@
 // sonoPleth VBAP Renderer for AlloSphere
 // 
 // renders spatial audio using Vector Base Amplitude Panning
-// takes mono source files and spatial trajectory data
+// takes mono source files (or the original interleaved master) and spatial trajectory data
 // outputs multichannel WAV for the AlloSphere's 54-speaker array
 //
 // key gotcha that took forever to debug:
@@ -10,32 +10,68 @@
 // without this conversion VBAP silently fails and produces zero output
 
 #include <iostream>
+#include <memory>
 #include <string>
 #include <filesystem>
 
+#include "BinaryLoader.hpp"
+#include "ContributionCache.hpp"
 #include "JSONLoader.hpp"
 #include "LayoutLoader.hpp"
 #include "VBAPRenderer.hpp"
 #include "WavUtils.hpp"
 
+// set by CMakeLists.txt, fallbacks for builds outside it
+#ifndef SONOPLETH_BUILD_PROFILE
+#define SONOPLETH_BUILD_PROFILE "unknown"
+#define SONOPLETH_BUILD_TYPE "unknown"
+#define SONOPLETH_BUILD_LTO 0
+#define SONOPLETH_BUILD_NATIVE 0
+#endif
+
 namespace fs = std::filesystem;
 
-int main(int argc, char *argv[]) {
+static int run(int argc, char *argv[]) {
 
     // parse command line args
     // old version used positional args which was error prone
     // switched to flagged args for clarity
-    if (argc < 9) {
+    auto usage = []() {
         std::cout << "Usage:\n"
                   << "  sonoPleth_vbap_render "
                   << "--layout layout.json "
-                  << "--positions spatial.json "
-                  << "--sources <folder> "
-                  << "--out output.wav\n";
+                  << "(--positions spatial.json | --positions-bin spatial.bin) "
+                  << "(--sources <folder> | --source-wav master.wav [--channel-map map.json]) "
+                  << "[--cache-dir <dir> --source-keys keys.json] [--start <frame>] [--end <frame>] [--threads <n>] "
+                  << "--out output.wav\n"
+                  << "  sonoPleth_vbap_render --version   (build profile)\n"
+                  << "\n"
+                  << "  --source-wav reads the sources straight from the interleaved ADM master,\n"
+                  << "  --channel-map maps source names to 0-based channels (default src_N -> N-1)\n"
+                  << "  --cache-dir / --source-keys render incrementally, reusing cached per-source\n"
+                  << "  contributions whose key (fingerprint) has not changed\n"
+                  << "  --start / --end render only frames [start, end) of the timeline (segments for\n"
+                  << "  parallel renders; keep start a multiple of 512 for seams identical to a full render)\n"
+                  << "  --threads mixes the sources on n threads (default 1, incremental renders too); output is identical run to run\n"
+                  << "  for a given n, but may differ from other thread counts in the last bits\n";
+    };
+    if (argc == 2 && std::string(argv[1]) == "--version") {
+        std::cout << "sonoPleth_vbap_render, build profile " << SONOPLETH_BUILD_PROFILE
+                  << " (" << SONOPLETH_BUILD_TYPE
+                  << ", LTO " << (SONOPLETH_BUILD_LTO ? "on" : "off")
+                  << ", native " << (SONOPLETH_BUILD_NATIVE ? "on" : "off") << ")\n";
+        return 0;
+    }
+    if (argc < 9) {
+        usage();
         return 1;
     }
 
-    fs::path layoutFile, positionsFile, sourcesFolder, outFile;
+    fs::path layoutFile, positionsFile, sourcesFolder, sourceWav, channelMapFile, outFile;
+    fs::path cacheDir, sourceKeysFile;
+    uint64_t startFrame = 0, endFrame = kEndOfFile;
+    int threads = 1;
+    bool binaryPositions = false;
 
     for (int i = 1; i < argc; i++) {
         std::string arg = argv[i];
@@ -44,38 +80,104 @@ int main(int argc, char *argv[]) {
             layoutFile = argv[++i];
         } else if (arg == "--positions") {
             positionsFile = argv[++i];
+            binaryPositions = false;
+        } else if (arg == "--positions-bin") {
+            positionsFile = argv[++i];
+            binaryPositions = true;
         } else if (arg == "--sources") {
             sourcesFolder = argv[++i];
+        } else if (arg == "--source-wav") {
+            sourceWav = argv[++i];
+        } else if (arg == "--channel-map") {
+            channelMapFile = argv[++i];
+        } else if (arg == "--cache-dir") {
+            cacheDir = argv[++i];
+        } else if (arg == "--source-keys") {
+            sourceKeysFile = argv[++i];
+        } else if (arg == "--start") {
+            startFrame = std::stoull(argv[++i]);
+        } else if (arg == "--end") {
+            endFrame = std::stoull(argv[++i]);
+        } else if (arg == "--threads") {
+            threads = std::stoi(argv[++i]);
         } else if (arg == "--out") {
             outFile = argv[++i];
         }
     }
 
+    if (layoutFile.empty() || positionsFile.empty() || outFile.empty() ||
+        (sourcesFolder.empty() == sourceWav.empty()) || (cacheDir.empty() != sourceKeysFile.empty()) ||
+        startFrame > endFrame || threads < 1) {
+        usage();
+        return 1;
+    }
+
     // layout JSON has speaker positions in radians
     // these get converted to degrees when creating al::Speaker objects in VBAPRenderer
     std::cout << "Loading layout...\n";
     SpeakerLayoutData layout = LayoutLoader::loadLayout(layoutFile);
 
     // spatial trajectories with keyframes for each source
+    // the pipeline writes the binary format, JSON is kept for hand-edited / debug instructions
     std::cout << "Loading spatial instructions...\n";
-    SpatialData spatial = JSONLoader::loadSpatialInstructions(positionsFile);
+    SpatialData spatial = binaryPositions
+        ? BinaryLoader::loadSpatialInstructions(positionsFile)
+        : JSONLoader::loadSpatialInstructions(positionsFile);
 
-    // load all mono source files
-    std::cout << "Loading source WAVs...\n";
-    std::map<std::string, MonoWavData> sources =
-        WavUtils::loadSources(sourcesFolder, spatial.sources, spatial.sampleRate);
+    // source channel of each source in direct mode
+    std::map<std::string, int> channelMap;
+    if (!sourceWav.empty()) {
+        if (!channelMapFile.empty()) {
+            channelMap = JSONLoader::loadChannelMap(channelMapFile);
+        } else {
+            // same naming as the stem splitter: src_N is channel N of the master
+            for (auto &[name, kf] : spatial.sources) {
+                if (name.rfind("src_", 0) == 0) channelMap[name] = std::stoi(name.substr(4)) - 1;
+            }
+        }
+    }
+
+    // streaming render: sources are read and the output written a window at a time,
+    // memory stays flat however long the programme is (incremental renders too, their
+    // cached contributions are read a block at a time alongside the window)
+    std::unique_ptr<SourceStream> stream = !sourceWav.empty()
+        ? std::make_unique<SourceStream>(sourceWav.string(), spatial.sources, channelMap, spatial.sampleRate)
+        : std::make_unique<SourceStream>(sourcesFolder.string(), spatial.sources, spatial.sampleRate);
 
     // main rendering happens here
     // this is where the degrees conversion and channel mapping fixes are critical
     std::cout << "Rendering...\n";
-    VBAPRenderer renderer(layout, spatial, sources);
-    MultiWavData output = renderer.render();
+    VBAPRenderer renderer(layout, spatial, stream->sources());
+    if (startFrame != 0 || endFrame != kEndOfFile) {
+        renderer.setRange(startFrame, endFrame);
+    }
+    renderer.setThreads(threads);
 
     // output has consecutive channels 0 to 53
     // if you need AlloSphere hardware channel numbers with gaps you can remap later
+    uint64_t rangeEnd = std::min(endFrame, stream->frames());
+    uint64_t frames = rangeEnd - std::min(startFrame, rangeEnd);
     std::cout << "Writing output WAV: " << outFile << "\n";
-    WavUtils::writeMultichannelWav(outFile, output);
+    MultichannelWriter writer(outFile.string(), layout.speakers.size(), spatial.sampleRate, frames, 65536);
+    if (!cacheDir.empty()) {
+        ContributionCache cache(cacheDir);
+        renderer.renderIncremental(*stream, writer, cache, JSONLoader::loadSourceKeys(sourceKeysFile));
+    } else {
+        renderer.renderStream(*stream, writer);
+    }
+    writer.close();
 
     std::cout << "Done.\n";
     return 0;
 }
+
+int main(int argc, char *argv[]) {
+    // loader, render and cache errors (missing files, full disk, damaged cache entries)
+    // end up here as a message and exit code 1, the pipeline reports the failed render
+    try {
+        return run(argc, argv);
+    } catch (const std::exception &e) {
+        std::cerr << "Error: " << e.what() << "\n";
+        return 1;
+    }
+}